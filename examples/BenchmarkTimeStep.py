@@ -0,0 +1,70 @@
+# Micro-benchmark of the numpy leap-frog time step, in steps per second.
+#
+# 'legacy' reproduces the original stepping path, which allocated a
+# WavefieldVector for the source term and three temporaries per step, and
+# zeroed the oldest time level in SolverData.advance.  'current' is
+# solver.time_step as shipped.
+
+import time
+
+import numpy as np
+
+from pysit import *
+from pysit.gallery import horizontal_reflector
+
+
+def legacy_time_step(solver, solver_data, rhs_k, rhs_kp1):
+    u_km1 = solver_data.km1
+    u_k   = solver_data.k
+    u_kp1 = solver_data.kp1
+
+    f_bar = solver.WavefieldVector(solver.mesh, dtype=solver.dtype)
+    f_bar.u += rhs_k
+
+    u_kp1 += solver.A_k*u_k.data + solver.A_km1*u_km1.data + solver.A_f*f_bar.data
+
+
+def legacy_advance(solver_data):
+    solver_data.us[-1] *= 0
+    solver_data.us.insert(0, solver_data.us.pop(-1))
+
+
+def steps_per_second(solver, step, advance, nsteps):
+    solver_data = solver.SolverData()
+    rhs_k = np.random.rand(*solver.mesh.shape(include_bc=True))
+    rhs_kp1 = np.zeros_like(rhs_k)
+
+    tt = time.time()
+    for k in range(nsteps):
+        step(solver_data, rhs_k, rhs_kp1)
+        advance(solver_data)
+    return nsteps / (time.time() - tt)
+
+
+if __name__ == '__main__':
+
+    configs = [('1D', (2001,), 2000),
+               ('2D', (301, 201), 200),
+               ('3D', (61, 61, 41), 20)]
+
+    for name, shape, nsteps in configs:
+        pml = PML(0.1, 100)
+        dims = [(0.1, 1.0, pml, pml) for n in shape]
+        d = RectangularDomain(*dims)
+        m = CartesianMesh(d, *shape)
+        C, C0, m, d = horizontal_reflector(m)
+
+        solver = ConstantDensityAcousticWave(m,
+                                             spatial_accuracy_order=4,
+                                             trange=(0.0, 1.0),
+                                             kernel_implementation='numpy')
+        solver.model_parameters = solver.ModelParameters(m, {'C': C})
+
+        legacy = steps_per_second(solver,
+                                  lambda sd, r0, r1: legacy_time_step(solver, sd, r0, r1),
+                                  legacy_advance, nsteps)
+        current = steps_per_second(solver, solver.time_step,
+                                   lambda sd: sd.advance(), nsteps)
+
+        print('{0}: {1} dof, legacy {2:.1f} steps/s, current {3:.1f} steps/s, speedup {4:.2f}x'.format(
+              name, m.dof(include_bc=True), legacy, current, current / legacy))
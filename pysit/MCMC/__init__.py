@@ -1,3 +1,4 @@
 from pysit.MCMC.pCN import *
 from pysit.MCMC.pCN_General import *
 from pysit.MCMC.pCN_Tomo import *
+from pysit.MCMC.pCN_MultiChain import *
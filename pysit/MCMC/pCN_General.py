@@ -9,6 +9,7 @@ import tensorflow as tf
 import numpy as np
 import scipy.io as sio
 from pysit.util.io import *
+from pysit.util.sample_store import ChainRecorder
 from pysit.util.parallel import ParallelWrapShotNull
 
 __all__=['pCN_General']
@@ -78,6 +79,7 @@ class pCN_General(object):
                  isuq=False,
                  print_interval=10,
                  save_interval=None,
+                 sample_store=None,
                  verbose=False,
                  append=False,
                  write=False,
@@ -101,17 +103,26 @@ class pCN_General(object):
             Verbosity flag.
         linesearch_configuration : dictionary
             Possible parameters for linesearch, for more details, please check the introduction of the function set_linesearch_configuration
+        sample_store : pysit.util.sample_store.SampleStore, optional
+            If given, the samples, objective values, acceptance probabilities
+            and step sizes are appended to this store instead of being kept in
+            memory, and the improvements of the MAP estimate are appended to
+            its 'MAP' series.  A store which already holds samples resumes the
+            chain where it stopped, from its last sample, step size and MAP
+            estimate.  In parallel runs, only rank 0 passes the store.
 
         """
         parallel_wrap = self.parallel_wrap
         m0 = copy.deepcopy(initial_value)
 
+        # Resume from the last state of a store which already holds samples
+        recorder = ChainRecorder(sample_store, parallel_wrap, save_interval)
+        m0, beta = recorder.start(m0, beta)
+
         phi0 = (self.objective_function(m0)) / self.noise_sigma**2.0
-        Ms = []
         A_accept = []
         Phi = []
         Beta = []
-        Ms.append(m0)
         if parallel_wrap.use_parallel:
             if parallel_wrap.comm.Get_rank() == 0:
                 r_probs = np.random.uniform(0.0, 1.0, nsmps)
@@ -123,8 +134,7 @@ class pCN_General(object):
         else:
             r_probs = np.random.uniform(0.0, 1.0, nsmps)
 
-        m_min = m0
-        phi_min = phi0
+        m_min, phi_min = recorder.start_map(m0, phi0)
         
 
         for i in range(nsmps):
@@ -147,6 +157,7 @@ class pCN_General(object):
             if phi1 < phi_min:
                 phi_min = phi1
                 m_min = m1
+                recorder.record_map(m1, phi_min)
 
             a_accept = np.min((np.exp(phi0-phi1), 1))
             A_accept.append(a_accept)
@@ -166,24 +177,24 @@ class pCN_General(object):
                     print('r_rate: ', r_probs[i])
 
             if a_accept > r_probs[i]:
-                Ms.append(m1)
                 m0 = m1
                 phi0 = phi1
                 if a_accept > 0.8:
                     beta *= 1.2
             else:
-                Ms.append(m0)
                 if a_accept < 0.1:
                     if beta > 1e-4:
                         beta *= 0.5
 
-            if save_interval is not None:
+            recorder.record(i, m0, phi1, a_accept, Beta[-1], beta)
+
+            if not recorder.streaming and save_interval is not None:
                 if np.mod(i,save_interval) == 0:
                     if (parallel_wrap.use_parallel is None) or (parallel_wrap.comm.Get_rank() == 0):
                         if i == 0:
-                            Snp = np.array(Ms)
+                            Snp = np.array(recorder.samples)
                         else:
-                            Msi = Ms[len(Snp):len(Ms)]
+                            Msi = recorder.samples[len(Snp):]
                             Snpi = np.array(Msi)
                             nsize = np.shape(Snpi)
                             Snpi = np.reshape(Snpi, [nsize[0], nsize[-1]])
@@ -208,7 +219,7 @@ class pCN_General(object):
 
         result = dict()
         result['MAP'] = m_min
-        result['samples'] = Ms
+        result['samples'] = recorder.result()
         result['accept_prob'] = A_accept
         result['Phi'] = Phi
 
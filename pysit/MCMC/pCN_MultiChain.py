@@ -0,0 +1,318 @@
+import sys
+import time
+import copy
+
+import numpy as np
+from pysit.util.parallel import ParallelWrapShotNull
+from pysit.util.sample_store import ChainRecorder
+
+__all__=['pCN_MultiChain', 'effective_sample_size']
+
+__docformat__ = "restructuredtext en"
+
+
+def effective_sample_size(x):
+    """ Effective sample size of a Markov chain trace.
+
+    Uses the autocorrelation summed over Geyer's initial positive sequence,
+    ESS = n / (1 + 2 sum_k rho_k).
+
+    Parameters
+    ----------
+    x : array_like
+        Trace of shape (n,), or (n, d) for d scalar quantities.
+
+    Returns
+    -------
+    float or ndarray
+        ESS of the trace, or of each column.
+
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    squeeze = x.ndim == 1
+    x = x.reshape(x.shape[0], -1)
+    n = x.shape[0]
+
+    if n < 4:
+        ess = np.full(x.shape[1], float(n))
+        return ess[0] if squeeze else ess
+
+    x = x - x.mean(axis=0)
+    nfft = 2**int(np.ceil(np.log2(2*n)))
+    f = np.fft.rfft(x, n=nfft, axis=0)
+    acov = np.fft.irfft(f*np.conj(f), n=nfft, axis=0)[:n]
+
+    ess = np.empty(x.shape[1])
+    for j in range(x.shape[1]):
+        if acov[0, j] <= 0:
+            # A constant trace has no information beyond one sample
+            ess[j] = 1.0
+            continue
+        rho = acov[:, j] / acov[0, j]
+        # Sum pairs rho_{2k} + rho_{2k+1} while they are positive
+        tau = -1.0
+        for k in range(0, n-1, 2):
+            pair = rho[k] + rho[k+1]
+            if pair <= 0:
+                break
+            tau += 2*pair
+        ess[j] = n / max(tau, 1.0/n)
+
+    return ess[0] if squeeze else ess
+
+
+class pCN_MultiChain(object):
+    """ Multiple-chain pCN sampler, with optional parallel tempering.
+
+    K chains are advanced together, so that the K proposals of a step are
+    evaluated as a batch: with `objective.evaluate_batch`, if the objective
+    provides it (e.g., one batched forward solve), across the ranks of
+    `parallel_wrap`, or through the `map` of `executor`, e.g., a
+    `multiprocessing.Pool`.  Otherwise the proposals are evaluated in turn.
+
+    Parameters
+    ----------
+    objective : callable
+        Maps a model to its data misfit, directly or through its `evaluate`
+        method, e.g., a TomoObjFun.  If it has an `evaluate_batch` method,
+        that maps a list of models to a list of misfits.
+    prior_op : object
+        Prior, with a `generate_smp` method drawing a sample of the Gaussian
+        prior.
+    noise_sigma : float, optional
+        Standard deviation of the noise, scales the misfit.
+    parallel_wrap : ParallelWrapShot, optional
+        If parallel, the chains are distributed over its ranks, and every
+        rank evaluates the proposals of its chains.  The objective then
+        should not itself be parallel over the same ranks.
+    temperatures : sequence of float, optional
+        Temperature of each chain.  Chain k targets the posterior with the
+        misfit divided by temperatures[k].  Defaults to K chains at
+        temperature 1, i.e., independent chains.
+    n_chains : int, optional
+        Number of chains, if `temperatures` is not given.
+    swap_interval : int, optional
+        Number of steps between swap proposals of neighboring temperatures.
+    executor : object, optional
+        Object with a `map(function, iterable)` method used to evaluate the
+        proposals in parallel.
+
+    Notes
+    -----
+    With a `sample_store`, every chain is recorded by a
+    pysit.util.sample_store.ChainRecorder, like a pCN chain, in the series of
+    the store prefixed with 'chain<k>/', e.g., 'chain0/samples', instead of
+    being kept in memory.  The improvements of the MAP estimate are appended
+    to the 'MAP' and 'Phi_MAP' series of the chain which proposed them.  A
+    store which already holds samples resumes the run where it stopped, from
+    the last states, step sizes and MAP estimate of its chains.  In parallel
+    runs, only rank 0 passes the store.
+
+    """
+
+    def __init__(self, objective, prior_op, noise_sigma=1.0, parallel_wrap=ParallelWrapShotNull(),
+                 temperatures=None, n_chains=1, swap_interval=1, executor=None):
+
+        if temperatures is None:
+            temperatures = [1.0]*n_chains
+        temperatures = [float(t) for t in temperatures]
+        if min(temperatures) <= 0:
+            raise ValueError('Temperatures must be positive.')
+
+        self.objective_function = objective
+        self.prior_op = prior_op
+        self.noise_sigma = noise_sigma
+        self.temperatures = temperatures
+        self.n_chains = len(temperatures)
+        self.swap_interval = swap_interval
+        self.executor = executor
+
+        self.use_parallel = parallel_wrap.use_parallel
+        self.parallel_wrap = parallel_wrap
+
+        self.logfile = sys.stdout
+
+    def _is_root(self):
+        return (not self.use_parallel) or self.parallel_wrap.comm.Get_rank() == 0
+
+    def _broadcast(self, obj):
+        if self.use_parallel:
+            return self.parallel_wrap.comm.bcast(obj, root=0)
+        return obj
+
+    def _evaluate(self, models):
+        """ Misfits, scaled by the noise, of a list of models. """
+        objective = getattr(self.objective_function, 'evaluate', self.objective_function)
+
+        if self.use_parallel:
+            comm = self.parallel_wrap.comm
+            rank, size = comm.Get_rank(), comm.Get_size()
+            local = {k: objective(models[k]) for k in range(rank, len(models), size)}
+            phis = dict()
+            for part in comm.allgather(local):
+                phis.update(part)
+            phis = [phis[k] for k in range(len(models))]
+        elif hasattr(self.objective_function, 'evaluate_batch'):
+            phis = self.objective_function.evaluate_batch(models)
+        elif self.executor is not None:
+            phis = list(self.executor.map(objective, models))
+        else:
+            phis = [objective(m) for m in models]
+
+        return np.array(phis, dtype=np.float64) / self.noise_sigma**2.0
+
+    def _draw(self):
+        """ Prior samples and uniform numbers of a step, drawn on the root
+            rank. """
+        if self._is_root():
+            draws = ([self.prior_op.generate_smp() for k in range(self.n_chains)],
+                     np.random.uniform(0.0, 1.0, self.n_chains+1))
+        else:
+            draws = None
+        return self._broadcast(draws)
+
+
+    def __call__(self,
+                 initial_value,
+                 nsmps,
+                 beta,
+                 print_interval=10,
+                 save_interval=None,
+                 sample_store=None,
+                 beta_ratio=1.2,
+                 **kwargs):
+        """ Runs nsmps steps of all chains.
+
+        Parameters
+        ----------
+        initial_value : model or list of models
+            Initial state of all chains or of each chain.
+        nsmps : int
+            Number of steps.
+        beta : float or sequence of float
+            Initial pCN step size, of all chains or of each chain.  Each chain
+            adapts its own step size to its acceptance probability.
+        print_interval : int, optional
+            Steps between progress reports.
+        save_interval : int, optional
+            Steps between flushes of `sample_store` to disk.
+        sample_store : pysit.util.sample_store.SampleStore, optional
+            Store to which the samples are appended, see Notes.
+        beta_ratio : float, optional
+            Factor by which beta grows after a likely accepted step.
+
+        Returns
+        -------
+        dict
+            'samples' (list of the sample lists of each chain, or the
+            `sample_store`), 'MAP',
+            'Phi' (misfit of the proposals), 'Phi_chain' (misfit of the
+            states), 'accept_prob' and 'betas' (arrays of shape (nsmps, K)),
+            'swap_accept' (list of (step, k, accepted)), 'ess' (ESS of the
+            'Phi_chain' trace of each chain), 'time', and 'ess_per_second'
+            (summed over the chains at temperature 1).
+
+        """
+
+        K = self.n_chains
+        T = np.array(self.temperatures)
+
+        if isinstance(initial_value, (list, tuple)):
+            if len(initial_value) != K:
+                raise ValueError('Expected one initial value per chain.')
+            ms = [copy.deepcopy(m) for m in initial_value]
+        else:
+            ms = [copy.deepcopy(initial_value) for k in range(K)]
+
+        betas = np.broadcast_to(np.asarray(beta, dtype=np.float64), (K,)).copy()
+
+        # Every chain is recorded like a pCN chain, under its own prefix, and
+        # resumes from the last state of a store which already holds samples
+        recorders = [ChainRecorder(sample_store, self.parallel_wrap, prefix='chain{0}/'.format(k))
+                     for k in range(K)]
+        for k in range(K):
+            ms[k], betas[k] = recorders[k].start(ms[k], betas[k])
+
+        tt = time.time()
+
+        phis = self._evaluate(ms)
+
+        Phi = np.zeros((nsmps, K))
+        Phi_chain = np.zeros((nsmps, K))
+        A_accept = np.zeros((nsmps, K))
+        Beta = np.zeros((nsmps, K))
+        swap_accept = list()
+
+        maps = [recorders[k].start_map(ms[k], phis[k]) for k in range(K)]
+        k_min = int(np.argmin([phi for m, phi in maps]))
+        m_min, phi_min = maps[k_min]
+
+        for i in range(nsmps):
+            Beta[i] = betas
+            priors, r_probs = self._draw()
+
+            proposals = [np.sqrt(1-betas[k]**2.0)*ms[k] + betas[k]*priors[k] for k in range(K)]
+            phis1 = self._evaluate(proposals)
+
+            k_min = int(np.argmin(phis1))
+            if phis1[k_min] < phi_min:
+                phi_min = phis1[k_min]
+                m_min = proposals[k_min]
+                recorders[k_min].record_map(m_min, phi_min)
+
+            a_accept = np.minimum(np.exp(np.minimum((phis-phis1)/T, 0.0)), 1.0)
+            A_accept[i] = a_accept
+            Phi[i] = phis1
+
+            for k in range(K):
+                if a_accept[k] > r_probs[k]:
+                    ms[k] = proposals[k]
+                    phis[k] = phis1[k]
+                    if a_accept[k] > 0.8:
+                        betas[k] = min(betas[k]*beta_ratio, 1.0)
+                elif a_accept[k] < 0.1 and betas[k] > 1e-4:
+                    betas[k] *= 0.5
+
+            # Propose a swap of one pair of neighboring temperatures
+            if K > 1 and (i+1) % self.swap_interval == 0:
+                k = (i // self.swap_interval) % (K-1)
+                log_a = (phis[k] - phis[k+1]) * (1.0/T[k] - 1.0/T[k+1])
+                accepted = bool(np.log(max(r_probs[K], 1e-300)) < log_a)
+                if accepted:
+                    ms[k], ms[k+1] = ms[k+1], ms[k]
+                    phis[k], phis[k+1] = phis[k+1], phis[k]
+                swap_accept.append((i, k, accepted))
+
+            Phi_chain[i] = phis
+            for k in range(K):
+                recorders[k].record(i, ms[k], phis1[k], a_accept[k], Beta[i, k], betas[k])
+
+            if np.mod(i, print_interval) == 0 and self._is_root():
+                print('Iteration:', i)
+                print('f: ', phi_min)
+
+            if sample_store is not None and save_interval is not None and np.mod(i, save_interval) == 0:
+                sample_store.flush()
+
+        samples = [recorder.result() for recorder in recorders]
+        if recorders[0].streaming:
+            samples = sample_store
+
+        elapsed = time.time() - tt
+
+        ess = np.array([effective_sample_size(Phi_chain[:, k]) for k in range(K)])
+
+        result = dict()
+        result['MAP'] = m_min
+        result['samples'] = samples
+        result['accept_prob'] = A_accept
+        result['Phi'] = Phi
+        result['Phi_chain'] = Phi_chain
+        result['betas'] = Beta
+        result['swap_accept'] = swap_accept
+        result['ess'] = ess
+        result['time'] = elapsed
+        result['ess_per_second'] = ess[T == 1.0].sum() / elapsed if elapsed > 0 else np.inf
+
+        return result
@@ -9,6 +9,7 @@ import tensorflow as tf
 import numpy as np
 import scipy.io as sio
 from pysit.util.io import *
+from pysit.util.sample_store import ChainRecorder
 from pysit.util.parallel import ParallelWrapShotNull
 
 __all__=['pCN_Tomo']
@@ -76,6 +77,7 @@ class pCN_Tomo(object):
                  isuq=False,
                  print_interval=10,
                  save_interval=None,
+                 sample_store=None,
                  initial_value_cnn=None,
                  verbose=False,
                  append=False,
@@ -103,6 +105,13 @@ class pCN_Tomo(object):
             Verbosity flag.
         linesearch_configuration : dictionary
             Possible parameters for linesearch, for more details, please check the introduction of the function set_linesearch_configuration
+        sample_store : pysit.util.sample_store.SampleStore, optional
+            If given, the samples, objective values, acceptance probabilities
+            and step sizes are appended to this store instead of being kept in
+            memory, and the improvements of the MAP estimate are appended to
+            its 'MAP' series.  A store which already holds samples resumes the
+            chain where it stopped, from its last sample, step size and MAP
+            estimate.  In parallel runs, only rank 0 passes the store.
 
         """
         if initial_value_cnn is None:
@@ -110,13 +119,15 @@ class pCN_Tomo(object):
         else:
             m0_cnn = initial_value_cnn
 
+        # Resume from the last state of a store which already holds samples
+        recorder = ChainRecorder(sample_store, parallel_wrap, save_interval)
+        m0_cnn, beta = recorder.start(m0_cnn, beta)
+
         phi0 = self.objective_function.evaluate(m0_cnn)
         phi0p = phi0 + 0.5 * np.array(tf.math.reduce_sum(m0_cnn*m0_cnn))
-        Ms = []
         A_accept = []
         Phi = []
         Beta = []
-        Ms.append(m0_cnn)
         self.use_parallel = parallel_wrap.use_parallel
         if parallel_wrap.use_parallel:
             if parallel_wrap.comm.Get_rank() == 0:
@@ -129,8 +140,7 @@ class pCN_Tomo(object):
         else:
             r_probs = np.random.uniform(0.0, 1.0, nsmps)
 
-        m_min_cnn = m0_cnn
-        phi_min = phi0p
+        m_min_cnn, phi_min = recorder.start_map(m0_cnn, phi0p)
         
         
         for i in range(nsmps):
@@ -154,6 +164,7 @@ class pCN_Tomo(object):
             if phi1p < phi_min:
                 phi_min = phi1p
                 m_min_cnn = m1_cnn
+                recorder.record_map(m1_cnn, phi_min)
 
             a_accept = np.min((np.exp(phi0-phi1), 1))
             A_accept.append(a_accept)
@@ -170,26 +181,26 @@ class pCN_Tomo(object):
                     print('f: ', phi_min)
 
             if a_accept > r_probs[i]:
-                Ms.append(m1_cnn)
                 m0_cnn = m1_cnn
                 phi0 = phi1
                 if a_accept > 0.4:
                     if a_accept < 0.99:
                         beta *= beta_ratio
             else:
-                Ms.append(m0_cnn)
                 if a_accept < 0.1:
                     if beta > 1e-4:
                         beta *= 1/beta_ratio * 0.8
 
-            if save_interval is not None:
+            recorder.record(i, m0_cnn, phi1, a_accept, Beta[-1], beta)
+
+            if not recorder.streaming and save_interval is not None:
                 if np.mod(i,save_interval) == 0:
                     if (parallel_wrap.use_parallel is False):
                         #  or (parallel_wrap.comm.Get_rank() == 0):
                         if i == 0:
-                            Snp = np.array(Ms)
+                            Snp = np.array(recorder.samples)
                         else:
-                            Msi = Ms[len(Snp):len(Ms)]
+                            Msi = recorder.samples[len(Snp):]
                             Snpi = np.array(Msi)
                             nsize = np.shape(Snpi)
                             Snpi = np.reshape(Snpi, [nsize[0], nsize[-1]])
@@ -213,7 +224,7 @@ class pCN_Tomo(object):
             
         result = dict()
         result['MAP'] = m_min_cnn
-        result['samples'] = Ms
+        result['samples'] = recorder.result()
         result['accept_prob'] = A_accept
         result['Phi'] = Phi
 
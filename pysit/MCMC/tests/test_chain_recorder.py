@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+import numpy as np
+
+from pysit.MCMC import pCN_General
+from pysit.util.sample_store import SampleStore
+
+
+class Prior(object):
+    def generate_smp(self):
+        return np.random.randn(3)
+
+
+class TestChainRecorder(object):
+
+    def setup(self):
+        self.fname = os.path.join(tempfile.mkdtemp(), 'store.h5')
+        self.sampler = pCN_General(lambda m: 0.5*np.dot(m, m), Prior())
+        self.m0 = np.ones(3)
+
+    def test_streaming(self):
+        np.random.seed(0)
+        in_memory = self.sampler(None, self.m0, 6, 0.5, print_interval=100)
+
+        np.random.seed(0)
+        with SampleStore(self.fname, 'w') as store:
+            streamed = self.sampler(None, self.m0, 6, 0.5, print_interval=100, sample_store=store)
+            assert streamed['samples'] is store
+            assert store.length('samples') == 7
+            assert store.length('Phi') == 6
+            assert np.array_equal(store.read('samples')[1], np.array(in_memory['samples']))
+            assert np.array_equal(store.last('MAP')[1], in_memory['MAP'])
+
+        # A store which holds samples resumes from its last one
+        with SampleStore(self.fname, 'a') as store:
+            resumed = self.sampler(None, self.m0, 2, 0.5, print_interval=100, sample_store=store)
+            indices, samples = store.read('samples')
+            assert np.array_equal(indices, np.arange(9))
+            assert np.array_equal(samples[:7], np.array(in_memory['samples']))
+            assert len(resumed['Phi']) == 2
+
+    def test_resume_state(self):
+        np.random.seed(0)
+        with SampleStore(self.fname, 'w') as store:
+            first = self.sampler(None, self.m0, 6, 0.5, print_interval=100, sample_store=store)
+            phi_min = float(store.last('Phi_MAP')[1])
+            next_beta = float(store.last('next_beta')[1])
+        assert np.isclose(phi_min, 0.5*np.dot(first['MAP'], first['MAP']))
+
+        # Without steps, the resumed chain keeps the MAP estimate of the store
+        with SampleStore(self.fname, 'a') as store:
+            resumed = self.sampler(None, self.m0, 0, 0.5, print_interval=100, sample_store=store)
+            assert np.array_equal(resumed['MAP'], first['MAP'])
+
+        # The first proposal uses the adapted step size, not the initial one
+        with SampleStore(self.fname, 'a') as store:
+            self.sampler(None, self.m0, 1, 0.5, print_interval=100, sample_store=store)
+            assert store.read('betas')[1][-1] == next_beta
+            assert float(store.last('Phi_MAP')[1]) <= phi_min
@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+import numpy as np
+from scipy.signal import lfilter
+
+from pysit.MCMC import pCN_MultiChain, effective_sample_size
+from pysit.util.sample_store import SampleStore
+
+
+class Prior(object):
+    def generate_smp(self):
+        return np.zeros(1)
+
+
+class GaussianPrior(object):
+    def generate_smp(self):
+        return np.random.randn(3)
+
+
+class TestpCN_MultiChain(object):
+
+    def setup(self):
+        self.rng = np.random.RandomState(0)
+
+    def test_swap_acceptance(self):
+        # The chains never move, r_probs of 1 reject every proposal, so the
+        # states only change by swaps, which are accepted with probability
+        # min(1, exp((phi_k - phi_k+1)(1/T_k - 1/T_k+1))).
+        T = [1.0, 2.0]
+        sampler = pCN_MultiChain(lambda m: float(m[0]), Prior(), temperatures=T)
+        us = self.rng.uniform(0.0, 1.0, 200)
+        draws = iter([([np.zeros(1)]*2, np.array([1.0, 1.0, u])) for u in us])
+        sampler._draw = lambda: next(draws)
+
+        result = sampler([np.array([1.0]), np.array([3.0])], len(us), 0.5, print_interval=1000)
+
+        phis = [1.0, 3.0]
+        n_accepted = 0
+        for i, (u, (step, k, accepted)) in enumerate(zip(us, result['swap_accept'])):
+            ratio = np.exp((phis[0] - phis[1])*(1.0/T[0] - 1.0/T[1]))
+            assert (step, k) == (i, 0)
+            assert accepted == (u < ratio)
+            if accepted:
+                phis = phis[::-1]
+                n_accepted += 1
+            assert np.array_equal(result['Phi_chain'][i], phis)
+        assert np.all(result['accept_prob'] <= 1.0)
+
+        # Both the likely and the unlikely swap occur
+        assert 0 < n_accepted < len(us)
+
+    def test_effective_sample_size(self):
+        # For an AR(1) series, ESS = n (1 - phi) / (1 + phi)
+        n = 100000
+        for phi in (0.5, 0.9):
+            x = lfilter([1.0], [1.0, -phi], self.rng.randn(n))
+            expected = n*(1.0 - phi)/(1.0 + phi)
+            assert np.isclose(effective_sample_size(x), expected, rtol=0.1)
+
+        x = self.rng.randn(n, 2)
+        assert np.allclose(effective_sample_size(x), n, rtol=0.1)
+        assert effective_sample_size(np.ones(10)) == 1.0
+
+    def test_sample_store(self):
+        fname = os.path.join(tempfile.mkdtemp(), 'store.h5')
+        sampler = pCN_MultiChain(lambda m: 0.5*np.dot(m, m), GaussianPrior(), temperatures=[1.0, 2.0])
+        m0 = np.ones(3)
+
+        np.random.seed(0)
+        in_memory = sampler(m0, 5, 0.5, print_interval=1000)
+
+        np.random.seed(0)
+        with SampleStore(fname, 'w') as store:
+            streamed = sampler(m0, 5, 0.5, print_interval=1000, sample_store=store)
+            assert streamed['samples'] is store
+            for k in range(2):
+                prefix = 'chain{0}/'.format(k)
+                assert np.array_equal(store.read(prefix + 'samples')[1], np.array(in_memory['samples'][k]))
+                assert np.array_equal(store.read(prefix + 'Phi')[1], in_memory['Phi'][:, k])
+                assert np.array_equal(store.read(prefix + 'accept_prob')[1], in_memory['accept_prob'][:, k])
+                assert np.array_equal(store.read(prefix + 'betas')[1], in_memory['betas'][:, k])
+            next_betas = [float(store.last('chain{0}/next_beta'.format(k))[1]) for k in range(2)]
+
+        # The resumed run continues with the stored MAP estimate and step sizes
+        with SampleStore(fname, 'a') as store:
+            resumed = sampler(m0, 1, 0.5, print_interval=1000, sample_store=store)
+            assert np.array_equal(resumed['betas'][0], next_betas)
+            assert 0.5*np.dot(resumed['MAP'], resumed['MAP']) <= 0.5*np.dot(in_memory['MAP'], in_memory['MAP'])
+            assert store.length('chain0/samples') == 7
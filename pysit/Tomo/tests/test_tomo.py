@@ -0,0 +1,94 @@
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+from pysit.Tomo import tomo
+from pysit.Tomo.tomo import interpolate_linear, SourceTomo, TomoObj
+
+
+class TestInterpolateLinear(object):
+
+    def setup(self):
+        self.rng = np.random.RandomState(0)
+        self.min_coords = np.array([0.5, -1.0, 2.0])
+        self.intervals = np.array([0.1, 0.25, 0.3])
+
+    def _axes(self, shape):
+        return [o + h*np.arange(n) for o, h, n in zip(self.min_coords, self.intervals, shape)]
+
+    def test_matches_scipy(self):
+        shape = (7, 5, 4)
+        values = self.rng.randn(*shape)
+        axes = self._axes(shape)
+        lo, hi = np.array([a[0] for a in axes]), np.array([a[-1] for a in axes])
+
+        inside = lo + (hi - lo)*self.rng.rand(200, 3)
+        # Points on the faces, edges and corners of the grid, and on nodes
+        corners = np.array([[(hi if c >> j & 1 else lo)[j] for j in range(3)] for c in range(8)])
+        faces = inside[:30].copy()
+        for k in range(30):
+            faces[k, k % 3] = (hi if k % 2 else lo)[k % 3]
+        nodes = np.column_stack([a[self.rng.randint(0, len(a), 20)] for a in axes])
+        points = np.concatenate([inside, corners, faces, nodes])
+
+        expected = RegularGridInterpolator(axes, values)(points)
+        result = interpolate_linear(values, self.min_coords, self.intervals, points)
+        assert np.allclose(result, expected, rtol=0, atol=1e-14)
+
+        # Points outside take the value at the nearest boundary
+        outside = lo + (hi - lo)*(3*self.rng.rand(50, 3) - 1)
+        expected = RegularGridInterpolator(axes, values)(np.clip(outside, lo, hi))
+        result = interpolate_linear(values, self.min_coords, self.intervals, outside)
+        assert np.allclose(result, expected, rtol=0, atol=1e-14)
+
+    def test_single_node_dimension(self):
+        shape = (6, 5, 1)
+        values = self.rng.randn(*shape)
+        axes = self._axes(shape)
+        points = np.column_stack([axes[0][0] + (axes[0][-1] - axes[0][0])*self.rng.rand(50),
+                                  axes[1][0] + (axes[1][-1] - axes[1][0])*self.rng.rand(50),
+                                  self.rng.randn(50)])
+
+        expected = RegularGridInterpolator(axes[:2], values[:, :, 0])(points[:, :2])
+        result = interpolate_linear(values, self.min_coords, self.intervals, points)
+        assert np.allclose(result, expected, rtol=0, atol=1e-14)
+
+
+class StandInEikonalSolver(object):
+    # Traveltimes proportional to the velocity, scaled by the source
+    def __init__(self, min_coords, intervals, ngrids, vv):
+        self.vv = vv
+
+    def add_source(self, source_pos):
+        self.scale = 1.0 + np.sum(source_pos)
+
+    def solve(self):
+        self.uu = self.scale*self.vv
+
+
+class TestTomoObj(object):
+
+    def test_pool(self, monkeypatch):
+        # The eikonal solver is replaced by a stand-in, so that the test does
+        # not depend on the pykonal version; the fork started pool inherits it.
+        monkeypatch.setattr(tomo, '_build_eikonal_solver', StandInEikonalSolver)
+
+        min_coords, intervals, ngrids = (0.0, 0.0), (0.1, 0.1), (41, 31)
+        xs = np.linspace(0.5, 3.5, 8)
+        sources = [SourceTomo([x, 0.5, 0.0], xs, 2.5*np.ones(8)) for x in (1.0, 2.0, 3.0)]
+        vv = 1.0 + 0.5*np.random.RandomState(0).rand(*ngrids)
+
+        pool = TomoObj(min_coords, intervals, ngrids, sources, nprocs=2)
+        serial = TomoObj(min_coords, intervals, ngrids, sources)
+        try:
+            for k in range(2):
+                # The workers read the velocity of every call
+                result = pool.forward_map(vv + k)
+                assert len(result) == len(sources)
+                for r, e, source in zip(result, serial.forward_map(vv + k), sources):
+                    assert r.shape == (8, 1)
+                    assert np.array_equal(r, e)
+                    expected = interpolate_linear((1.0 + np.sum(source.source_pos))*(vv + k)[:, :, None],
+                                                  [0.0, 0.0, 0.0], [0.1, 0.1, 1.0], source.receiver_points)
+                    assert np.allclose(r.ravel(), expected, rtol=1e-14)
+        finally:
+            pool.close()
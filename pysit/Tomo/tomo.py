@@ -1,9 +1,8 @@
 import numpy as np 
 import os 
+import multiprocessing
 import pkg_resources
 import pykonal 
-import pandas as pd
-import copy as copy
 from pysit.cnn.velocity_cnn import Vel_CNN_Overthrust
 from pysit.util.parallel import ParallelWrapShotNull
 
@@ -20,10 +19,102 @@ class SourceTomo(object):
                            'y':rec_y,
                            'z':rec_z}
 
+    @property
+    def receiver_points(self):
+        """ Receiver coordinates as an (n, 3) array, in the x, z, y order of
+            the traveltime grid. """
+        return np.column_stack([np.asarray(self.receivers[k], dtype=np.float64).ravel() for k in ('x', 'z', 'y')])
+
+
+def interpolate_linear(values, min_coords, intervals, points):
+    """ Trilinear interpolation of grid values at a set of points.
+
+    Parameters
+    ----------
+
+    values : ndarray
+        Values on a regular 3D grid.
+    min_coords, intervals : sequence of float
+        Origin and spacing of the grid.
+    points : ndarray
+        Coordinates of the points, shape (n, 3).
+
+    Notes
+    -----
+
+    Points outside the grid take the value at the nearest boundary.  Grid
+    dimensions with a single node, e.g., y for 2D problems, are constant.
+
+    """
+
+    npts = np.array(values.shape)
+    x = (np.asarray(points, dtype=np.float64) - np.asarray(min_coords, dtype=np.float64)) / np.asarray(intervals, dtype=np.float64)
+    x = np.clip(x, 0, npts-1)
+
+    i0 = np.minimum(np.floor(x).astype(int), np.maximum(npts-2, 0))
+    w = x - i0
+    i1 = np.minimum(i0+1, npts-1)
+
+    out = np.zeros(x.shape[0])
+    for cx in (0, 1):
+        for cy in (0, 1):
+            for cz in (0, 1):
+                weight = ((w[:, 0] if cx else 1-w[:, 0]) *
+                          (w[:, 1] if cy else 1-w[:, 1]) *
+                          (w[:, 2] if cz else 1-w[:, 2]))
+                idx = ((i1 if cx else i0)[:, 0], (i1 if cy else i0)[:, 1], (i1 if cz else i0)[:, 2])
+                out += weight * values[idx]
+    return out
+
+
+def _build_eikonal_solver(min_coords, intervals, ngrids, vv):
+    solver = pykonal.EikonalSolver()
+    solver.vgrid.min_coords = min_coords
+    solver.vgrid.node_intervals = intervals
+    solver.vgrid.npts = ngrids
+
+    solver.pgrid.min_coords = min_coords
+    solver.pgrid.node_intervals = intervals
+    solver.pgrid.npts = ngrids
+    solver.vv = vv
+    return solver
+
+
+def _solve_traveltimes(min_coords, intervals, ngrids, vv, source_pos, receiver_points):
+    # A solver is consumed by solve(), so every source gets a fresh one built
+    # on the shared velocity rather than a deep copy of a template solver.
+    solver = _build_eikonal_solver(min_coords, intervals, ngrids, vv)
+    solver.add_source(source_pos)
+    solver.solve()
+    uu = np.reshape(np.asarray(solver.uu), ngrids)
+    return interpolate_linear(uu, min_coords, intervals, receiver_points).reshape(-1, 1)
+
+
+# State of the pool workers, inherited through fork or set by the initializer
+_worker_grid = None
+
+
+def _init_worker(grid, velocity):
+    global _worker_grid
+    min_coords, intervals, ngrids = grid
+    _worker_grid = (min_coords, intervals, ngrids,
+                    np.frombuffer(velocity, dtype=np.float64).reshape(ngrids))
+
+
+def _solve_source(task):
+    source_pos, receiver_points = task
+    return _solve_traveltimes(*(_worker_grid + (source_pos, receiver_points)))
+
+
 class TomoObj(object):
-    def __init__(self, min_coords, intervals, ngrids, sources):
+    def __init__(self, min_coords, intervals, ngrids, sources, nprocs=None):
         """
             The order of coordinate is x, z, y
+
+            If nprocs is larger than 1, the sources are solved concurrently
+            by a pool of nprocs processes, which read the velocity from one
+            shared memory grid.  The pool is started on the first call of
+            forward_map and kept until close().
         """
         if len(min_coords) == 2:
             min_coords = [min_coords[0], min_coords[1], 0]
@@ -35,40 +126,39 @@ class TomoObj(object):
         self.min_coords = min_coords
         self.intervals = intervals
         self.ngrids = ngrids
-        self.solver_tomo = pykonal.EikonalSolver()
-        self.solver_tomo.vgrid.min_coords = min_coords
-        self.solver_tomo.vgrid.node_intervals = intervals
-        self.solver_tomo.vgrid.npts = ngrids
-
-        self.solver_tomo.pgrid.min_coords = min_coords
-        self.solver_tomo.pgrid.node_intervals = intervals
-        self.solver_tomo.pgrid.npts = ngrids
         self.sources = sources
+        self.nprocs = nprocs
+
+        self._pool = None
+        self._velocity = None
+
+    def _start_pool(self):
+        ctx = multiprocessing.get_context('fork')
+        self._velocity = ctx.RawArray('d', int(np.prod(self.ngrids)))
+        grid = (tuple(self.min_coords), tuple(self.intervals), tuple(self.ngrids))
+        self._pool = ctx.Pool(self.nprocs, initializer=_init_worker, initargs=(grid, self._velocity))
+
+    def close(self):
+        """ Shuts down the process pool, if any. """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._velocity = None
 
     def forward_map(self, m):
         # input m should be velocity 
-        output = []
         m = np.reshape(m, self.ngrids)
-        self.solver_tomo.vv = m
-        for isrc in range(len(self.sources)):
-            source = self.sources[isrc]
-            solver = copy.deepcopy(self.solver_tomo)
-            solver.add_source(source.source_pos)
-            solver.solve()
-            ui = pykonal.LinearInterpolator3D(solver.pgrid, solver.uu)
-            xrc = source.receivers['x']
-            yrc = source.receivers['z']
-            zrc = source.receivers['y']
-            rc  = pd.DataFrame({'x':xrc,
-                                'y':yrc,
-                                'z':zrc})
-            rec_data = np.zeros([len(xrc), 1])
-            for irec in range(len(xrc)):
-                rec_data[irec] = ui(rc.iloc[irec])
-
-            output.append(rec_data)
-
-        return output
+        tasks = [(source.source_pos, source.receiver_points) for source in self.sources]
+
+        if self.nprocs is None or self.nprocs <= 1:
+            return [_solve_traveltimes(self.min_coords, self.intervals, self.ngrids, m, *task) for task in tasks]
+
+        if self._pool is None:
+            self._start_pool()
+        np.frombuffer(self._velocity, dtype=np.float64)[:] = m.ravel()
+
+        return self._pool.map(_solve_source, tasks)
 
 class TomoObjFun(object):
     def __init__(self, tomo_obj, data_obs, sigma, parallel_wrap_shot=ParallelWrapShotNull(), cnn=None):
@@ -85,6 +175,19 @@ class TomoObjFun(object):
             m_cmp = np.reshape(m_cmp, self.tomo_obj.ngrids)
             m_cmp = m_cmp.transpose()
 
+        return self._misfit(m_cmp)
+
+    def evaluate_batch(self, ms):
+        """ Objective function values of a list of models, e.g., MCMC
+            proposals.  With a CNN, the velocities of all of them are
+            generated in one evaluation of the network. """
+        if self.cnn is None:
+            return [self._misfit(m) for m in ms]
+
+        vels = np.array(self.cnn.generate_vel_batch(ms))
+        return [self._misfit(np.reshape(vel, self.tomo_obj.ngrids).transpose()) for vel in vels]
+
+    def _misfit(self, m_cmp):
         data_obs = self.data_obs
         sigma = self.sigma
         data_pred = self.tomo_obj.forward_map(m_cmp)
@@ -1,2 +1,3 @@
+from pysit.cnn.bridge import *
 from pysit.cnn.velocity_cnn import *
 
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+
+__all__ = ['NetworkBridge']
+
+__docformat__ = "restructuredtext en"
+
+
+class NetworkBridge(object):
+    """ Compiled, batched evaluation of a network and of its vector-Jacobian
+        products.
+
+    The network function is compiled once with `tf.function`, and evaluated
+    on batches, e.g., of the latent vectors of line search trial points or of
+    MCMC proposals.  Evaluations through `record` keep their activations on a
+    gradient tape, so that a following `vjp` at the same input only runs the
+    backward pass.
+
+    Parameters
+    ----------
+    function : callable
+        Maps a batch of float32 tensors to a batch of float32 tensors, e.g., a
+        keras model followed by a scaling.
+    cache_size : int, optional
+        Number of recorded evaluations kept for `vjp`.
+
+    Notes
+    -----
+    Outputs are returned as tensors.  On the CPU, `numpy()` or `np.asarray`
+    of them share memory with the tensor rather than copying.
+
+    """
+
+    def __init__(self, function, cache_size=2):
+        self.function = function
+        self.cache_size = cache_size
+
+        self._compiled = tf.function(function, reduce_retracing=True)
+        self._compiled_vjp = tf.function(self._vjp, reduce_retracing=True)
+
+        self._tapes = OrderedDict()
+        self.statistics = dict(hits=0, misses=0)
+
+    @staticmethod
+    def _key(x):
+        return (tuple(x.shape), x.numpy().tobytes())
+
+    def __call__(self, x):
+        """ Evaluates the network, without keeping the activations. """
+        return self._compiled(tf.convert_to_tensor(x, dtype=tf.float32))
+
+    def record(self, x):
+        """ Evaluates the network and keeps the activations for `vjp`. """
+        x = tf.convert_to_tensor(x, dtype=tf.float32)
+        key = self._key(x)
+
+        if key in self._tapes:
+            self._tapes.move_to_end(key)
+            return self._tapes[key][2]
+
+        with tf.GradientTape(persistent=True) as tape:
+            tape.watch(x)
+            y = self._compiled(x)
+
+        self._tapes[key] = (tape, x, y)
+        while len(self._tapes) > self.cache_size:
+            self._tapes.popitem(last=False)
+        return y
+
+    def _vjp(self, x, cotangent):
+        with tf.GradientTape() as tape:
+            tape.watch(x)
+            y = self.function(x)
+        return tape.gradient(y, x, output_gradients=tf.reshape(cotangent, tf.shape(y)))
+
+    def vjp(self, x, cotangent):
+        """ Returns the product of `cotangent`, of the size of the output, with
+            the Jacobian of the network at `x`. """
+        x = tf.convert_to_tensor(x, dtype=tf.float32)
+        cotangent = tf.convert_to_tensor(np.asarray(cotangent), dtype=tf.float32)
+
+        key = self._key(x)
+        if key in self._tapes:
+            self.statistics['hits'] += 1
+            tape, x, y = self._tapes[key]
+            return tape.gradient(y, x, output_gradients=tf.reshape(cotangent, tf.shape(y)))
+
+        self.statistics['misses'] += 1
+        return self._compiled_vjp(x, cotangent)
+
+    def clear(self):
+        """ Drops the recorded activations, e.g., after a network update. """
+        self._tapes.clear()
@@ -0,0 +1,64 @@
+import numpy as np
+import tensorflow as tf
+
+from pysit.cnn.bridge import NetworkBridge
+
+
+class TestNetworkBridge(object):
+
+    def setup(self):
+        tf.random.set_seed(0)
+        self.rng = np.random.RandomState(0)
+        self.model = tf.keras.Sequential([tf.keras.Input(shape=(4,)),
+                                          tf.keras.layers.Dense(8, activation='tanh'),
+                                          tf.keras.layers.Dense(6)])
+        self.bridge = NetworkBridge(self.model)
+
+    def _reference_vjp(self, x, cotangent):
+        x = tf.convert_to_tensor(x, dtype=tf.float32)
+        with tf.GradientTape() as tape:
+            tape.watch(x)
+            y = self.model(x)
+        return tape.gradient(y, x, output_gradients=tf.convert_to_tensor(cotangent, dtype=tf.float32)).numpy()
+
+    def test_vjp(self):
+        x = self.rng.randn(3, 4).astype(np.float32)
+        cotangent = self.rng.randn(3, 6).astype(np.float32)
+        expected = self._reference_vjp(x, cotangent)
+
+        # Without and with recorded activations
+        assert np.allclose(self.bridge.vjp(x, cotangent), expected, atol=1e-6)
+        assert self.bridge.statistics['misses'] == 1
+
+        y = self.bridge.record(x)
+        assert np.allclose(y, self.model(x), atol=1e-6)
+        assert np.allclose(self.bridge.vjp(x, cotangent), expected, atol=1e-6)
+        assert self.bridge.statistics['hits'] == 1
+
+        # The cotangent may be flat
+        assert np.allclose(self.bridge.vjp(x, cotangent.ravel()), expected, atol=1e-6)
+
+    def test_cache_invalidation(self):
+        x = self.rng.randn(2, 4).astype(np.float32)
+        cotangent = self.rng.randn(2, 6).astype(np.float32)
+        self.bridge.record(x)
+
+        # A changed input misses the recorded activations
+        x[0, 0] += 1.0
+        assert np.allclose(self.bridge.vjp(x, cotangent), self._reference_vjp(x, cotangent), atol=1e-6)
+        assert self.bridge.statistics == dict(hits=0, misses=1)
+
+        # Older recordings are dropped
+        for k in range(self.bridge.cache_size + 1):
+            self.bridge.record(x + k)
+        assert len(self.bridge._tapes) == self.bridge.cache_size
+        self.bridge.vjp(x, cotangent)
+        assert self.bridge.statistics['misses'] == 2
+
+        # After an update of the weights, clear drops the stale activations
+        self.bridge.record(x)
+        for w in self.model.trainable_variables:
+            w.assign(2.0*w)
+        self.bridge.clear()
+        assert np.allclose(self.bridge.vjp(x, cotangent), self._reference_vjp(x, cotangent), atol=1e-5)
+        assert self.bridge.statistics['misses'] == 3
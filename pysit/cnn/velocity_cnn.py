@@ -9,9 +9,49 @@ from tensorflow.keras import layers
 import time
 import scipy.io as sio
 
+from pysit.cnn.bridge import NetworkBridge
+
 __all__ = ['Vel_CNN_Overthrust','Vel_CNN_Overthrust2', 'Vel_CNN_Overthrust3']
 
-class Vel_CNN_Overthrust3(object):
+
+class _GeneratorBridgeMixin(object):
+    """
+        Evaluation of the generator through a NetworkBridge: compiled, batched,
+        and with the activations of generate_vel kept for compute_derivative.
+    """
+
+    def _scaled_generator(self, m):
+        y = self.generator(m, training=False)
+        y = y * self.a + self.b
+        y = y / 1000.0
+        if getattr(self, 'istranspose', False) is True:
+            # Transpose each image of the batch
+            y = tf.transpose(y, perm=[0, 2, 1, 3])
+        return y
+
+    def generate_vel(self, m, training=False):
+        if training is False:
+            return self.generator_bridge.record(m)
+        y = self.generator(m, training=training)
+        y = y * self.a + self.b
+        y = y / 1000.0
+        if getattr(self, 'istranspose', False) is True:
+            y = tf.transpose(y)
+        return y
+
+    def generate_vel_batch(self, ms):
+        """
+            Velocities of a batch of latent vectors, e.g., line search trial
+            points or MCMC proposals, in one evaluation of the generator.
+        """
+        ms = tf.reshape(tf.convert_to_tensor(ms, dtype=tf.float32), [-1, self.coder_size[-1]])
+        return self.generator_bridge(ms)
+
+    def compute_derivative(self, m, gradient_v):
+        return self.generator_bridge.vjp(m, gradient_v)
+
+
+class Vel_CNN_Overthrust3(_GeneratorBridgeMixin):
     """
         CNN net for velocity model generation
     """
@@ -29,28 +69,11 @@ class Vel_CNN_Overthrust3(object):
         self.image_size = [1, 64, 64, 1]
         self.coder_size = [1, 50]
         self.istranspose = istranspose
-
-    def generate_vel(self, m, training=False):
-        y = self.generator(m, training=training)
-        y = y * self.a + self.b
-        y = y / 1000.0
-        if self.istranspose is True:
-            y = tf.transpose(y)
-        return y
-
-    def compute_derivative(self, m, gradient_v):
-        with tf.GradientTape() as gen_tape:
-            gen_tape.watch(m)
-            yy = self.generate_vel(m, training=False)
-            yy = tf.reshape(yy, np.shape(gradient_v))
-            f = tf.math.reduce_sum(yy*gradient_v)
-            g = gen_tape.gradient(f, m)
-
-        return g
+        self.generator_bridge = NetworkBridge(self._scaled_generator)
 
 
 
-class Vel_CNN_Overthrust(object):
+class Vel_CNN_Overthrust(_GeneratorBridgeMixin):
     """
         CNN net for velocity model generation
 
@@ -79,23 +102,7 @@ class Vel_CNN_Overthrust(object):
         self.b = b
         self.image_size = [1, 64, 64, 1]
         self.coder_size = [1, 50]
-
-    def generate_vel(self, m, training=False):
-        y = self.generator(m, training=training)
-        y = y * self.a + self.b
-        y = y / 1000.0
-        return y
-
-    def compute_derivative(self, m, gradient_v):
-        with tf.GradientTape() as gen_tape:
-            gen_tape.watch(m)
-            yy = self.generate_vel(m, training=False)
-            yy = tf.reshape(yy, np.shape(gradient_v))
-            f = tf.math.reduce_sum(yy*gradient_v)
-            g = gen_tape.gradient(f, m)
-            
-
-        return g
+        self.generator_bridge = NetworkBridge(self._scaled_generator)
 
     @staticmethod
     def make_generator_model():
@@ -159,7 +166,7 @@ class Vel_CNN_Overthrust(object):
 
         return model
 
-class Vel_CNN_Overthrust2(object):
+class Vel_CNN_Overthrust2(_GeneratorBridgeMixin):
     """
         CNN net for velocity model generation
 
@@ -192,14 +199,18 @@ class Vel_CNN_Overthrust2(object):
         self.b = b
         self.image_size = [1, 64, 64, 1]
         self.coder_size = [1, 50]
+        self.generator_bridge = NetworkBridge(self._scaled_generator)
+        self.decoder_bridge = NetworkBridge(self._scaled_decoder)
 
-    def generate_vel(self, m, training=False):
-        y = self.generator(m, training=training)
-        y = y * self.a + self.b
-        y = y / 1000.0
-        return y
+    def _scaled_decoder(self, m):
+        m0 = tf.reshape(m, [-1] + self.image_size[1:])
+        y = m0 * 1000.0
+        y = (y - self.b) / self.a
+        return self.decoder(y, training=False)
 
     def decoder_vel(self, m, training=False):
+        if training is False:
+            return self.decoder_bridge.record(m)
         m0 = tf.reshape(m, self.image_size)
         y = m0 * 1000.0
         y = (y - self.b) / self.a
@@ -208,25 +219,10 @@ class Vel_CNN_Overthrust2(object):
         return y
 
     def compute_generator_derivative(self, m, gradient_v):
-        with tf.GradientTape() as gen_tape:
-            gen_tape.watch(m)
-            yy = self.generate_vel(m, training=False)
-            yy = tf.reshape(yy, np.shape(gradient_v))
-            f = tf.math.reduce_sum(yy*gradient_v)
-            g = gen_tape.gradient(f, m)
-            
-
-        return g
+        return self.compute_derivative(m, gradient_v)
 
     def compute_decoder_derivative(self, x, y):
-        with tf.GradientTape() as gen_tape:
-            gen_tape.watch(x)
-            yy = self.decoder_vel(x, training=False)
-            yy = tf.reshape(yy, np.shape(y))
-            f = tf.math.reduce_sum(yy*y)
-            g = gen_tape.gradient(f, x)
-
-        return g
+        return self.decoder_bridge.vjp(x, y)
 
 
 
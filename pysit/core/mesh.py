@@ -2,7 +2,7 @@
 
 import numpy as np
 
-__all__ = ['MeshBase', 'CartesianMesh',
+__all__ = ['MeshBase', 'CartesianMesh', 'PaddingPlan',
            'StructuredNeumann', 'StructuredDirichlet', 'StructuredPML']
 
 # Mapping between dimension and the key labels for Cartesian domain
@@ -27,6 +27,11 @@ class Bunch(dict):
         dict.__init__(self, **kwargs)
         self.__dict__ = self
 
+    def __setstate__(self, state):
+        # Copies and unpickled instances are created without __init__, so
+        # the attribute view must be re-established before the items return.
+        self.__dict__ = self
+
 
 class MeshBase(object):
     """ Base Class for Pysit mesh objects"""
@@ -200,6 +205,9 @@ class CartesianMesh(StructuredMesh):
         self._shapes = dict()
         self._dofs = dict()
 
+        # Padding plan, built on first use
+        self._padding_plan = None
+
         # Cache for sparse grids.  Frequently called, so it is useful to cache
         # them, with and without boundary conditions.
         self._spgrid = None
@@ -406,34 +414,16 @@ class CartesianMesh(StructuredMesh):
 
         """
 
-        # Get the various shapes of the array without boundary conditions
-        sh_unpadded_grid = self.shape(include_bc=False, as_grid=True)
-        sh_unpadded_vector = self.shape(include_bc=False, as_grid=False)
+        plan = self.padding_plan
 
         # If the array is already not padded, do nothing.
-        if (in_array.shape == sh_unpadded_grid or
-            in_array.shape == sh_unpadded_vector):
+        if (in_array.shape == plan.shape or
+            in_array.shape == plan.vector_shape):
             out_array = in_array
         else:
-            # Shape of the input array in grid form
-            sh_grid = self.shape(include_bc=True, as_grid=True)
-
-            # Build the slice into the new array (grid like for speed)
-            # For each dimension, build a slice object which gathers the
-            # unpadded section of the array.  Slice excludes the left and right
-            # boundary nodes.
-            sl = list()
-            for i in range(self.dim):
-                p = self.parameters[i]
-
-                nleft = p.lbc.n
-                nright = p.rbc.n
-
-                sl.append(slice(nleft, sh_grid[i]-nright))
-
-            # Make the input array look like a grid
-            # and extract the slice is for a grid
-            out_array = in_array.reshape(sh_grid)[sl]
+            # Make the input array look like a grid and extract the unpadded
+            # section of the array.
+            out_array = in_array.reshape(plan.padded_shape)[plan.interior]
 
         # If the input shape is a vector, the return array has vector shape
         if in_array.shape[1] == 1:
@@ -443,6 +433,55 @@ class CartesianMesh(StructuredMesh):
 
         return out.copy() if copy else out
 
+    def unpad_into(self, in_array, out_array):
+        """ Copies the unpadded section of the padded array `in_array` into
+            the preallocated array `out_array`, of any shape with `dof()`
+            elements.
+
+        Notes
+        -----
+
+        1. Unlike `unpad_array`, no intermediate array is created and the
+           shapes of the arguments are not changed.  `out_array` must be C
+           contiguous.
+
+        """
+
+        plan = self.padding_plan
+        if not out_array.flags.c_contiguous:
+            raise ValueError('Output array must be C contiguous.')
+        np.copyto(out_array.reshape(plan.shape), in_array.reshape(plan.padded_shape)[plan.interior])
+        return out_array
+
+    def pad_into(self, in_array, out_array):
+        """ Copies the unpadded array `in_array` into the unpadded section of
+            the preallocated padded array `out_array`.
+
+        Notes
+        -----
+
+        1. The padding of `out_array` is not modified, so it should be zero,
+           e.g., from the allocation of a buffer reused for every time step.
+
+        2. Unlike `pad_array`, no intermediate array is created and the
+           shapes of the arguments are not changed.  `out_array` must be C
+           contiguous.
+
+        """
+
+        plan = self.padding_plan
+        if not out_array.flags.c_contiguous:
+            raise ValueError('Output array must be C contiguous.')
+        np.copyto(out_array.reshape(plan.padded_shape)[plan.interior], in_array.reshape(plan.shape))
+        return out_array
+
+    @property
+    def padding_plan(self):
+        """ The PaddingPlan of the mesh. """
+        if getattr(self, '_padding_plan', None) is None:
+            self._padding_plan = PaddingPlan(self)
+        return self._padding_plan
+
     def pad_array(self, in_array, out_array=None, padding_mode=None):
         """ Returns a version of in_array, padded to add nodes from the
             boundary conditions or ghost nodes.
@@ -479,25 +518,18 @@ class CartesianMesh(StructuredMesh):
 
         """
 
-        # Shape of input array
-        sh_in_vector = self.shape(include_bc=False, as_grid=False)
-        sh_in_grid = self.shape(include_bc=False, as_grid=True)
-
-        # Shape of the new destination array
-        sh_out_vector = self.shape(include_bc=True, as_grid=False)
-        sh_out_grid = self.shape(include_bc=True, as_grid=True)
+        plan = self.padding_plan
 
         # If the output array is provided, we will need it in grid shape.
         # Plus, this excepts early if the size of the output array is wrong.
         if out_array is not None:
-            out_array.shape = sh_out_grid
+            out_array.shape = plan.padded_shape
 
         # If padding_mode is not None, use numpy.pad() for padding.
         # Otherwise, pads with zeros in a faster way.  This is a necessary
         # optimization.
         if padding_mode is not None:
-            _pad_tuple = tuple([(self.parameters[i].lbc.n, self.parameters[i].rbc.n) for i in range(self.dim)])
-            _out_array = np.pad(in_array.reshape(sh_in_grid), _pad_tuple, mode=padding_mode).copy()
+            _out_array = np.pad(in_array.reshape(plan.shape), plan.pad_width, mode=padding_mode).copy()
 
             # If the output memory is allocated, copy padded array into it.
             if out_array is not None:
@@ -507,37 +539,93 @@ class CartesianMesh(StructuredMesh):
         else:
             # Allocate the destination array
             if out_array is None:
-                out_array = np.zeros(sh_out_grid, dtype=in_array.dtype)
-
-            # Build the slice of the unpadded array into the new array.
-            # For each dimension, build a slice object which gathers the
-            # unpadded section of the output array.  Slice excludes the left
-            # and right boundary nodes.
-            sl = list()
-            for i in range(self.dim):
-                p = self.parameters[i]
+                out_array = np.zeros(plan.padded_shape, dtype=in_array.dtype)
 
-                nleft = p.lbc.n
-                nright = p.rbc.n
-
-                sl.append(slice(nleft, sh_out_grid[i]-nright))
-
-            # Copy the source array
-            out_array[sl] = in_array.reshape(sh_in_grid)
+            # Copy the source array into the unpadded section of the output
+            out_array[plan.interior] = in_array.reshape(plan.shape)
 
         # If the input shape is a vector, the return array has vector shape
-        if in_array.shape == sh_in_vector:
-            out_array.shape = sh_out_vector
+        if in_array.shape == plan.vector_shape:
+            out_array.shape = plan.padded_vector_shape
         else:
-            out_array.shape = sh_out_grid
+            out_array.shape = plan.padded_shape
         return out_array
 
+    def pad_index(self, indices):
+        """ Returns the flat indices, in the padded grid, of nodes given by
+            their flat indices in the unpadded grid.
+
+        Parameters
+        ----------
+
+        indices : array_like of int
+            Flat ('C' ordered) indices into an unpadded array.
+
+        Notes
+        -----
+
+        1. This allows operators defined on the unpadded grid, such as source
+           and receiver sampling operators, to act directly on padded arrays.
+
+        """
+
+        return self.padding_plan.interior_indices[np.asarray(indices)]
+
     def inner_product(self, arg1, arg2):
         """ Compute the correct scaled inner product on the mesh."""
 
         return np.dot(arg1.T, arg2).squeeze() * np.prod(self.deltas)
 
 
+class PaddingPlan(object):
+    """ Precomputed description of the boundary padding of a structured mesh.
+
+    Built once per mesh by `CartesianMesh.padding_plan`, and used by the
+    padding routines of the mesh as well as by sources and receivers that
+    index padded arrays directly.  The index arrays are read-only.
+
+    Attributes
+    ----------
+
+    shape, padded_shape : tuple of int
+        Grid shapes without and with the padding.
+    dof, padded_dof : int
+        Number of nodes without and with the padding.
+    vector_shape, padded_vector_shape : tuple of int
+        Vector shapes without and with the padding.
+    pad_width : tuple of 2-tuples of int
+        Left and right padding in each dimension, as for `numpy.pad`.
+    interior : tuple of slice
+        Slice of the unpadded nodes in a grid shaped padded array.
+    interior_indices : ndarray of int
+        Flat indices, in the padded grid, of the unpadded nodes, in flat
+        order of the unpadded grid.
+    padded_strides : tuple of int
+        Flat index strides of the dimensions of the padded grid.
+
+    """
+
+    def __init__(self, mesh):
+
+        self.shape = tuple(mesh.parameters[i].n for i in range(mesh.dim))
+        self.pad_width = tuple((mesh.parameters[i].lbc.n, mesh.parameters[i].rbc.n) for i in range(mesh.dim))
+        self.padded_shape = tuple(n + l + r for n, (l, r) in zip(self.shape, self.pad_width))
+
+        self.dof = int(np.prod(self.shape))
+        self.padded_dof = int(np.prod(self.padded_shape))
+
+        self.vector_shape = (self.dof, 1)
+        self.padded_vector_shape = (self.padded_dof, 1)
+
+        self.interior = tuple(slice(l, l + n) for n, (l, r) in zip(self.shape, self.pad_width))
+
+        self.padded_strides = tuple(int(np.prod(self.padded_shape[i+1:])) for i in range(mesh.dim))
+
+        indices = np.arange(self.padded_dof).reshape(self.padded_shape)[self.interior].ravel()
+        indices.flags.writeable = False
+        self.interior_indices = indices
+
+
 class UnstructuredMesh(MeshBase):
     """ [NotImplemented] Base class for specifying unstructured meshes in
     PySIT.
@@ -1,4 +1,6 @@
 import itertools
+import tempfile
+from collections import OrderedDict
 
 import numpy as np
 import scipy.sparse as spsp
@@ -12,7 +14,20 @@ __docformat__ = "restructuredtext en"
 
 class ReceiverBase(object):
 
-    def __init__(self, time_window=None, directwave_muting=None, **kwargs):
+    # Number of time axes for which interpolated data, and of filter and time
+    # axis pairs for which filtered data, are cached
+    interpolation_cache_size = 2
+
+    def __init__(self, time_window=None, directwave_muting=None, cache_dir=None, **kwargs):
+
+        # Interpolated data, keyed by time axis, see `interpolate_data`.  If
+        # cache_dir is set, they are held in memory-mapped files in that
+        # directory.
+        self.cache_dir = cache_dir
+        self._interpolation_cache = OrderedDict()
+        # Filtered interpolated data, keyed by filter and time axis, see
+        # `filter_data`
+        self._filter_cache = OrderedDict()
 
         self.ts = None
         self.interpolator = None
@@ -42,14 +57,44 @@ class ReceiverBase(object):
         return self._data
     def set_data(self, ndata):
         self._data = ndata
+        self.clear_interpolation_cache()
     data = property(get_data, set_data, None, None)
 
+    def clear_interpolation_cache(self):
+        """Drops the cached interpolated and filtered data.  Must be called if
+        the data are modified in place."""
+        self._interpolation_cache.clear()
+        self._filter_cache.clear()
+
+    @staticmethod
+    def _time_axis_key(ts):
+        ts = np.ascontiguousarray(ts)
+        return (ts.shape, hash(ts.tobytes()))
+
+    def _cache(self, cache, key, arr):
+        # Stores a read-only copy of arr, in a memory-mapped file if cache_dir
+        # is set, and drops the least recently used entries
+        if self.cache_dir is not None:
+            arr_ = np.memmap(tempfile.TemporaryFile(dir=self.cache_dir), dtype=arr.dtype, mode='w+', shape=arr.shape)
+            arr_[:] = arr
+            arr = arr_
+        arr.flags.writeable = False
+
+        cache[key] = arr
+        while len(cache) > self.interpolation_cache_size:
+            cache.popitem(last=False)
+        return arr
+
     def clear_data(self, length):
         raise NotImplementedError('\'clear_data\' method must be implemented by subclass.')
 
     def sample_data_from_array(self, p, k=None, data=None):
         raise NotImplementedError('\'sample_data_from_array\' method must be implemented by subclass.')
 
+    def padded_sampling(self, block_size=1):
+        """Precomputed ReceiverSampling of padded wavefields."""
+        return ReceiverSampling(self, block_size=block_size)
+
     def extend_data_to_array(self, k, resid=False, data=None):
         raise NotImplementedError('\'extend_data_to_array\' method must be implemented by subclass.')
 
@@ -80,33 +125,72 @@ class ReceiverBase(object):
         ts : float or ndarray
             Time(s) at which to interpolate the measured data to.
 
+        Notes
+        -----
+        Interpolated data are cached per time axis, until the data are set
+        again, and returned read only.
+
         """
 
-        # Get a local reference to the shot's interpolation function
-        interp = self.interpolator
+        if self.interpolator is None:
+            raise TypeError('Interpolator has not been defined for the current receiver.')
 
-        if interp is not None:
-            # Reset the y data reference for the interpolator to use the data
-            # for the current receiver. The default scipy interpolator uses x
-            # for the time series and y = f(x), so y is the data to interpolate.
-            interp.y = self.data.T # this is how things are needed for pre-0.12 scipy
-            interp._y = self.data # fix for a regression error in scipy 0.12
-            d = interp(ts)
-
-            if self._time_window[0] != 'None':
-                d *= self.time_window(ts)
-#           if self._directwave_muting[0] != 'None':
-#               d *= self.directwave_mute(ts)
-
-            if changedata is False:
-                return d
+        if changedata is False:
+            if np.ndim(ts) != 1:
+                return self._interpolate(ts)
+
+            key = self._time_axis_key(ts)
+            d = self._interpolation_cache.get(key)
+            if d is None:
+                d = self._cache(self._interpolation_cache, key, self._interpolate(ts))
             else:
-                self.data = d 
-                self.ts = ts
+                self._interpolation_cache.move_to_end(key)
+            return d
+        else:
+            self.data = self._interpolate(ts)
+            self.ts = ts
 
+    def filter_data(self, filter_op, ts):
+        """Returns the data interpolated to the time series ts, filtered by
+        `filter_op`.
 
+        Notes
+        -----
+        Filtered data are cached per filter and time axis, with the
+        interpolated data, and dropped with them.  They are returned read
+        only.
+
+        """
+
+        if np.ndim(ts) != 1:
+            return filter_op * self.interpolate_data(ts)
+
+        key = (filter_op, self._time_axis_key(ts))
+        d = self._filter_cache.get(key)
+        if d is None:
+            d = self._cache(self._filter_cache, key, filter_op * self.interpolate_data(ts))
         else:
-            raise TypeError('Interpolator has not been defined for the current receiver.')
+            self._filter_cache.move_to_end(key)
+        return d
+
+    def _interpolate(self, ts):
+
+        # Get a local reference to the shot's interpolation function
+        interp = self.interpolator
+
+        # Reset the y data reference for the interpolator to use the data
+        # for the current receiver. The default scipy interpolator uses x
+        # for the time series and y = f(x), so y is the data to interpolate.
+        interp.y = self.data.T # this is how things are needed for pre-0.12 scipy
+        interp._y = self.data # fix for a regression error in scipy 0.12
+        d = interp(ts)
+
+        if self._time_window[0] != 'None':
+            d *= self.time_window(ts)
+#       if self._directwave_muting[0] != 'None':
+#           d *= self.directwave_mute(ts)
+
+        return d
 
     def time_window(self, ts):
 
@@ -156,6 +240,66 @@ class ReceiverBase(object):
 
 
 
+class ReceiverSampling(object):
+    """Precomputed restriction of padded wavefields to the receivers.
+
+    `sample_data_from_array` requires the unpadded wavefield, which for vector
+    shaped arrays is a copy of the whole grid, and applies the full sampling
+    operator.  Instead, the sampling operator is restricted once to its
+    nonzero columns, whose indices are mapped into the padded grid, so each
+    sample gathers only those nodes of the padded wavefield.
+
+    In block mode, the gathered nodes of `block_size` consecutive samples are
+    buffered and recorded with one sparse matrix times dense block product.
+
+    Parameters
+    ----------
+    receivers : ReceiverBase
+        Receiver or receiver set with a `sampling_operator`.
+    block_size : int, optional
+        Number of samples buffered before they are recorded, defaults to 1.
+        Buffered samples are also recorded when the last row of `data` is
+        sampled, otherwise `flush` records them.
+
+    """
+
+    def __init__(self, receivers, block_size=1):
+
+        if int(block_size) < 1:
+            raise ValueError('Block size must be positive.')
+        self.block_size = int(block_size)
+
+        S = spsp.csr_matrix(receivers.sampling_operator)
+        columns = np.unique(S.indices)
+
+        self.padded_indices = receivers.mesh.pad_index(columns)
+        self.operator = S[:, columns].tocsr()
+
+        self._block = np.zeros((len(columns), self.block_size))
+        self._block_ks = list()
+
+    def sample(self, arr, k, data):
+        """Record the padded array `arr` into row k of `data`."""
+
+        x = arr.reshape(-1)[self.padded_indices]
+
+        if self.block_size == 1:
+            data[k] = self.operator.dot(x)
+        else:
+            self._block[:, len(self._block_ks)] = x
+            self._block_ks.append(k)
+            if len(self._block_ks) == self.block_size or k == len(data)-1:
+                self.flush(data)
+
+    def flush(self, data):
+        """Record the buffered samples into `data`."""
+
+        n = len(self._block_ks)
+        if n:
+            data[self._block_ks] = self.operator.dot(self._block[:, :n]).T
+            self._block_ks = list()
+
+
 class PointReceiver(PointRepresentationBase, ReceiverBase):
     """Subclass of PointRepresentationBase and ReceiverBase for representing a
     seismic receiver on a grid.
@@ -402,7 +546,9 @@ class ReceiverSet(MeshRepresentationBase, ReceiverBase):
             Coordinates of the point in the physical coordinates of the domain.
         **kwargs : dict, optional
             May be used to specify `approximation` and `approximation_width` to
-            base class.
+            base class, and `cache_dir`, a directory in which interpolated
+            data are cached in memory-mapped files, e.g., for runs with many
+            shots.
         """
 
         self.receiver_list = receivers
@@ -412,6 +558,7 @@ class ReceiverSet(MeshRepresentationBase, ReceiverBase):
 
         # time_window is an n-tuple, n[0] is the type, and any remaining entries are type dependent.
         self._time_window = ('Set',) # for special handling of ReceiverSets
+        self._window_cache = OrderedDict()
 #       # directwave_muting is an n-tuple, n[0] is the type, and any remaining entries are type dependent.
 #       self._directwave_muting = ('Set',) # for special handling of ReceiverSets
 
@@ -449,6 +596,7 @@ class ReceiverSet(MeshRepresentationBase, ReceiverBase):
         return self._data
     def set_data(self, ndata):
         self._data = ndata
+        self.clear_interpolation_cache()
         count = 0
         for r in self.receiver_list:
             r.data = self._data[:,count:count+r.receiver_count]
@@ -459,6 +607,7 @@ class ReceiverSet(MeshRepresentationBase, ReceiverBase):
         return self._interpolator
     def set_interpolator(self, interpolator):
         self._interpolator = interpolator
+        self.clear_interpolation_cache()
         for r in self.receiver_list:
             r.interpolator = interpolator
     interpolator = property(get_interpolator, set_interpolator, None, None)
@@ -569,7 +718,15 @@ class ReceiverSet(MeshRepresentationBase, ReceiverBase):
 
     def time_window(self, ts):
 
-        return np.array([r.time_window(ts) for r in self.receiver_list]).T
+        if np.ndim(ts) != 1:
+            return np.array([r.time_window(ts) for r in self.receiver_list]).T
+
+        # The windows only depend on the time axis
+        key = self._time_axis_key(ts)
+        if key not in self._window_cache:
+            window = np.array([r.time_window(ts) for r in self.receiver_list]).T
+            self._cache(self._window_cache, key, window)
+        return self._window_cache[key]
 
 #   def directwave_mute(self, ts):
 #
@@ -39,6 +39,16 @@ class SourceBase(object):
     def reset_time_series(self, ts):
         pass
 
+    def injection(self, ts):
+        """Precomputed SourceInjection of this source at the times `ts`."""
+        return SourceInjection(self, ts)
+
+    def wavelet_series(self, ts):
+        """Scaled wavelets of the emitters, as an array of shape
+        (len(ts), source_count), such that column j is the weight of column j
+        of `adjoint_sampling_operator`."""
+        raise NotImplementedError('\'wavelet_series\' must be implemented by subclass.')
+
     def f(self, t, **kwargs):
         raise NotImplementedError('Evaluation function \'f\' must be implemented by subclass.')
 
@@ -52,6 +62,66 @@ class SourceBase(object):
     def unserialize_dict(self, d):
         raise NotImplementedError()
 
+class SourceInjection(object):
+    """Precomputed injection of a source into padded right hand sides.
+
+    Evaluating `source.f(t)` at every time step re-evaluates the wavelets,
+    applies the full adjoint sampling operator, and builds a dense grid that
+    is then padded.  Instead, the wavelet series at all times `ts` is combined
+    once with the nonzero rows of the adjoint sampling operator, and each
+    time step only writes those nodes of the padded right hand side.
+
+    Parameters
+    ----------
+    source : SourceBase
+        Source with a `wavelet_series` and an `adjoint_sampling_operator`,
+        e.g., a PointSource or a SourceSet of many (possibly encoded) sources.
+    ts : array_like of float
+        Times of the time steps, e.g., `dt*np.arange(nsteps+1)`.
+
+    Attributes
+    ----------
+    padded_indices : ndarray of int
+        Flat indices of the source support in the padded grid.
+    values : ndarray
+        Right hand side at the support, of shape (len(ts), len(padded_indices)).
+
+    """
+
+    def __init__(self, source, ts):
+
+        mesh = source.mesh
+        self.mesh = mesh
+
+        A = spsp.csr_matrix(source.adjoint_sampling_operator)
+        rows = np.flatnonzero(np.diff(A.indptr))
+        weights = A[rows].toarray()
+
+        self.padded_indices = mesh.pad_index(rows)
+        self.values = np.dot(source.wavelet_series(ts), weights.T)
+
+    def zeros(self):
+        """A padded right hand side buffer for `inject`."""
+        return np.zeros(self.mesh.shape(include_bc=True))
+
+    def inject(self, rhs_array, k, column=None):
+        """Write the source at time index k into a padded right hand side.
+
+        Only the nodes of the source support are written, so `rhs_array` must
+        be a contiguous padded array that is zero elsewhere, such as a buffer
+        from `zeros` that only `inject` writes to.  If `column` is given,
+        `rhs_array` is a batched right hand side of shape (dof, nshots) and
+        only that column is written.
+        """
+        if column is not None:
+            rhs_array[self.padded_indices, column] = self.values[k]
+            return rhs_array
+        if not rhs_array.flags.c_contiguous:
+            raise ValueError('Right hand side must be a contiguous array.')
+        rhs_array.reshape(-1)[self.padded_indices] = self.values[k]
+        return rhs_array
+
+
 class PointSource(PointRepresentationBase, SourceBase):
     """Subclass of PointRepresentationBase and SourceBase for representing a
     point source emitter on a grid.
@@ -128,6 +198,9 @@ class PointSource(PointRepresentationBase, SourceBase):
             else:
                 return (self.adjoint_sampling_operator*(self.intensity*self.w(nu=nu, **kwargs))).reshape(self.mesh.shape())
 
+    def wavelet_series(self, ts):
+        return (self.intensity*np.asarray(self.w(np.asarray(ts)))).reshape(-1, 1)
+
     def serialize_dict(self, i=None):
 
         ret = dict()
@@ -189,6 +262,9 @@ class SourceSet(SourceBase, MeshRepresentationBase):
         vec.shape = vec.size,1
         return vec
 
+    def wavelet_series(self, ts):
+        return np.hstack([s.wavelet_series(ts) for s in self.source_list])
+
     def set_shot(self,shot):
         self.shot=shot
         for s in self.source_list:
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from pysit import PML, RectangularDomain, CartesianMesh
+
+
+class TestPaddingPlan(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0.0, 1.0, pml, pml), (0.0, 0.8, pml, pml))
+        self.mesh = CartesianMesh(d, 31, 21)
+
+    def test_matches_pad_array(self):
+        mesh = self.mesh
+        plan = mesh.padding_plan
+        assert plan is mesh.padding_plan
+
+        u = np.random.rand(mesh.dof(), 1)
+        padded = mesh.pad_array(u)
+        assert padded.shape == mesh.shape(include_bc=True)
+        assert np.array_equal(padded[plan.interior_indices], u)
+        assert np.array_equal(mesh.unpad_array(padded), u)
+
+        out = np.zeros_like(padded)
+        assert mesh.pad_into(u, out) is out
+        assert np.array_equal(out, padded)
+
+        unpadded = np.empty_like(u)
+        mesh.unpad_into(padded, unpadded)
+        assert np.array_equal(unpadded, u)
+
+    def test_errors(self):
+        mesh = self.mesh
+        u = np.random.rand(mesh.dof(), 1)
+        out = np.zeros((mesh.shape(include_bc=True)[0], 2))[:, :1]
+        with pytest.raises(ValueError):
+            mesh.pad_into(u, out)
+        with pytest.raises(ValueError):
+            mesh.padding_plan.interior_indices[0] = 0
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from pysit import (PML, RectangularDomain, CartesianMesh, PointReceiver,
+                   ReceiverSet)
+
+
+def build_mesh(dim):
+    pml = PML(0.1, 100)
+    if dim == 1:
+        d = RectangularDomain((0.0, 1.0, pml, pml))
+        return CartesianMesh(d, 51)
+    else:
+        d = RectangularDomain((0.0, 1.0, pml, pml), (0.0, 0.8, pml, pml))
+        return CartesianMesh(d, 31, 21)
+
+
+class TestReceiverSampling(object):
+
+    @pytest.mark.parametrize('dim', [1, 2])
+    @pytest.mark.parametrize('block_size', [1, 4])
+    @pytest.mark.parametrize('approximation', ['delta', 'gaussian'])
+    def test_matches_sample_data_from_array(self, dim, block_size, approximation):
+        mesh = build_mesh(dim)
+        positions = [(0.1*i,) if dim == 1 else (0.1*i, 0.2) for i in range(1, 8)]
+        receivers = ReceiverSet(mesh, [PointReceiver(mesh, p, approximation=approximation)
+                                       for p in positions])
+
+        nsteps = 10
+        bulk = mesh.pad_index(np.arange(mesh.dof()))
+        fields = [np.random.rand(mesh.dof(), 1) for k in range(nsteps)]
+
+        expected = np.zeros((nsteps, receivers.receiver_count))
+        data = np.zeros((nsteps, receivers.receiver_count))
+        sampling = receivers.padded_sampling(block_size)
+        for k, u in enumerate(fields):
+            receivers.sample_data_from_array(u, k, data=expected)
+
+            padded = np.zeros(mesh.shape(include_bc=True))
+            padded.reshape(-1)[bulk] = u.ravel()
+            sampling.sample(padded, k, data)
+
+        assert np.allclose(data, expected, rtol=1e-12, atol=0)
+
+    def test_invalid(self):
+        mesh = build_mesh(1)
+        with pytest.raises(ValueError):
+            PointReceiver(mesh, (0.5,)).padded_sampling(0)
+
+
+class TestInterpolationCache(object):
+
+    def setup(self):
+        self.mesh = build_mesh(1)
+        self.ts = np.linspace(0.0, 1.0, 51)
+        self.ts_new = np.linspace(0.0, 1.0, 73)
+
+    def build_receivers(self, **kwargs):
+        receivers = ReceiverSet(self.mesh, [PointReceiver(self.mesh, (0.1*i,), time_window=('Box', 0.2, None))
+                                            for i in range(1, 5)], **kwargs)
+        receivers.reset_time_series(self.ts)
+        receivers.data = np.random.rand(len(self.ts), 4)
+        return receivers
+
+    @pytest.mark.parametrize('memmap', [False, True])
+    def test_cache(self, memmap, tmpdir):
+        receivers = self.build_receivers(cache_dir=str(tmpdir) if memmap else None)
+
+        d = receivers.interpolate_data(self.ts_new)
+        expected = np.array([np.interp(self.ts_new, self.ts, receivers.data[:, i])
+                             for i in range(4)]).T * (self.ts_new > 0.2).reshape((-1, 1))
+        assert np.allclose(d, expected)
+        assert not d.flags.writeable
+        assert receivers.interpolate_data(self.ts_new.copy()) is d
+
+        # New data invalidate the cache
+        receivers.data = 2.0*receivers.data
+        d2 = receivers.interpolate_data(self.ts_new)
+        assert d2 is not d
+        assert np.allclose(d2, 2.0*expected)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from pysit import (PML, RectangularDomain, CartesianMesh, PointSource,
+                   SourceSet, RickerWavelet)
+
+
+def build_mesh(dim):
+    pml = PML(0.1, 100)
+    if dim == 1:
+        d = RectangularDomain((0.0, 1.0, pml, pml))
+        return CartesianMesh(d, 51)
+    else:
+        d = RectangularDomain((0.0, 1.0, pml, pml), (0.0, 0.8, pml, pml))
+        return CartesianMesh(d, 31, 21)
+
+
+class TestSourceInjection(object):
+
+    @pytest.mark.parametrize('dim', [1, 2])
+    @pytest.mark.parametrize('n_sources', [1, 3])
+    def test_matches_f(self, dim, n_sources):
+        mesh = build_mesh(dim)
+        positions = [(0.3 + 0.2*i,) if dim == 1 else (0.3 + 0.2*i, 0.2)
+                     for i in range(n_sources)]
+        sources = [PointSource(mesh, pos, RickerWavelet(10.0), intensity=1.0+i)
+                   for i, pos in enumerate(positions)]
+        source = sources[0] if n_sources == 1 else SourceSet(mesh, sources)
+
+        dt = 0.002
+        ts = dt*np.arange(40)
+        injection = source.injection(ts)
+        bulk = mesh.pad_index(np.arange(mesh.dof()))
+
+        rhs = injection.zeros()
+        for k in [0, 10, 25, 39]:
+            rhs = injection.inject(rhs, k)
+            expected = np.asarray(source.f(k*dt)).ravel()
+            assert np.allclose(rhs.reshape(-1)[bulk], expected, rtol=1e-12, atol=0)
+            assert np.isclose(np.abs(rhs).sum(), np.abs(expected).sum())
+
+    def test_pad_index(self):
+        mesh = build_mesh(2)
+        sh = mesh.shape(include_bc=True, as_grid=True)
+        nx, nz = mesh.shape(as_grid=True)
+        nl = [mesh.parameters[i].lbc.n for i in range(2)]
+
+        idx = mesh.pad_index([0, nz-1, nz, nx*nz-1])
+        expected = [(nl[0], nl[1]), (nl[0], nl[1]+nz-1),
+                    (nl[0]+1, nl[1]), (nl[0]+nx-1, nl[1]+nz-1)]
+        assert list(idx) == [np.ravel_multi_index(e, sh) for e in expected]
@@ -4,4 +4,7 @@ from pysit.modeling.data_modeling import *
 
 from pysit.modeling.temporal_modeling import *
 from pysit.modeling.hybrid_modeling import *
-from pysit.modeling.frequency_modeling import *
\ No newline at end of file
+from pysit.modeling.frequency_modeling import *
+from pysit.modeling.snapshot_codecs import *
+from pysit.modeling.wavefield_store import *
+from pysit.modeling.extended_imaging import *
@@ -13,12 +13,14 @@ from pysit.modeling.temporal_modeling import TemporalModeling
 import os
 
 __all__ = ['generate_seismic_data', 'generate_seismic_data_from_file',
-           'generate_shot_data_time', 'generate_shot_data_frequency',
+           'generate_shot_data_time', 'generate_shot_data_time_batch',
+           'generate_shot_data_frequency',
            'generate_seismic_linearized_data', 'generate_shot_linearized_data_frequency']
 __docformat__ = "restructuredtext en"
 
 
-def generate_seismic_data(shots, solver, model, ts=None, verbose=False, frequencies=None, save_method=None, **kwargs):
+def generate_seismic_data(shots, solver, model, ts=None, verbose=False, frequencies=None, save_method=None,
+                          shot_batch_size=None, **kwargs):
     """Given a list of shots and a solver, generates seismic data.
 
     Parameters
@@ -27,6 +29,9 @@ def generate_seismic_data(shots, solver, model, ts=None, verbose=False, frequenc
         Collection of shots to be processed
     solver : pysit.WaveSolver
         Instance of wave solver to be used.
+    shot_batch_size : int, optional
+        For time solvers, number of shots propagated together by
+        `generate_shot_data_time_batch`.  Defaults to one shot at a time.
     **kwargs : dict, optional
         Optional arguments.
 
@@ -40,7 +45,15 @@ def generate_seismic_data(shots, solver, model, ts=None, verbose=False, frequenc
         print('Generating data...')
         tt = time.time()
 
-    if solver.supports['equation_dynamics'] == "time":
+    if solver.supports['equation_dynamics'] == "time" and shot_batch_size is not None:
+        for i in range(0, len(shots), shot_batch_size):
+            batch = shots[i:i+shot_batch_size]
+            generate_shot_data_time_batch(batch, solver, model, verbose=verbose, **kwargs)
+            if ts is not None:
+                for shot in batch:
+                    shot.receivers.interpolate_data(ts, changedata=True)
+
+    elif solver.supports['equation_dynamics'] == "time":
         for shot in shots:
             generate_shot_data_time(shot, solver, model, verbose=verbose, **kwargs)
             if ts is not None:
@@ -50,14 +63,10 @@ def generate_seismic_data(shots, solver, model, ts=None, verbose=False, frequenc
     elif solver.supports['equation_dynamics'] == "frequency":
         if frequencies is None:
             raise TypeError('A frequency solver is passed, but no frequencies are given')
-        elif 'petsc' in kwargs and kwargs['petsc'] is not None:
-            # solve the Helmholtz operator for several rhs
+        else:
+            # solve the Helmholtz operator for all shots at once
             generate_shot_data_frequency_list(
                 shots, solver, model, frequencies, verbose=verbose, **kwargs)
-        else:
-            for shot in shots:
-                generate_shot_data_frequency(
-                    shot, solver, model, frequencies, verbose=verbose, **kwargs)
 
     else:
         raise TypeError("A time or frequency solver must be specified.")
@@ -435,6 +444,51 @@ def generate_seismic_data_from_file(shots, solver, verbose=False, save_method=No
         print('Data Loading: {0}s/shot'.format(load_tt/len(shots)))
 
 
+def generate_shot_data_time_batch(shots, solver, model, verbose=False, **kwargs):
+    """Given several shots and a solver, generates seismic data at the
+    specified receivers of each shot, propagating the shots together.
+
+    The wavefields of all shots are advanced at once with the solver's
+    batched time step, see `TemporalModeling.forward_model_batch`.  If the
+    solver has no batched time step, or if wavefields or sampling options
+    are requested through `kwargs`, the shots are processed one at a time by
+    `generate_shot_data_time`.
+
+    Parameters
+    ----------
+    shots : list of pysit.Shot
+        Collection of shots to be processed
+    solver : pysit.WaveSolver
+        Instance of wave solver to be used.
+    model : solver.ModelParameters
+        Wave equation parameters used for generating data.
+    verbose : boolean
+        Verbosity flag.
+
+    """
+
+    if solver.supports['equation_dynamics'] != "time":
+        raise TypeError('Solver must be a time solver to generate data.')
+
+    if kwargs or not getattr(solver, 'supports_batched_time_step', False):
+        for shot in shots:
+            generate_shot_data_time(shot, solver, model, verbose=verbose, **kwargs)
+        return
+
+    solver.model_parameters = model
+
+    ts = solver.ts()
+    for shot in shots:
+        shot.reset_time_series(ts)
+        shot.dt = solver.dt
+        shot.trange = solver.trange
+
+    retvals = TemporalModeling(solver).forward_model_batch(shots, model, return_parameters=['simdata'])
+
+    for shot, retval in zip(shots, retvals):
+        shot.receivers.data[:] = retval['simdata']
+
+
 def generate_shot_data_time(shot, solver, model, wavefields=None, wavefields_padded=None, verbose=False, **kwargs):
     """Given a shots and a solver, generates seismic data at the specified
     receivers.
@@ -522,7 +576,7 @@ def generate_shot_data_time(shot, solver, model, wavefields=None, wavefields_pad
         else:
             # shift time forward
             rhs_k, rhs_kp1 = rhs_kp1, rhs_k
-            rhs_kp1 = mesh.pad_array(source.f((k+1)*dt), out_array=rhs_kp1)
+            rhs_kp1 = mesh.pad_into(source.f((k+1)*dt), rhs_kp1)
 
         # Given the state at k and k-1, compute the state at k+1
         solver.time_step(solver_data, rhs_k, rhs_kp1)
@@ -600,37 +654,20 @@ def generate_shot_data_frequency_list(shots, solver, model, frequencies, verbose
     * uhat is used to generically refer to the DFT of u that is needed to compute the imaging condition.
 
     """
-    # number of shot varaible
-    nshot = len(shots)
-    # Local references
-    solver.model_parameters = model
-
-    mesh = solver.mesh
-
     # Sanitize the input
     if not np.iterable(frequencies):
         frequencies = [frequencies]
 
-    rhs = solver.WavefieldVector(mesh, dtype=solver.dtype)
-    # decalare a list for the Right Hand Side
-    RHS = list()
+    # all shots are solved together, one block of right hand sides per
+    # frequency, with petsc if kwargs['petsc'] names a direct solver
+    retval = FrequencyModeling(solver).forward_model_list(shots, model, frequencies,
+                                                          return_parameters=['simdata'],
+                                                          petsc=kwargs.get('petsc', None))
 
-    for nu in frequencies:
-        del RHS[:]
-        for k in range(nshot):
-            shot = shots[k]
-            source = shot.sources
-            rhs = solver.build_rhs(mesh.pad_array(source.f(nu=nu)), rhs_wavefieldvector=rhs)
-            RHS.append(rhs.data.copy())
-
-        Uhat = solver.solve_petsc_uhat(solver, RHS, nu, **kwargs)
-        for k in range(nshot):
-            shot = shots[k]
-            uhat = Uhat[:, k]
-            # Giving the good dimension to the array
-            uhat = np.expand_dims(uhat, axis=1)
+    for k in range(len(shots)):
+        for nu in frequencies:
             # Record the data at frequency nu
-            shot.receivers.sample_data_from_array(mesh.unpad_array(uhat), nu=nu)
+            shots[k].receivers.data_dft[nu] = retval['simdata'][k][nu]
 
 
 def generate_shot_linearized_data_frequency(shots, solver, model, model_perturbation, frequencies, **kwargs):
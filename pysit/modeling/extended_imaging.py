@@ -0,0 +1,131 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+__all__ = ['SubsurfaceOffsetImaging']
+
+__docformat__ = "restructuredtext en"
+
+
+class SubsurfaceOffsetImaging(object):
+    """ Subsurface offset imaging condition and extended Born source, for all
+        offsets at once.
+
+    For offset index ih, the extended image correlates u, shifted by ih
+    offsets to the right, with v, shifted by ih offsets to the left, over the
+    subsurface region of an ExtendedModelingParameter2D.  In the padded grid,
+    the shifted regions of all offsets are strided views of the wavefields,
+    with the offset as their first axis, so that the imaging condition is one
+    broadcast product.  The extended source, which scatters the products of
+    the offsets to overlapping regions, is assembled in a preallocated buffer
+    in which every offset has its own row, and summed over the offsets.
+
+    Parameters
+    ----------
+    mesh : pysit.CartesianMesh
+        Two dimensional mesh of the wavefields.
+    extended : pysit.solvers.model_parameter.ExtendedModelingParameter2D
+        Extended model, which defines the subsurface region and the offsets.
+
+    Notes
+    -----
+    Images and extended models are arrays of shape (nh, nx_sub, nz), see
+    `gathers`.  In that layout, the offsets of a grid point are contiguous
+    neither in the images nor in the data of ExtendedModelingParameter2D,
+    which is of shape (nx_sub*nz, nh).
+
+    """
+
+    def __init__(self, mesh, extended):
+
+        self.sh_grid = tuple(mesh.shape(include_bc=True, as_grid=True))
+        self.nh = extended.sh_data[1]
+        self.sh_sub = tuple(extended.sh_sub)
+        self.sh_image = (self.nh,) + self.sh_sub
+
+        nx_sub, nz = self.sh_sub
+        nzp = self.sh_grid[1]
+
+        # Shift of one offset, in grid points along x
+        self.shift = extended.skip_index // nzp
+        self.x_u = extended.n_bcx_extend_u[0, 0]
+        self.x_v = extended.n_bcx_extend_v[0, 0]
+        self.z = mesh.parameters[1].lbc.n
+
+        # Rows of the grid spanned by the regions of u and of v
+        span = (self.nh-1)*self.shift
+        if (self.x_u < 0 or self.x_u + span + nx_sub > self.sh_grid[0] or
+                self.x_v - span < 0 or self.x_v + nx_sub > self.sh_grid[0]):
+            raise ValueError('Subsurface offsets reach beyond the padded grid.')
+
+        # Source buffer: row ih holds the products of offset ih at rows
+        # (nh-1-ih)*shift + [0, nx_sub) of the region spanned by v
+        self._source = np.zeros((self.nh, nx_sub + span, nz))
+        self._product = np.empty(self.sh_image)
+
+    def _offsets(self, grid, x0, step):
+        # View of shape (nh, nx_sub, nz), whose slice ih is the region of
+        # grid starting at row x0 + ih*step
+        sx, sz = grid.strides
+        return as_strided(grid[x0:, self.z:], shape=self.sh_image,
+                          strides=(step*sx, sx, sz), writeable=False)
+
+    def _grid(self, wavefield):
+        return np.ascontiguousarray(wavefield, dtype=np.float64).reshape(self.sh_grid)
+
+    def gathers(self, data):
+        """ Rearranges the data of an ExtendedModelingParameter2D, of shape
+            (nx_sub*nz, nh), to shape (nh, nx_sub, nz). """
+        return np.ascontiguousarray(data.T).reshape(self.sh_image)
+
+    def data(self, image):
+        """ Rearranges an image of shape (nh, nx_sub, nz) to the data layout of
+            ExtendedModelingParameter2D. """
+        return image.reshape((self.nh, -1)).T
+
+    def correlate(self, u, v, image):
+        """ Adds the extended imaging condition of the padded wavefields u and
+            v to `image`, of shape (nh, nx_sub, nz). """
+        u = self._offsets(self._grid(u), self.x_u, self.shift)
+        # v is shifted to the left, i.e., with a negative stride
+        v_grid = self._grid(v)
+        sx, sz = v_grid.strides
+        v = as_strided(v_grid[self.x_v:, self.z:], shape=self.sh_image,
+                       strides=(-self.shift*sx, sx, sz), writeable=False)
+
+        np.multiply(u, v, out=self._product)
+        image += self._product
+        return image
+
+    def source(self, gathers, u, out=None):
+        """ Returns the extended Born source -sum_h m1_h u_h of the padded
+            wavefield u, as a padded vector.
+
+        Parameters
+        ----------
+        gathers : ndarray
+            Extended model perturbation, of shape (nh, nx_sub, nz).
+        u : ndarray
+            Padded wavefield, usually the imaging component of the forward
+            wavefield.
+        out : ndarray, optional
+            A vector previously returned by `source`, which is overwritten.
+
+        """
+
+        nx_sub, nz = self.sh_sub
+        span = (self.nh-1)*self.shift
+
+        # Row ih of the buffer holds the products of offset ih, at the place
+        # of its region of v; the rows do not overlap, so that all products
+        # are one ufunc call, and the sum over the rows scatters them
+        s0, sx, sz = self._source.strides
+        rows = as_strided(self._source[0, span:], shape=self.sh_image,
+                          strides=(s0 - self.shift*sx, sx, sz))
+        np.multiply(gathers, self._offsets(self._grid(u), self.x_u, self.shift), out=rows)
+
+        if out is None:
+            out = np.zeros((np.prod(self.sh_grid), 1))
+        region = out.reshape(self.sh_grid)[self.x_v-span:self.x_v+nx_sub, self.z:self.z+nz]
+        np.sum(self._source, axis=0, out=region)
+        np.negative(region, out=region)
+        return out
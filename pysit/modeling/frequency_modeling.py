@@ -4,10 +4,12 @@ import itertools
 from pysit.util.derivatives import build_derivative_matrix, build_permutation_matrix, build_heterogenous_matrices
 from pysit.solvers.model_parameter import *
 import sys
-import copy
 import numpy as np
+import scipy.sparse as spsp
 from numpy.random import uniform
 
+from pysit.core.receivers import PointReceiver
+
 __all__ = ['FrequencyModeling']
 
 __docformat__ = "restructuredtext en"
@@ -128,6 +130,11 @@ class FrequencyModeling(object):
     def forward_model_list(self, shot_list, m0, frequencies, return_parameters=[], **kwargs):
         """Applies the forward model to the model for the given solver and severals shots
 
+        At each frequency, the right hand sides of all shots are stacked as
+        the columns of one block, which is solved with a single factorization
+        of the Helmholtz operator, and the receivers of all shots are sampled
+        with one sparse product.
+
         Parameters
         ----------
         shot_list : list of pysit.Shot
@@ -135,11 +142,15 @@ class FrequencyModeling(object):
         frequencies : list of 2-tuples
             2-tuple, first element is the frequency to use, second element the weight.
         return_parameters : list of {'wavefield', 'simdata', 'simdata_time', 'dWaveOp'}
+        petsc : str, optional
+            Petsc direct solver, e.g., 'mumps', used for the block solves
+            instead of the solver's own factorization.
 
         Returns
         -------
         retval : dict
-            Dictionary whose keys are return_parameters that contains the specified data.
+            Dictionary whose keys are return_parameters that contains the
+            specified data, as dictionaries keyed by the index of the shot.
 
         Notes
         -----
@@ -148,20 +159,7 @@ class FrequencyModeling(object):
 
         """
 
-        # importing the Petsc libraries for the multiple rhs solve
-        try:
-            import petsc4py
-            petsc4py.init(sys.argv)
-            from petsc4py import PETSc
-            from pysit.util.wrappers.petsc import PetscWrapper
-        except ImportError:
-            raise ImportError('petsc4py is not installed, please install it and try again')
-
-        flag = 'petsc' in kwargs
-        if flag == 0:
-            petsc = None
-        else:
-            petsc = kwargs['petsc']
+        petsc = kwargs.get('petsc', None)
 
         # Local references
         solver = self.solver
@@ -172,14 +170,31 @@ class FrequencyModeling(object):
 
         d = solver.domain
 
+        nshots = len(shot_list)
+        dof = mesh.dof(include_bc=True)
+
         # Sanitize the input
         if not np.iterable(frequencies):
             frequencies = [frequencies]
 
+        # Nothing to solve, e.g., on a rank without local shots
+        if nshots == 0:
+            return {key: dict() for key in ['dWaveOp', 'simdata', 'wavefield'] if key in return_parameters}
+
         # Setup data storage for the forward modeled data
         if 'simdata' in return_parameters:
             Simdata = dict()
 
+            # The receivers of shot i sample column i of the solution block,
+            # so all shots are sampled by one block diagonal operator applied
+            # to the gathered receiver nodes.
+            samplings = [shot.receivers.padded_sampling() for shot in shot_list]
+            sample_rows = np.concatenate([s.padded_indices for s in samplings])
+            sample_cols = np.concatenate([np.full(len(s.padded_indices), i, dtype=int)
+                                          for i, s in enumerate(samplings)])
+            sampling_operator = spsp.block_diag([s.operator for s in samplings], format='csr')
+            sample_offsets = np.cumsum([0] + [s.operator.shape[0] for s in samplings])
+
         # Storage for the derivative of the propagation operator with respect to the model \frac{d\script{L}}{dm}
         if 'dWaveOp' in return_parameters:
             DWaveOp = dict()
@@ -188,16 +203,7 @@ class FrequencyModeling(object):
         # Uhats is a dictionnary of dictionnary
         Uhats = dict()
 
-        # Step k = 0
-        # p_0 is a zero array because if we assume the input signal is causal
-        # and we assume that the initial system (i.e., p_(-2) and p_(-1)) is
-        # uniformly zero, then the leapfrog scheme would compute that p_0 = 0 as
-        # well. ukm1 is needed to compute the temporal derivative.
-
-        solver_data_list = list()
-        for i in range(len(shot_list)):
-            solver_data = solver.SolverData()
-            solver_data_list.append(solver_data)
+        for i in range(nshots):
             Uhats[i] = dict()
             if 'simdata' in return_parameters:
                 Simdata[i] = dict()
@@ -205,37 +211,36 @@ class FrequencyModeling(object):
             if 'dWaveOp' in return_parameters:
                 DWaveOp[i] = dict()
 
-        rhs_list = list()
+        rhs = solver.WavefieldVector(mesh, dtype=solver.dtype)
+        rhs_block = np.zeros((rhs.data.shape[0], nshots), dtype=solver.dtype)
 
         for nu in frequencies:
-            del rhs_list[:]
-            rhs = solver.WavefieldVector(mesh, dtype=solver.dtype)
-            for i in range(len(shot_list)):
+            for i in range(nshots):
                 source = shot_list[i].sources
                 rhs = solver.build_rhs(mesh.pad_array(source.f(nu=nu)), rhs_wavefieldvector=rhs)
-                rhs_list.append(rhs.data.copy())
+                rhs_block[:, i] = rhs.data[:, 0]
 
-            if petsc is True:
-                result = solver.solve_petsc(solver_data_list, rhs_list, nu, **kwargs)
-            else:
-                for i in range(len(shot_list)):
-                    result = solver.solve(solver_data_list[i], rhs_list[i], nu)
-
-            for i in range(len(shot_list)):
+            Uhat = solver.solve_block(rhs_block, nu, petsc=petsc)
+            Uhat = Uhat.reshape(-1, nshots)[:dof]
 
-                uhat = solver_data_list[i].k.primary_wavefield
-                # Save the unpadded wavefield
-                if 'wavefield' in return_parameters:
-                    Uhats[i][nu] = mesh.unpad_array(uhat, copy=True)
+            # Save the unpadded wavefield
+            if 'wavefield' in return_parameters:
+                for i in range(nshots):
+                    Uhats[i][nu] = mesh.unpad_array(Uhat[:, i:i+1], copy=True)
 
-                # Record the data at t_k
-                if 'simdata' in return_parameters:
-                    Simdata[i][nu] = shot_list[i].receivers.sample_data_from_array(
-                        mesh.unpad_array(uhat))
+            # Record the data at t_k
+            if 'simdata' in return_parameters:
+                data = sampling_operator.dot(Uhat[sample_rows, sample_cols])
+                for i, shot in enumerate(shot_list):
+                    v = data[sample_offsets[i]:sample_offsets[i+1]].reshape(1, -1)
+                    # match the shapes returned by sample_data_from_array
+                    Simdata[i][nu] = v[0, 0] if isinstance(shot.receivers, PointReceiver) else v
 
-                # Save the derivative
-                if 'dWaveOp' in return_parameters:
-                    DWaveOp[i][nu] = solver.compute_dWaveOp('frequency', uhat, nu)
+            # Save the derivative
+            if 'dWaveOp' in return_parameters:
+                dWaveOps = solver.compute_dWaveOp('frequency', Uhat, nu)
+                for i in range(nshots):
+                    DWaveOp[i][nu] = dWaveOps[:, i:i+1]
 
         retval = dict()
 
@@ -664,11 +669,11 @@ class FrequencyModeling(object):
             sh = mesh.shape(include_bc=True, as_grid=True)
             D1, D2 = build_heterogenous_matrices(sh, deltas)
 
-        solver_data_list = list()
+        nshots = len(shots_list)
+        dof = mesh.dof(include_bc=True)
+
         # initialisation for the muliple rhs resolution
-        for i in range(len(shots_list)):
-            solver_data = solver.SolverData()
-            solver_data_list.append(solver_data)
+        for i in range(nshots):
             Qhats[i] = dict()
             if 'imaging_condition' in return_parameters:
                 Ic[i] = solver.model_parameters.perturbation(dtype=np.complex)
@@ -676,15 +681,14 @@ class FrequencyModeling(object):
             if 'dWaveOpAdj' in return_parameters:
                 DWaveOpAdj[i] = dict()
 
-        rhs_list = list()
+        rhs = solver.WavefieldVector(mesh, dtype=solver.dtype)
+        rhs_block = np.zeros((rhs.data.shape[0], nshots), dtype=solver.dtype)
         if operand_model is not None:
             operand_model = operand_model.with_padding()
 
         for nu in frequencies:
 
-            del rhs_list[:]
-            for i in range(len(shots_list)):
-                rhs = solver.WavefieldVector(mesh, dtype=solver.dtype)
+            for i in range(nshots):
                 rhs_ = mesh.pad_array(shots_list[i].receivers.extend_data_to_array(
                     data=operand_simdata[i][nu]))
                 if (operand_dWaveOpAdj is not None) and (operand_model is not None):
@@ -694,12 +698,13 @@ class FrequencyModeling(object):
                                     dWaveOpAdj_nu.reshape(operand_model.shape), rhs_.shape)
 
                 rhs = solver.build_rhs(rhs_, rhs_wavefieldvector=rhs)
-                np.conj(rhs.data, rhs.data)
-                rhs_list.append(rhs.data.copy())
+                np.conj(rhs.data[:, 0], rhs_block[:, i])
 
-            result = solver.solve_petsc(solver_data_list, rhs_list, nu, **kwargs)
+            # all shots are solved with a single factorization
+            Vhat = solver.solve_block(rhs_block, nu, petsc=kwargs.get('petsc', None))
+            Vhat = Vhat.reshape(-1, nshots)[:dof]
 
-            for i in range(len(shots_list)):
+            for i in range(nshots):
                 # If we are dealing with variable density, we will need these values computed for the imagining condition in terms of m2.
                 if hasattr(m0, 'kappa') and hasattr(m0, 'rho'):
                     uhat = wavefield[i][nu]
@@ -707,8 +712,7 @@ class FrequencyModeling(object):
                     # Need the conj. of grad (uhat)
                     D1u, D2u = np.conj(D1[0]*uhat), np.conj(D2[0]*uhat)
 
-                vhat = solver_data_list[i].k.primary_wavefield
-                qhat = np.conj(vhat, vhat)
+                qhat = np.conj(Vhat[:, i:i+1])
                 if 'adjointfield' in return_parameters:
                     Qhats[i][nu] = mesh.unpad_array(qhat, copy=True)
                 if 'dWaveOpAdj' in return_parameters:
@@ -829,11 +833,7 @@ class FrequencyModeling(object):
             freq_weights = {nu: weight for nu, weight in zip(
                 frequencies, frequency_weights)}
 
-        sh_sub = Ic.sh_sub
-        dof_sub = Ic.dof_sub
-
-        # Create a fake mesh structrue to perform intermediate padding and unpadding operators
-        mesh_ih = copy.deepcopy(mesh)
+            index_u, index_v = Ic.offset_padding_index(mesh)
 
         if hasattr(m0, 'kappa') and hasattr(m0, 'rho'):
             deltas = [mesh.x.delta, mesh.z.delta]
@@ -901,27 +901,10 @@ class FrequencyModeling(object):
                         Ic[i].kappa -= weight*qhat*np.conj(dWaveOp[i][nu])
                     else:
                         # note, no dnu here because the nus are not generally the complete set, so dnu makes little sense, otherwise dnu = 1./(nsteps*dt)
-                        for ih in range(0, nh):
-                            n_bcx_extend_u_ih = Ic.n_bcx_extend_u[ih, :]
-                            n_bcx_extend_v_ih = Ic.n_bcx_extend_v[ih, :]
-
-                            mesh._shapes[(False, False)] = (dof_sub, 1)
-                            mesh._shapes[(False, True)] = sh_sub
-                            mesh.parameters[0].lbc._n = n_bcx_extend_u_ih[0]
-                            mesh.parameters[0].rbc._n = n_bcx_extend_u_ih[1]
-
-                            u_tmp = mesh.unpad_array(np.conj(dWaveOp[i][nu]))
-
-                            mesh.parameters[0].lbc._n = n_bcx_extend_v_ih[0]
-                            mesh.parameters[0].rbc._n = n_bcx_extend_v_ih[1]
-                            v_tmp = mesh.unpad_array(qhat)
-
-                            mesh._shapes[(False, False)] = mesh_ih._shapes[(False, False)]
-                            mesh._shapes[(False, True)] = mesh_ih._shapes[(False, True)]
-                            mesh.parameters[0].lbc._n = mesh_ih.parameters[0]['lbc'].n
-                            mesh.parameters[0].rbc._n = mesh_ih.parameters[0]['rbc'].n
-
-                            Ic_data_tmp[:, ih] = (weight*v_tmp*u_tmp).reshape((-1,))
+                        u_tmp = np.conj(dWaveOp[i][nu]).reshape(-1)[index_u]
+                        v_tmp = qhat.reshape(-1)[index_v]
+                        np.multiply(v_tmp, u_tmp, out=Ic_data_tmp)
+                        Ic_data_tmp *= weight
 
                         Ic.data -= Ic_data_tmp
 
@@ -1130,11 +1113,7 @@ class FrequencyModeling(object):
         rhs = solver.WavefieldVector(mesh, dtype=solver.dtype)
         rhslin = solver.WavefieldVector(mesh, dtype=solver.dtype)
 
-        sh_sub = m1_extend.sh_sub
-        dof_sub = m1_extend.dof_sub
-
-        # Create a fake mesh structrue to perform intermediate padding and unpadding operators
-        mesh_ih = copy.deepcopy(mesh)
+        index_u, index_v = m1_extend.offset_padding_index(mesh)
 
         for i in range(len(shots)):
             shot = shots[i]
@@ -1165,32 +1144,13 @@ class FrequencyModeling(object):
                 if 'dWaveOp0' in return_parameters:
                     DWaveOp0ret[i][nu] = dWaveOp0_nu
 
-                rhslin.data = 0.0
-                for ih in range(0, nh):
-                    m1_ih = m1_extend.data[:, ih]
-                    m1_ih = m1_ih.reshape((m1_ih.size, 1))
-                    n_bcx_extend_u_ih = m1_extend.n_bcx_extend_u[ih, :]
-                    n_bcx_extend_v_ih = m1_extend.n_bcx_extend_v[ih, :]
-
-                    mesh._shapes[(False, False)] = (dof_sub, 1)
-                    mesh._shapes[(False, True)] = sh_sub
-                    mesh.parameters[0].lbc._n = n_bcx_extend_u_ih[0]
-                    mesh.parameters[0].rbc._n = n_bcx_extend_u_ih[1]
-                    rhs_ = m1_ih * (mesh.unpad_array(-1*dWaveOp0_nu))
-
-                    mesh.parameters[0].lbc._n = n_bcx_extend_v_ih[0]
-                    mesh.parameters[0].rbc._n = n_bcx_extend_v_ih[1]
-                    rhs_ = mesh.pad_array(rhs_)
-
-                    mesh._shapes[(False, False)] = mesh_ih._shapes[(False, False)]
-                    mesh._shapes[(False, True)] = mesh_ih._shapes[(False, True)]
-                    mesh.parameters[0].lbc._n = mesh_ih.parameters[0]['lbc'].n
-                    mesh.parameters[0].rbc._n = mesh_ih.parameters[0]['rbc'].n
-
-                    # rhs_ = m1_padded*(-1*dWaveOp0_nu)
-                    # make the rhs vector the correct length
-                    rhs_tmp = solver.build_rhs(rhs_, rhs_wavefieldvector=rhs)
-                    rhslin.data = rhslin.data + rhs_tmp.data
+                # Extended source: the products of every offset, scattered to
+                # the regions seen by v
+                rhs_ = np.zeros((mesh.dof(include_bc=True), 1), dtype=np.result_type(dWaveOp0_nu, m1_extend.data))
+                np.add.at(rhs_[:, 0], index_v, -m1_extend.data * dWaveOp0_nu.reshape(-1)[index_u])
+
+                # make the rhs vector the correct length
+                rhslin = solver.build_rhs(rhs_, rhs_wavefieldvector=rhslin)
 
                 solver.solve(solver_data, rhslin, nu)
 
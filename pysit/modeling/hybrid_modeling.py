@@ -5,11 +5,86 @@ import math
 import copy
 
 import numpy as np
+from scipy.linalg.blas import dger
 
 __all__ = ['HybridModeling']
 
 __docformat__ = "restructuredtext en"
 
+
+class _OnTheFlyDFT(object):
+    """Accumulates the DFT of a wavefield at several frequencies while it is
+    time stepped.
+
+    Frequencies with the same subsampling interval form a group, whose real
+    and imaginary accumulators are the columns of two Fortran ordered arrays.
+    A sampled time step updates each of them with one in-place rank-1 BLAS
+    update, accumulator += u * w, where w holds the phasors
+    exp(-1j*2*pi*nu*tau)*dt*idx of the group, so no complex temporaries of
+    the size of the grid are allocated.
+
+    With `region` 'bulk', only the unpadded part of the wavefield is
+    transformed and the padding of the results is zero.
+
+    """
+
+    def __init__(self, mesh, frequencies, subsample_indices, dt, region='full'):
+
+        if region not in ['full', 'bulk']:
+            raise ValueError("DFT region must be 'full' or 'bulk'.")
+
+        self.frequencies = list(frequencies)
+        self.dt = dt
+
+        self.padded_size = mesh.shape(include_bc=True)[0]
+        if region == 'bulk':
+            self.indices = mesh.padding_plan.interior_indices
+            n = self.indices.size
+        else:
+            self.indices = None
+            n = self.padded_size
+
+        groups = dict()
+        for nu in self.frequencies:
+            groups.setdefault(subsample_indices[nu], list()).append(nu)
+
+        self.groups = list()
+        for idx, nus in groups.items():
+            self.groups.append((idx,
+                                np.array(nus, dtype=np.float64),
+                                np.zeros((n, len(nus)), order='F'),
+                                np.zeros((n, len(nus)), order='F')))
+
+    def accumulate(self, u, k, tau):
+        """Adds the wavefield `u` at time `tau` to the groups sampled at step
+        `k`."""
+        x = None
+        for idx, nus, re, im in self.groups:
+            if k % idx != 0:
+                continue
+            if x is None:
+                x = np.asarray(u, dtype=np.float64).reshape(-1)
+                if self.indices is not None:
+                    x = x[self.indices]
+            w = np.exp(-1j*2*np.pi*nus*tau)*(self.dt*idx)
+            dger(1.0, x, w.real, a=re, overwrite_a=1)
+            dger(1.0, x, w.imag, a=im, overwrite_a=1)
+
+    def results(self):
+        """Returns the dictionary of the padded, vector shaped DFTs at each
+        frequency."""
+        uhats = dict()
+        for idx, nus, re, im in self.groups:
+            for j, nu in enumerate(nus):
+                uhat = np.zeros((self.padded_size, 1), dtype=np.complex128)
+                values = re[:, j] + 1j*im[:, j]
+                if self.indices is None:
+                    uhat[:, 0] = values
+                else:
+                    uhat[self.indices, 0] = values
+                uhats[nu] = uhat
+        return {nu: uhats[nu] for nu in self.frequencies}
+
 class HybridModeling(object):
     """Class containing a collection of methods needed for seismic inversion in
     the frequency domain.
@@ -38,13 +113,17 @@ class HybridModeling(object):
     @property
     def modeling_type(self): return "frequency"
 
-    def __init__(self, solver, dft_points_per_period=12.0, adjoint_energy_threshold=1e-5):
+    def __init__(self, solver, dft_points_per_period=12.0, adjoint_energy_threshold=1e-5, dft_region='full'):
         """Constructor for the FrequencyInversion class.
 
         Parameters
         ----------
         solver : pysit wave solver object
             A wave solver that inherits from pysit.solvers.WaveSolverBase
+        dft_region : {'full', 'bulk'}, optional
+            Part of the padded grid on which the wavefields are transformed.
+            With 'bulk', the DFTs are zero in the padding, which suffices for
+            the data, the returned wavefields and the imaging condition.
 
         """
         if self.solver_type == solver.supports['equation_dynamics']:
@@ -58,8 +137,21 @@ class HybridModeling(object):
 
         self.adjoint_energy_threshold = adjoint_energy_threshold
 
+        if dft_region not in ['full', 'bulk']:
+            raise ValueError("DFT region must be 'full' or 'bulk'.")
+        self.dft_region = dft_region
+
+        self.receiver_block_size = 1
+
     def _setup_forward_rhs(self, rhs_array, data):
-        return self.solver.mesh.pad_array(data, out_array=rhs_array)
+        if rhs_array is None:
+            return self.solver.mesh.pad_array(data)
+        return self.solver.mesh.pad_into(data, rhs_array)
+
+    def _setup_forward_injection(self, source):
+        # Time indices 0 through nsteps+1 are needed, as the linearized model
+        # looks two steps ahead.
+        return source.injection(self.solver.dt*np.arange(self.solver.nsteps+2))
 
     def _compute_subsample_indices(self, frequencies):
 
@@ -76,6 +168,10 @@ class HybridModeling(object):
 
         return subsample_indices
 
+    def _setup_dft(self, frequencies):
+        return _OnTheFlyDFT(self.solver.mesh, frequencies, self._compute_subsample_indices(frequencies),
+                            self.solver.dt, region=self.dft_region)
+
     def forward_model(self, shot, m0, frequencies, return_parameters=[]):
         """Applies the forward model to the model for the given solver.
 
@@ -109,6 +205,7 @@ class HybridModeling(object):
         dt = solver.dt
         nsteps = solver.nsteps
         source = shot.sources
+        source_injection = self._setup_forward_injection(source)
 
         # Sanitize the input
         if not np.iterable(frequencies):
@@ -123,6 +220,7 @@ class HybridModeling(object):
         # Setup data storage for the forward modeled data (in time, if it is needed, and it frequently is)
         if 'simdata_time' in return_parameters:
             simdata_time = np.zeros((solver.nsteps, shot.receivers.receiver_count))
+            receiver_sampling = shot.receivers.padded_sampling(self.receiver_block_size)
 
         # Storage for the derivative of the propagation operator with respect to the model \frac{d\script{L}}{dm}
         if 'dWaveOp' in return_parameters:
@@ -131,11 +229,7 @@ class HybridModeling(object):
                 dWaveOp[nu] = 0.0
 
         # Initialize the DFT components
-        uhats = dict()
-        for nu in frequencies:
-            uhats[nu] = 0.0
-
-        subsample_indices = self._compute_subsample_indices(frequencies)
+        dft = self._setup_dft(frequencies)
 
         # Step k = 0
         # p_0 is a zero array because if we assume the input signal is causal
@@ -152,26 +246,22 @@ class HybridModeling(object):
             # Local reference
 
             uk = solver_data.k.primary_wavefield
-            uk_bulk = mesh.unpad_array(uk)
 
             # Record the data at t_k
             if 'simdata_time' in return_parameters:
-                shot.receivers.sample_data_from_array(uk_bulk, k, data=simdata_time)
+                receiver_sampling.sample(uk, k, simdata_time)
 
             t = k*dt
 
-            for nu in frequencies:
-                idx = subsample_indices[nu]
-                if np.mod(k, idx) == 0:
-                    uhats[nu] += uk*(np.exp(-1j*2*np.pi*nu*t)*dt*idx)
+            dft.accumulate(uk, k, t)
 
             if k == 0:
-                rhs_k = self._setup_forward_rhs(rhs_k, source.f(k*dt))
-                rhs_kp1 = self._setup_forward_rhs(rhs_kp1, source.f((k+1)*dt))
+                rhs_k = source_injection.inject(rhs_k, k)
+                rhs_kp1 = source_injection.inject(rhs_kp1, k+1)
             else:
                 # shift time forward
                 rhs_k, rhs_kp1 = rhs_kp1, rhs_k
-            rhs_kp1 = self._setup_forward_rhs(rhs_kp1, source.f((k+1)*dt))
+            rhs_kp1 = source_injection.inject(rhs_kp1, k+1)
 
             # Note, we compute result for k+1 even when k == nsteps-1.  We need
             # it for the time derivative at k=nsteps-1.
@@ -186,6 +276,8 @@ class HybridModeling(object):
             # k-1 <-- k, k <-- k+1, etc
             solver_data.advance()
 
+        uhats = dft.results()
+
         # Record the data at t_k
         if 'simdata' in return_parameters:
             for nu in frequencies:
@@ -269,7 +361,11 @@ class HybridModeling(object):
     def _setup_adjoint_rhs(self, rhs_array, shot, k, operand_simdata, operand_model, operand_dWaveOpAdj):
 
         # basic rhs is always the pseudodata or residual
-        rhs_array = self.solver.mesh.pad_array(shot.receivers.extend_data_to_array(k, data=operand_simdata), out_array=rhs_array)
+        data = shot.receivers.extend_data_to_array(k, data=operand_simdata)
+        if rhs_array is None:
+            rhs_array = self.solver.mesh.pad_array(data)
+        else:
+            rhs_array = self.solver.mesh.pad_into(data, rhs_array)
 
         # for Hessians, sometimes there is more to the rhs
         if (operand_dWaveOpAdj is not None) and (operand_model is not None):
@@ -336,11 +432,7 @@ class HybridModeling(object):
             frequencies = [frequencies]
 
         qhats = dict()
-        vhats = dict()
-        for nu in frequencies:
-            vhats[nu] = 0.0
-
-        subsample_indices = self._compute_subsample_indices(frequencies)
+        dft = self._setup_dft(frequencies)
 
         if 'dWaveOpAdj' in return_parameters:
             dWaveOpAdj = dict()
@@ -375,11 +467,8 @@ class HybridModeling(object):
             # When dpdt is not set, store the current q, otherwise compute the
             # relevant gradient portion
 
-            for nu in frequencies:
-                # Note, this compuation is the DFT, but we need the conjugate later, so rather than exp(-1j...) we use exp(1j...) to compute the conjugate now.
-                idx = subsample_indices[nu]
-                if np.mod(k, idx) == 0:
-                    vhats[nu] += vk*(np.exp(-1j*2*np.pi*nu*(solver.tf-t))*dt*idx)
+            # Note, this compuation is the DFT, but we need the conjugate later, so rather than exp(-1j...) we use exp(1j...) to compute the conjugate now.
+            dft.accumulate(vk, k, solver.tf-t)
 
             if k == nsteps-1:
                 rhs_k   = self._setup_adjoint_rhs( rhs_k,   shot, k,   operand_simdata, operand_model, operand_dWaveOpAdj)
@@ -413,16 +502,14 @@ class HybridModeling(object):
 #               print "Breaking early:", nsteps + k, k
                 break
 
-            for nu in frequencies:
-                idx = subsample_indices[nu]
-                if np.mod(k, idx) == 0:
-                    vhats[nu] += vk*(np.exp(-1j*2*np.pi*nu*(solver.tf-t))*dt*idx)
+            dft.accumulate(vk, k, solver.tf-t)
 
             solver.time_step(solver_data, rhs_k, rhs_k)
             solver_data.advance()
 
         retval = dict()
 
+        vhats = dft.results()
         for nu in frequencies:
             qhats[nu] = np.conj(vhats[nu],vhats[nu])
             # The next line accounts for the fact that not all frequencies are
@@ -495,13 +582,12 @@ class HybridModeling(object):
         dt = solver.dt
         nsteps = solver.nsteps
         source = shot.sources
+        source_injection = self._setup_forward_injection(source)
 
         m1_padded = m1.with_padding()
 
         # Storage for the field
-        u1hats = dict()
-        for nu in frequencies:
-            u1hats[nu] = 0.0
+        u1_dft = self._setup_dft(frequencies)
 
         # Setup data storage for the forward modeled data
         if 'simdata' in return_parameters:
@@ -510,14 +596,14 @@ class HybridModeling(object):
         # Setup data storage for the forward modeled data (in time, if it is needed, and it frequently is)
         if 'simdata_time' in return_parameters:
             simdata_time = np.zeros((solver.nsteps, shot.receivers.receiver_count))
+            receiver_sampling = shot.receivers.padded_sampling(self.receiver_block_size)
 
         # Storage for the time derivatives of p
         if 'dWaveOp0' in return_parameters:
             dWaveOp0 = dict()
-            u0hats = dict()
+            u0_dft = self._setup_dft(frequencies)
             for nu in frequencies:
                 dWaveOp0[nu] = 0.0
-                u0hats[nu] = 0.0
 
         # Storage for the time derivatives of p
         if 'dWaveOp1' in return_parameters:
@@ -525,8 +611,6 @@ class HybridModeling(object):
             for nu in frequencies:
                 dWaveOp1[nu] = 0.0
 
-        subsample_indices = self._compute_subsample_indices(frequencies)
-
         # Step k = 0
         # p_0 is a zero array because if we assume the input signal is causal
         # and we assume that the initial system (i.e., p_(-2) and p_(-1)) is
@@ -546,8 +630,8 @@ class HybridModeling(object):
         # For u0, set up the right hand sides
         rhs_u0_k   = np.zeros(mesh.shape(include_bc=True))
         rhs_u0_kp1 = np.zeros(mesh.shape(include_bc=True))
-        rhs_u0_k   = self._setup_forward_rhs(rhs_u0_k,   source.f(0*dt))
-        rhs_u0_kp1 = self._setup_forward_rhs(rhs_u0_kp1, source.f(1*dt))
+        rhs_u0_k   = source_injection.inject(rhs_u0_k, 0)
+        rhs_u0_kp1 = source_injection.inject(rhs_u0_kp1, 1)
 
         # compute u0_kp1 so that we can compute dWaveOp0_k (needed for u1)
         solver.time_step(solver_data_u0, rhs_u0_k, rhs_u0_kp1)
@@ -564,24 +648,17 @@ class HybridModeling(object):
         for k in range(nsteps):
 
             uk = solver_data.k.primary_wavefield
-            uk_bulk = mesh.unpad_array(uk)
 
             t = k*dt
 
             # Record the data at t_k
             if 'simdata_time' in return_parameters:
-                shot.receivers.sample_data_from_array(uk_bulk, k, data=simdata_time)
+                receiver_sampling.sample(uk, k, simdata_time)
 
-            for nu in frequencies:
-                idx = subsample_indices[nu]
-                if np.mod(k, idx) == 0:
-                    u1hats[nu] += uk*(np.exp(-1j*2*np.pi*nu*t)*dt*idx)
+            u1_dft.accumulate(uk, k, t)
 
             if 'dWaveOp0' in return_parameters:
-                for nu in frequencies:
-                    idx = subsample_indices[nu]
-                    if np.mod(k, idx) == 0:
-                        u0hats[nu] += solver_data_u0.k.primary_wavefield*(np.exp(-1j*2*np.pi*nu*t)*dt*idx)
+                u0_dft.accumulate(solver_data_u0.k.primary_wavefield, k, t)
 
             # Note, we compute result for k+1 even when k == nsteps-1.  We need
             # it for the time derivative at k=nsteps-1.
@@ -589,7 +666,7 @@ class HybridModeling(object):
             # See comment (***) above.
             # compute u0_kp2 so we can get dWaveOp0_kp1 for the rhs for u1
             rhs_u0_kp1, rhs_u0_kp2 = rhs_u0_kp2, rhs_u0_kp1
-            rhs_u0_kp2 = self._setup_forward_rhs(rhs_u0_kp2, source.f((k+2)*dt))
+            rhs_u0_kp2 = source_injection.inject(rhs_u0_kp2, k+2)
             solver.time_step(solver_data_u0, rhs_u0_kp1, rhs_u0_kp2)
 
             # shift the dWaveOp0's (ok at k=0 because they are equal then)
@@ -617,8 +694,11 @@ class HybridModeling(object):
             # k-1 <-- k, k <-- k+1, etc
             solver_data.advance()
 
+        u1hats = u1_dft.results()
+
         # Compute time derivative of p at time k
         if 'dWaveOp0' in return_parameters:
+            u0hats = u0_dft.results()
             for nu in frequencies:
                 dWaveOp0[nu] = solver.compute_dWaveOp('frequency', u0hats[nu],nu)
 
@@ -0,0 +1,130 @@
+import zlib
+
+import numpy as np
+
+__all__ = ['SnapshotCodecBase', 'DowncastCodec', 'ThresholdCodec', 'QuantizedCodec']
+
+__docformat__ = "restructuredtext en"
+
+
+class SnapshotCodecBase(object):
+    """Base class for (possibly lossy) encodings of wavefield snapshots.
+
+    A codec turns an ndarray into an opaque encoded object with `encode` and
+    recovers an ndarray of the original shape and dtype with `decode`.
+    `nbytes` gives the storage size of an encoded object, which is used to
+    report compression ratios.
+
+    """
+
+    def encode(self, arr):
+        raise NotImplementedError('\'encode\' must be implemented by subclass.')
+
+    def decode(self, encoded):
+        raise NotImplementedError('\'decode\' must be implemented by subclass.')
+
+    def nbytes(self, encoded):
+        raise NotImplementedError('\'nbytes\' must be implemented by subclass.')
+
+
+class DowncastCodec(SnapshotCodecBase):
+    """Stores snapshots at a lower floating point precision.
+
+    Parameters
+    ----------
+    dtype : numpy.dtype, optional
+        Storage precision, defaults to float32.  float16 halves the storage
+        again, but its limited range (about 6e-5 to 6e4) requires reasonably
+        scaled sources.
+
+    """
+
+    def __init__(self, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+
+    def encode(self, arr):
+        return (arr.astype(self.dtype), arr.dtype)
+
+    def decode(self, encoded):
+        data, dtype = encoded
+        return data.astype(dtype)
+
+    def nbytes(self, encoded):
+        return encoded[0].nbytes
+
+
+class ThresholdCodec(SnapshotCodecBase):
+    """Stores only the entries of a snapshot above a relative threshold.
+
+    Entries with magnitude at most `tolerance*max(abs(arr))` are dropped and
+    the remaining ones are kept, in single precision, with their flat
+    indices.  Effective when the wavefield has not yet filled the domain.
+
+    Parameters
+    ----------
+    tolerance : float
+        Threshold relative to the peak magnitude of each snapshot.
+
+    """
+
+    def __init__(self, tolerance=1e-4):
+        if tolerance < 0:
+            raise ValueError('Tolerance must be non-negative.')
+        self.tolerance = tolerance
+
+    def encode(self, arr):
+        flat = arr.ravel()
+        peak = np.abs(flat).max() if flat.size else 0.0
+        idx = np.flatnonzero(np.abs(flat) > self.tolerance*peak).astype(np.int32)
+        return (idx, flat[idx].astype(np.float32), arr.shape, arr.dtype)
+
+    def decode(self, encoded):
+        idx, values, shape, dtype = encoded
+        arr = np.zeros(shape, dtype=dtype)
+        arr.ravel()[idx] = values
+        return arr
+
+    def nbytes(self, encoded):
+        return encoded[0].nbytes + encoded[1].nbytes
+
+
+class QuantizedCodec(SnapshotCodecBase):
+    """Error-bounded uniform quantization followed by lossless compression.
+
+    Each snapshot is rounded to integer multiples of a step chosen so that
+    the pointwise error is at most `tolerance*max(abs(arr))`, and the integers
+    are compressed with zlib.  Smooth fields and quiet regions map to long
+    runs of small integers, which compress well.
+
+    Parameters
+    ----------
+    tolerance : float
+        Pointwise error bound relative to the peak magnitude of each snapshot.
+        Must be at least 2**-15, so that the integers fit in 16 bits.
+    level : int, optional
+        zlib compression level, defaults to 1 (fastest).
+
+    """
+
+    def __init__(self, tolerance=1e-3, level=1):
+        if not 2.0**-15 <= tolerance:
+            raise ValueError('Tolerance must be at least 2**-15.')
+        self.tolerance = tolerance
+        self.level = level
+
+    def encode(self, arr):
+        peak = np.abs(arr).max() if arr.size else 0.0
+        step = 2*self.tolerance*peak
+        if step > 0:
+            q = np.rint(arr/step).astype(np.int16)
+        else:
+            q = np.zeros(arr.shape, dtype=np.int16)
+        return (zlib.compress(q.tobytes(), self.level), step, arr.shape, arr.dtype)
+
+    def decode(self, encoded):
+        data, step, shape, dtype = encoded
+        q = np.frombuffer(zlib.decompress(data), dtype=np.int16).reshape(shape)
+        return (q*step).astype(dtype)
+
+    def nbytes(self, encoded):
+        return len(encoded[0])
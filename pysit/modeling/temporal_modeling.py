@@ -5,6 +5,7 @@ import numpy as np
 from sys import getsizeof
 from pysit.util.derivatives import build_derivative_matrix, build_permutation_matrix, build_heterogenous_matrices
 from pysit.solvers.model_parameter import *
+from pysit.modeling.extended_imaging import SubsurfaceOffsetImaging
 from numpy.random import uniform
 
 __all__ = ['TemporalModeling']
@@ -31,6 +32,8 @@ class TemporalModeling(object):
     ----------
     solver : pysit wave solver object
         A wave solver that inherits from pysit.solvers.WaveSolverBase
+    receiver_block_size : int
+        Number of time steps whose receiver samples are recorded at once.
 
     """
 
@@ -41,13 +44,16 @@ class TemporalModeling(object):
     @property
     def modeling_type(self): return "time"
 
-    def __init__(self, solver):
+    def __init__(self, solver, receiver_block_size=1):
         """Constructor for the TemporalInversion class.
 
         Parameters
         ----------
         solver : pysit wave solver object
             A wave solver that inherits from pysit.solvers.WaveSolverBase
+        receiver_block_size : int, optional
+            Number of time steps whose receiver samples are buffered and
+            recorded with a single sparse matrix times block product.
 
         """
 
@@ -57,10 +63,20 @@ class TemporalModeling(object):
             raise TypeError("Argument 'solver' type {1} does not match modeling solver type {0}.".format(
                 self.solver_type, solver.supports['equation_dynamics']))
 
+        self.receiver_block_size = receiver_block_size
+
     def _setup_forward_rhs(self, rhs_array, data):
-        return self.solver.mesh.pad_array(data, out_array=rhs_array)
+        if rhs_array is None:
+            return self.solver.mesh.pad_array(data)
+        return self.solver.mesh.pad_into(data, rhs_array)
+
+    def _setup_forward_injection(self, source):
+        # Time indices 0 through nsteps+1 are needed, as the linearized models
+        # look two steps ahead.
+        return source.injection(self.solver.dt*np.arange(self.solver.nsteps+2))
 
-    def forward_model(self, shot, m0, imaging_period=1, return_parameters=[]):
+    def forward_model(self, shot, m0, imaging_period=1, return_parameters=[], dWaveOp_store=None,
+                      wavefield_store=None):
         """Applies the forward model to the model for the given solver.
 
         Parameters
@@ -70,6 +86,14 @@ class TemporalModeling(object):
         m0 : solver.ModelParameters
             The parameters upon which to evaluate the forward model.
         return_parameters : list of {'wavefield', 'simdata', 'dWaveOp'}
+        dWaveOp_store : pysit.modeling.WavefieldStoreBase, optional
+            Container filled in place with the 'dWaveOp' components, e.g., a
+            CheckpointedWavefieldStore to bound the memory of the imaging
+            condition.  Defaults to a list of padded arrays.
+        wavefield_store : pysit.modeling.WavefieldStoreBase, optional
+            Container filled in place with the 'wavefield' snapshots through
+            its `append` method, e.g., a MemmapWavefieldStore to keep them on
+            disk.  Defaults to a list of arrays.
 
         Returns
         -------
@@ -97,18 +121,28 @@ class TemporalModeling(object):
         dt = solver.dt
         nsteps = solver.nsteps
         source = shot.sources
+        source_injection = self._setup_forward_injection(source)
 
         # Storage for the field
         if 'wavefield' in return_parameters:
-            us = list()
+            if wavefield_store is None:
+                us = list()
+            else:
+                us = wavefield_store
+                us.initialize(self, shot, m0, 1)
 
         # Setup data storage for the forward modeled data
         if 'simdata' in return_parameters:
             simdata = np.zeros((solver.nsteps, shot.receivers.receiver_count))
+            receiver_sampling = shot.receivers.padded_sampling(self.receiver_block_size)
 
         # Storage for the time derivatives of p
         if 'dWaveOp' in return_parameters:
-            dWaveOp = list()
+            if dWaveOp_store is None:
+                dWaveOp = list()
+            else:
+                dWaveOp = dWaveOp_store
+                dWaveOp.initialize(self, shot, m0, imaging_period)
 
         # Step k = 0
         # p_0 is a zero array because if we assume the input signal is causal
@@ -123,22 +157,21 @@ class TemporalModeling(object):
         for k in range(nsteps):
 
             uk = solver_data.k.primary_wavefield
-            uk_bulk = mesh.unpad_array(uk)
 
             if 'wavefield' in return_parameters:
-                us.append(uk_bulk.copy())
+                us.append(mesh.unpad_array(uk, copy=True))
 
             # Record the data at t_k
             if 'simdata' in return_parameters:
-                shot.receivers.sample_data_from_array(uk_bulk, k, data=simdata)
+                receiver_sampling.sample(uk, k, simdata)
 
             if k == 0:
-                rhs_k = self._setup_forward_rhs(rhs_k, source.f(k*dt))
-                rhs_kp1 = self._setup_forward_rhs(rhs_kp1, source.f((k+1)*dt))
+                rhs_k = source_injection.inject(rhs_k, k)
+                rhs_kp1 = source_injection.inject(rhs_kp1, k+1)
             else:
                 # shift time forward
                 rhs_k, rhs_kp1 = rhs_kp1, rhs_k
-            rhs_kp1 = self._setup_forward_rhs(rhs_kp1, source.f((k+1)*dt))
+            rhs_kp1 = source_injection.inject(rhs_kp1, k+1)
 
             # Note, we compute result for k+1 even when k == nsteps-1.  We need
             # it for the time derivative at k=nsteps-1.
@@ -147,7 +180,9 @@ class TemporalModeling(object):
             # Compute time derivative of p at time k
             # Note that this is is returned as a PADDED array
             if 'dWaveOp' in return_parameters:
-                if k % imaging_period == 0:  # Save every 'imaging_period' number of steps
+                if dWaveOp_store is not None:
+                    dWaveOp.record(k, solver_data)
+                elif k % imaging_period == 0:  # Save every 'imaging_period' number of steps
                     dWaveOp.append(solver.compute_dWaveOp('time', solver_data))
 
             # When k is the nth step, the next step is uneeded, so don't swap
@@ -171,6 +206,102 @@ class TemporalModeling(object):
 
         return retval
 
+    def forward_model_batch(self, shots, m0, return_parameters=[]):
+        """Applies the forward model to several shots at once.
+
+        All shots see the same operators, so their wavefields are stacked
+        along a trailing shot axis and advanced together with the solver's
+        `time_step_batch`.  Solvers without batched time stepping, e.g., the
+        compiled kernels, fall back to one `forward_model` per shot.
+
+        Parameters
+        ----------
+        shots : list of pysit.Shot
+            Shots to model.
+        m0 : solver.ModelParameters
+            The parameters upon which to evaluate the forward model.
+        return_parameters : list of {'wavefield', 'simdata'}
+
+        Returns
+        -------
+        retvals : list of dict
+            For each shot, the dictionary that `forward_model` would return.
+
+        """
+
+        unsupported = set(return_parameters) - set(['wavefield', 'simdata'])
+        if unsupported:
+            raise ValueError('Batched forward modeling does not support {0}.'.format(sorted(unsupported)))
+
+        # Local references
+        solver = self.solver
+        solver.model_parameters = m0
+
+        if not getattr(solver, 'supports_batched_time_step', False):
+            return [self.forward_model(shot, m0, return_parameters=return_parameters) for shot in shots]
+
+        mesh = solver.mesh
+
+        nsteps = solver.nsteps
+        nshots = len(shots)
+        source_injections = [self._setup_forward_injection(shot.sources) for shot in shots]
+
+        # Storage for the field
+        if 'wavefield' in return_parameters:
+            us = [list() for shot in shots]
+
+        # Setup data storage for the forward modeled data
+        if 'simdata' in return_parameters:
+            simdatas = [np.zeros((nsteps, shot.receivers.receiver_count)) for shot in shots]
+            receiver_samplings = [shot.receivers.padded_sampling(self.receiver_block_size) for shot in shots]
+
+        solver_data = solver.BatchedSolverData(nshots)
+
+        dof = mesh.dof(include_bc=True)
+        rhs_k = np.zeros((dof, nshots))
+        rhs_kp1 = np.zeros((dof, nshots))
+
+        for k in range(nsteps):
+
+            uk = solver_data.primary_wavefield('k')
+
+            for j in range(nshots):
+                ukj = uk[:, j:j+1]
+
+                if 'wavefield' in return_parameters:
+                    us[j].append(mesh.unpad_array(ukj, copy=True))
+
+                # Record the data at t_k
+                if 'simdata' in return_parameters:
+                    receiver_samplings[j].sample(ukj, k, simdatas[j])
+
+            if k == 0:
+                for j, injection in enumerate(source_injections):
+                    injection.inject(rhs_k, k, column=j)
+            else:
+                # shift time forward
+                rhs_k, rhs_kp1 = rhs_kp1, rhs_k
+            for j, injection in enumerate(source_injections):
+                injection.inject(rhs_kp1, k+1, column=j)
+
+            solver.time_step_batch(solver_data, rhs_k, rhs_kp1)
+
+            if(k == (nsteps-1)):
+                break
+
+            solver_data.advance()
+
+        retvals = list()
+        for j in range(nshots):
+            retval = dict()
+            if 'wavefield' in return_parameters:
+                retval['wavefield'] = us[j]
+            if 'simdata' in return_parameters:
+                retval['simdata'] = simdatas[j]
+            retvals.append(retval)
+
+        return retvals
+
     def migrate_shot(self, shot, m0,
                      operand_simdata, imaging_period, operand_dWaveOpAdj=None, operand_model=None,
                      dWaveOp=None,
@@ -279,8 +410,6 @@ class TemporalModeling(object):
         # Local references
         solver = self.solver
         solver.model_parameters = m0
-        dm_extend_tmp = copy.deepcopy(dm_extend)
-        dm_extend_tmp.data = np.flip(dm_extend_tmp.data, axis=1)
 
         mesh = solver.mesh
 
@@ -310,11 +439,10 @@ class TemporalModeling(object):
         else:
             do_ic = False
 
-        sh_sub = dm_extend.sh_sub
-        dof_sub = dm_extend.dof_sub
-
-        # Create a fake mesh structrue to perform intermediate padding and unpadding operators
-        mesh_ih = copy.deepcopy(mesh)
+        # The second adjoint field is driven by the extended source of the
+        # first one, with the offsets of dm_extend reversed
+        imaging = SubsurfaceOffsetImaging(mesh, dm_extend)
+        dm_gathers = imaging.gathers(np.flip(dm_extend.data, axis=1))
 
         # Variable-Density will call this, giving us matrices needed for the ic in terms of m2 (or rho)
         if hasattr(m0, 'kappa') and hasattr(m0, 'rho'):
@@ -326,14 +454,10 @@ class TemporalModeling(object):
         # Time-reversed wave solver
         solver_data = solver.SolverData()
         solver_data_v2 = solver.SolverData()
-        solver_data_tmp = solver.SolverData()
-
-        solver_data_tmp.k.primary_wavefield = self.create_extended_rhs(dm_extend_tmp, solver_data.k.primary_wavefield, mesh, mesh_ih, dof_sub, sh_sub, nh)
-        solver_data_tmp.kp1.primary_wavefield = self.create_extended_rhs(dm_extend_tmp, solver_data.kp1.primary_wavefield, mesh, mesh_ih, dof_sub, sh_sub, nh)
-        solver_data_tmp.km1.primary_wavefield = self.create_extended_rhs(dm_extend_tmp, solver_data.km1.primary_wavefield, mesh, mesh_ih, dof_sub, sh_sub, nh)
 
         rhs_k = np.zeros(mesh.shape(include_bc=True))
         rhs_km1 = np.zeros(mesh.shape(include_bc=True))
+        rhs_k_v2 = None
 
         if operand_model is not None:
             operand_model = operand_model.with_padding()
@@ -376,16 +500,12 @@ class TemporalModeling(object):
                 rhs_k, rhs_km1 = rhs_km1, rhs_k
                 rhs_km1 = self._setup_adjoint_rhs(rhs_km1, shot, k-1, operand_simdata, operand_model, operand_dWaveOpAdj)
 
-            # rhs_k_v2 = self.create_extended_rhs(dm_extend, solver_data_tmp.k.primary_wavefield, mesh, mesh_ih, dof_sub, sh_sub, nh)
             solver.time_step(solver_data, rhs_k, rhs_km1)
 
-            solver_data_tmp.kp1.primary_wavefield = self.create_extended_rhs(dm_extend_tmp, solver_data.kp1.primary_wavefield, 
-                                                                             mesh, mesh_ih, dof_sub, sh_sub, nh)
-
-            rhs_k_v2 = solver.compute_dWaveOp('time', solver_data_tmp)  # This one is wrong
-
-            # rhs_km1_v2 = self.create_extended_rhs(dm_extend, v_km1, mesh, mesh_ih, dof_sub, sh_sub, nh)
-            # rhs_km1_v2 = solver.compute_dWaveOp('time', rhs_km1_v2)
+            # The extended source is linear and only involves the interior,
+            # where the time derivative operator has no PML terms, so that
+            # it commutes with the time derivative
+            rhs_k_v2 = imaging.source(dm_gathers, solver.compute_dWaveOp('time', solver_data), out=rhs_k_v2)
 
             # Zhilong does not know why rhs_km1 is required in time_step.
             solver.time_step(solver_data_v2, rhs_k_v2, rhs_k_v2)
@@ -406,7 +526,6 @@ class TemporalModeling(object):
             # k-1 <-- k, k <-- k+1, etc
             solver_data.advance()
             solver_data_v2.advance()
-            solver_data_tmp.advance()
 
         if do_ic:
             ic *= (-1*dt)
@@ -501,7 +620,8 @@ class TemporalModeling(object):
         if dWaveOp is not None:
             # ic = solver.model_parameters.perturbation()
             ic = ExtendedModelingParameter2D(mesh, max_sub_offset, h)
-            ic_data_tmp = np.zeros(ic.sh_data)
+            imaging = SubsurfaceOffsetImaging(mesh, ic)
+            image = np.zeros(imaging.sh_image)
             do_ic = True
         elif 'imaging_condition' in return_parameters:
             raise ValueError(
@@ -509,12 +629,6 @@ class TemporalModeling(object):
         else:
             do_ic = False
 
-        sh_sub = ic.sh_sub
-        dof_sub = ic.dof_sub
-
-        # Create a fake mesh structrue to perform intermediate padding and unpadding operators
-        mesh_ih = copy.deepcopy(mesh)
-
         # Variable-Density will call this, giving us matrices needed for the ic in terms of m2 (or rho)
         if hasattr(m0, 'kappa') and hasattr(m0, 'rho'):
             print("WARNING: Ian's operators are still used here even though the solver has changed. Gradient may be incorrect. These routines need to be updated.")
@@ -557,14 +671,7 @@ class TemporalModeling(object):
                         ic.kappa += vk*dWaveOp[entry]
                         ic.rho += (D1[0]*uk)*(D1[1]*vk)+(D2[0]*uk)*(D2[1]*vk)
                     else:
-                        for ih in range(0, nh):
-                            
-                            u_tmp = dWaveOp[entry][ic.padding_index_u[0]+ih*ic.skip_index]
-                            v_tmp = vk[ic.padding_index_v[0]-ih*ic.skip_index]
-
-                            ic_data_tmp[:, ih] = (v_tmp*u_tmp).reshape((-1,))
-                        
-                        ic.data += ic_data_tmp
+                        imaging.correlate(dWaveOp[entry], vk, image)
 
             if k == nsteps-1:
                 rhs_k = self._setup_adjoint_rhs(rhs_k,   shot, k,   operand_simdata, operand_model, operand_dWaveOpAdj)
@@ -593,6 +700,7 @@ class TemporalModeling(object):
             solver_data.advance()
 
         if do_ic:
+            ic.data += imaging.data(image)
             ic.data *= (-1*dt)
             ic.data *= imaging_period  # Compensate for doing fewer summations at higher imaging_period
             # ic = ic.without_padding() # gradient is never padded comment by Zhilong
@@ -618,7 +726,11 @@ class TemporalModeling(object):
     def _setup_adjoint_rhs(self, rhs_array, shot, k, operand_simdata, operand_model, operand_dWaveOpAdj):
 
         # basic rhs is always the pseudodata or residual
-        rhs_array = self.solver.mesh.pad_array(shot.receivers.extend_data_to_array(k, data=operand_simdata), out_array=rhs_array)
+        data = shot.receivers.extend_data_to_array(k, data=operand_simdata)
+        if rhs_array is None:
+            rhs_array = self.solver.mesh.pad_array(data)
+        else:
+            rhs_array = self.solver.mesh.pad_into(data, rhs_array)
 
         # for Hessians, sometimes there is more to the rhs
         if (operand_dWaveOpAdj is not None) and (operand_model is not None):
@@ -829,6 +941,7 @@ class TemporalModeling(object):
         dt = solver.dt
         nsteps = solver.nsteps
         source = shot.sources
+        source_injection = self._setup_forward_injection(source)
 
         # added the padding_mode by Zhilong, still needs to discuss which padding mode to use
         m1_padded = m1.with_padding(padding_mode='edge')
@@ -840,6 +953,7 @@ class TemporalModeling(object):
         # Setup data storage for the forward modeled data
         if 'simdata' in return_parameters:
             simdata = np.zeros((solver.nsteps, shot.receivers.receiver_count))
+            receiver_sampling = shot.receivers.padded_sampling(self.receiver_block_size)
 
         # Storage for the time derivatives of p
         if 'dWaveOp0' in return_parameters:
@@ -861,8 +975,8 @@ class TemporalModeling(object):
             # For u0, set up the right hand sides
             rhs_u0_k = np.zeros(mesh.shape(include_bc=True))
             rhs_u0_kp1 = np.zeros(mesh.shape(include_bc=True))
-            rhs_u0_k = self._setup_forward_rhs(rhs_u0_k,   source.f(0*dt))
-            rhs_u0_kp1 = self._setup_forward_rhs(rhs_u0_kp1, source.f(1*dt))
+            rhs_u0_k = source_injection.inject(rhs_u0_k, 0)
+            rhs_u0_kp1 = source_injection.inject(rhs_u0_kp1, 1)
 
             # compute u0_kp1 so that we can compute dWaveOp0_k (needed for u1)
             solver.time_step(solver_data_u0, rhs_u0_k, rhs_u0_kp1)
@@ -882,21 +996,20 @@ class TemporalModeling(object):
 
         for k in range(nsteps):
             uk = solver_data.k.primary_wavefield
-            uk_bulk = mesh.unpad_array(uk)
 
             if 'wavefield1' in return_parameters:
-                us.append(uk_bulk.copy())
+                us.append(mesh.unpad_array(uk, copy=True))
 
             # Record the data at t_k
             if 'simdata' in return_parameters:
-                shot.receivers.sample_data_from_array(uk_bulk, k, data=simdata)
+                receiver_sampling.sample(uk, k, simdata)
 
             # Note, we compute result for k+1 even when k == nsteps-1.  We need
             # it for the time derivative at k=nsteps-1.
             if dWaveOp0 is None:
                 # compute u0_kp2 so we can get dWaveOp0_kp1 for the rhs for u1
                 rhs_u0_kp1, rhs_u0_kp2 = rhs_u0_kp2, rhs_u0_kp1
-                rhs_u0_kp2 = self._setup_forward_rhs(rhs_u0_kp2, source.f((k+2)*dt))
+                rhs_u0_kp2 = source_injection.inject(rhs_u0_kp2, k+2)
                 solver.time_step(solver_data_u0, rhs_u0_kp1, rhs_u0_kp2)
 
                 # shift the dWaveOp0's (ok at k=0 because they are equal then)
@@ -993,10 +1106,8 @@ class TemporalModeling(object):
 
         nh = 2*int(max_sub_offset / h) + 1
 
-        sh_sub = m1_extend.sh_sub
-        dof_sub = m1_extend.dof_sub
-
-        mesh_ih = copy.deepcopy(mesh)
+        imaging = SubsurfaceOffsetImaging(mesh, m1_extend)
+        m1_gathers = imaging.gathers(m1_extend.data)
 
         # # added the padding_mode by Zhilong, still needs to discuss which padding mode to use
         # m1_padded = m1.with_padding(padding_mode='edge')
@@ -1026,12 +1137,13 @@ class TemporalModeling(object):
         # and we assume that the initial system (i.e., p_(-2) and p_(-1)) is
         # uniformly zero, then the leapfrog scheme would compute that p_0 = 0 as
         # well. ukm1 is needed to compute the temporal derivative.
-        solver_data = solver.SolverData()
-
         for i in range(len(shots)):
             shot = shots[i]
+            solver_data = solver.SolverData()
             source = shot.sources
+            source_injection = self._setup_forward_injection(source)
             simdata = np.zeros((solver.nsteps, shot.receivers.receiver_count))
+            receiver_sampling = shot.receivers.padded_sampling(self.receiver_block_size)
             us = dict()
             dWaveOp1 = list()
             dWaveOp0ret = list()
@@ -1051,8 +1163,8 @@ class TemporalModeling(object):
                 # For u0, set up the right hand sides
                 rhs_u0_k = np.zeros(mesh.shape(include_bc=True))
                 rhs_u0_kp1 = np.zeros(mesh.shape(include_bc=True))
-                rhs_u0_k = self._setup_forward_rhs(rhs_u0_k,   source.f(0*dt))
-                rhs_u0_kp1 = self._setup_forward_rhs(rhs_u0_kp1, source.f(1*dt))
+                rhs_u0_k = source_injection.inject(rhs_u0_k, 0)
+                rhs_u0_kp1 = source_injection.inject(rhs_u0_kp1, 1)
 
                 # compute u0_kp1 so that we can compute dWaveOp0_k (needed for u1)
                 solver.time_step(solver_data_u0, rhs_u0_k, rhs_u0_kp1)
@@ -1072,21 +1184,20 @@ class TemporalModeling(object):
 
             for k in range(nsteps):
                 uk = solver_data.k.primary_wavefield
-                uk_bulk = mesh.unpad_array(uk)
 
                 if 'wavefield1' in return_parameters:
-                    us.append(uk_bulk.copy())
+                    us.append(mesh.unpad_array(uk, copy=True))
 
                 # Record the data at t_k
                 if 'simdata' in return_parameters:
-                    shot.receivers.sample_data_from_array(uk_bulk, k, data=simdata)
+                    receiver_sampling.sample(uk, k, simdata)
 
                 # Note, we compute result for k+1 even when k == nsteps-1.  We need
                 # it for the time derivative at k=nsteps-1.
                 if DWaveOp0In is None:
                     # compute u0_kp2 so we can get dWaveOp0_kp1 for the rhs for u1
                     rhs_u0_kp1, rhs_u0_kp2 = rhs_u0_kp2, rhs_u0_kp1
-                    rhs_u0_kp2 = self._setup_forward_rhs(rhs_u0_kp2, source.f((k+2)*dt))
+                    rhs_u0_kp2 = source_injection.inject(rhs_u0_kp2, k+2)
                     solver.time_step(solver_data_u0, rhs_u0_kp1, rhs_u0_kp2)
 
                     # shift the dWaveOp0's (ok at k=0 because they are equal then)
@@ -1097,19 +1208,18 @@ class TemporalModeling(object):
                 else:
                     dWaveOp0_k = DWaveOp0In[i][k]
                     # incase not enough dWaveOp0's are provided, repeat the last one
-                    dWaveOp0_kp1 = dWaveOp0[k+1] if k < (nsteps-1) else dWaveOp0[k]
+                    dWaveOp0_kp1 = DWaveOp0In[i][k+1] if k < (nsteps-1) else DWaveOp0In[i][k]
 
                 if 'dWaveOp0' in return_parameters:
                     dWaveOp0ret.append(dWaveOp0_k)
 
                 if k == 0:
-                    rhs_k = self.create_extended_rhs(m1_extend, dWaveOp0_k, mesh, mesh_ih, dof_sub, sh_sub, nh)
-                    rhs_kp1 = self.create_extended_rhs(m1_extend, dWaveOp0_kp1, mesh, mesh_ih, dof_sub, sh_sub, nh)
-                
+                    rhs_k = imaging.source(m1_gathers, dWaveOp0_k)
+                    rhs_kp1 = imaging.source(m1_gathers, dWaveOp0_kp1)
                 else:
-                    # rhs_k, rhs_kp1 = rhs_kp1, m1_padded*(-1*dWaveOp0_kp1)
-                    rhs_k, rhs_kp1 = rhs_kp1, self.create_extended_rhs(m1_extend, dWaveOp0_kp1, mesh, mesh_ih, dof_sub, sh_sub, nh)
-                
+                    # the previous rhs_k is free, compute the new rhs_kp1 in it
+                    rhs_k, rhs_kp1 = rhs_kp1, imaging.source(m1_gathers, dWaveOp0_kp1, out=rhs_k)
+
 
                 solver.time_step(solver_data, rhs_k, rhs_kp1)
 
@@ -1192,6 +1302,7 @@ class TemporalModeling(object):
         dt = solver.dt
         nsteps = solver.nsteps
         source = shot.sources
+        source_injection = self._setup_forward_injection(source)
 
         # Storage for the field
         if 'wavefield1' in return_parameters:
@@ -1200,6 +1311,7 @@ class TemporalModeling(object):
         # Setup data storage for the forward modeled data
         if 'simdata' in return_parameters:
             simdata = np.zeros((solver.nsteps, shot.receivers.receiver_count))
+            receiver_sampling = shot.receivers.padded_sampling(self.receiver_block_size)
 
         # Storage for the time derivatives of p
         if 'dWaveOp0' in return_parameters:
@@ -1221,8 +1333,8 @@ class TemporalModeling(object):
             # For u0, set up the right hand sides
             rhs_u0_k = np.zeros(mesh.shape(include_bc=True))
             rhs_u0_kp1 = np.zeros(mesh.shape(include_bc=True))
-            rhs_u0_k = self._setup_forward_rhs(rhs_u0_k,   source.f(0*dt))
-            rhs_u0_kp1 = self._setup_forward_rhs(rhs_u0_kp1, source.f(1*dt))
+            rhs_u0_k = source_injection.inject(rhs_u0_k, 0)
+            rhs_u0_kp1 = source_injection.inject(rhs_u0_kp1, 1)
 
             # compute u0_kp1 so that we can compute dWaveOp0_k (needed for u1)
             solver.time_step(solver_data_u0, rhs_u0_k, rhs_u0_kp1)
@@ -1242,21 +1354,20 @@ class TemporalModeling(object):
 
         for k in range(nsteps):
             uk = solver_data.k.primary_wavefield
-            uk_bulk = mesh.unpad_array(uk)
 
             if 'wavefield1' in return_parameters:
-                us.append(uk_bulk.copy())
+                us.append(mesh.unpad_array(uk, copy=True))
 
             # Record the data at t_k
             if 'simdata' in return_parameters:
-                shot.receivers.sample_data_from_array(uk_bulk, k, data=simdata)
+                receiver_sampling.sample(uk, k, simdata)
 
             # Note, we compute result for k+1 even when k == nsteps-1.  We need
             # it for the time derivative at k=nsteps-1.
             if dWaveOp0 is None:
                 # compute u0_kp2 so we can get dWaveOp0_kp1 for the rhs for u1
                 rhs_u0_kp1, rhs_u0_kp2 = rhs_u0_kp2, rhs_u0_kp1
-                rhs_u0_kp2 = self._setup_forward_rhs(rhs_u0_kp2, source.f((k+2)*dt))
+                rhs_u0_kp2 = source_injection.inject(rhs_u0_kp2, k+2)
                 solver.time_step(solver_data_u0, rhs_u0_kp1, rhs_u0_kp2)
 
                 # shift the dWaveOp0's (ok at k=0 because they are equal then)
@@ -1353,6 +1464,7 @@ class TemporalModeling(object):
         dt = solver.dt
         nsteps = solver.nsteps
         source = shot.sources
+        source_injection = self._setup_forward_injection(source)
 
         model_2 = 1.0/m1.rho
         model_2 = mesh.pad_array(model_2)
@@ -1371,6 +1483,7 @@ class TemporalModeling(object):
         # Setup data storage for the forward modeled data
         if 'simdata' in return_parameters:
             simdata = np.zeros((solver.nsteps, shot.receivers.receiver_count))
+            receiver_sampling = shot.receivers.padded_sampling(self.receiver_block_size)
 
         # Storage for the time derivatives of p
         if 'dWaveOp0' in return_parameters:
@@ -1392,8 +1505,8 @@ class TemporalModeling(object):
             # For u0, set up the right hand sides
             rhs_u0_k = np.zeros(mesh.shape(include_bc=True))
             rhs_u0_kp1 = np.zeros(mesh.shape(include_bc=True))
-            rhs_u0_k = self._setup_forward_rhs(rhs_u0_k,   source.f(0*dt))
-            rhs_u0_kp1 = self._setup_forward_rhs(rhs_u0_kp1, source.f(1*dt))
+            rhs_u0_k = source_injection.inject(rhs_u0_k, 0)
+            rhs_u0_kp1 = source_injection.inject(rhs_u0_kp1, 1)
 
             # compute u0_kp1 so that we can compute dWaveOp0_k (needed for u1)
             solver.time_step(solver_data_u0, rhs_u0_k, rhs_u0_kp1)
@@ -1422,21 +1535,20 @@ class TemporalModeling(object):
             u0kp1 = mesh.pad_array(u0kp1)
 
             uk = solver_data.k.primary_wavefield
-            uk_bulk = mesh.unpad_array(uk)
 
             if 'wavefield1' in return_parameters:
-                us.append(uk_bulk.copy())
+                us.append(mesh.unpad_array(uk, copy=True))
 
             # Record the data at t_k
             if 'simdata' in return_parameters:
-                shot.receivers.sample_data_from_array(uk_bulk, k, data=simdata)
+                receiver_sampling.sample(uk, k, simdata)
 
             # Note, we compute result for k+1 even when k == nsteps-1.  We need
             # it for the time derivative at k=nsteps-1.
             if dWaveOp0 is None:
                 # compute u0_kp2 so we can get dWaveOp0_kp1 for the rhs for u1
                 rhs_u0_kp1, rhs_u0_kp2 = rhs_u0_kp2, rhs_u0_kp1
-                rhs_u0_kp2 = self._setup_forward_rhs(rhs_u0_kp2, source.f((k+2)*dt))
+                rhs_u0_kp2 = source_injection.inject(rhs_u0_kp2, k+2)
                 solver.time_step(solver_data_u0, rhs_u0_kp1, rhs_u0_kp2)
 
                 # shift the dWaveOp0's (ok at k=0 because they are equal then)
@@ -1490,24 +1602,12 @@ class TemporalModeling(object):
 
         return retval
 
-    def create_extended_rhs(self, m1_extend, dWaveOp0, mesh, mesh_ih, dof_sub, sh_sub, nh):
-        rhs_out = []
-        n_data = np.prod(mesh._shapes[(True, True)])
-        for ih in range(0, nh):
-            
-            m1_ih = m1_extend.data[:, ih]
-            m1_ih = m1_ih.reshape((m1_ih.size, 1))
-            rhs__ = m1_ih * ((-1*dWaveOp0[m1_extend.padding_index_u[0].flatten() + ih*m1_extend.skip_index]))
-            rhs_ = np.zeros((n_data,1))
-            rhs_[m1_extend.padding_index_v[0].flatten() - ih*m1_extend.skip_index] = rhs__
-            
-
-            if ih == 0:
-                rhs_out = copy.deepcopy(rhs_)
-            else:
-                rhs_out += rhs_
-
-        return rhs_out
+    def create_extended_rhs(self, m1_extend, dWaveOp0, mesh, *args):
+        """Returns the extended Born source of the imaging component dWaveOp0
+        for the extended model perturbation m1_extend, see
+        SubsurfaceOffsetImaging.source."""
+        imaging = SubsurfaceOffsetImaging(mesh, m1_extend)
+        return imaging.source(imaging.gathers(m1_extend.data), dWaveOp0)
 
 
 
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from pysit import PML, RectangularDomain, CartesianMesh
+from pysit.solvers.model_parameter import ExtendedModelingParameter2D
+from pysit.modeling.extended_imaging import SubsurfaceOffsetImaging
+
+
+class TestSubsurfaceOffsetImaging(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0., 1.0, pml, pml), (0., 0.5, pml, pml))
+        self.mesh = CartesianMesh(d, 31, 16)
+        self.mesh.shape(include_bc=False, as_grid=True)
+
+        self.n = np.prod(self.mesh.shape(include_bc=True))
+        rng = np.random.RandomState(0)
+        self.u = rng.randn(self.n, 1)
+        self.v = rng.randn(self.n, 1)
+        self.rng = rng
+
+    def _extended(self, n_offsets, skip=1):
+        h = skip*self.mesh.x.delta
+        ext = ExtendedModelingParameter2D(self.mesh, n_offsets*h, h)
+        ext.data[:] = self.rng.randn(*ext.sh_data)
+        return ext
+
+    def test_padding_index(self):
+        # The mesh padding must not be disturbed by the extended model
+        plan = self.mesh.padding_plan
+        ext = self._extended(3)
+        assert self.mesh.padding_plan is plan
+
+        u_grid = np.arange(self.n).reshape(self.mesh.shape(include_bc=True, as_grid=True))
+        nbc_x, nbc_z = self.mesh.x.lbc.n, self.mesh.z.lbc.n
+        nx_sub, nz = ext.sh_sub
+        expected = u_grid[nbc_x:nbc_x+nx_sub, nbc_z:nbc_z+nz].reshape((-1, 1))
+        assert np.array_equal(ext.padding_index_u[0], expected)
+        assert np.array_equal(ext.padding_index_v[0], expected + 6*ext.skip_index)
+
+    def test_correlate_and_source(self):
+        for n_offsets, skip in [(0, 1), (3, 1), (1, 2)]:
+            ext = self._extended(n_offsets, skip)
+            imaging = SubsurfaceOffsetImaging(self.mesh, ext)
+            idx_u = ext.padding_index_u[0].ravel()
+            idx_v = ext.padding_index_v[0].ravel()
+
+            # Reference: one fancy index gather and scatter per offset
+            image = np.zeros(ext.sh_data)
+            source = np.zeros((self.n, 1))
+            for ih in range(ext.sh_data[1]):
+                iu = idx_u + ih*ext.skip_index
+                iv = idx_v - ih*ext.skip_index
+                image[:, ih] = self.u[iu, 0]*self.v[iv, 0]
+                source[iv, 0] -= ext.data[:, ih]*self.u[iu, 0]
+
+            result = imaging.correlate(self.u, self.v, np.zeros(imaging.sh_image))
+            assert np.allclose(imaging.data(result), image)
+
+            gathers = imaging.gathers(ext.data)
+            out = imaging.source(gathers, self.u)
+            assert np.allclose(out, source)
+
+            # Reusing the output
+            out = imaging.source(gathers, self.v, out=out)
+            out = imaging.source(gathers, self.u, out=out)
+            assert np.allclose(out, source)
+
+    def test_offsets_beyond_grid(self):
+        # The v region of the last offset starts left of the 3 point PML
+        with pytest.raises(ValueError):
+            SubsurfaceOffsetImaging(self.mesh, self._extended(2, 2))
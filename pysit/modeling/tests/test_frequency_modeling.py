@@ -0,0 +1,151 @@
+import numpy as np
+
+from pysit import (PML, RectangularDomain, CartesianMesh, PointSource, PointReceiver,
+                   ReceiverSet, Shot, RickerWavelet, ConstantDensityHelmholtz)
+from pysit.modeling import FrequencyModeling
+from pysit.objective_functions import FrequencyLeastSquares
+from pysit.solvers.model_parameter import ExtendedModelingParameter2D
+
+
+class TestForwardModelList(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0.0, 1.0, pml, pml), (0.0, 0.8, pml, pml))
+        self.mesh = mesh = CartesianMesh(d, 31, 21)
+
+        self.shots = list()
+        for xs in [0.3, 0.7]:
+            source = PointSource(mesh, (xs, 0.1), RickerWavelet(10.0))
+            receivers = ReceiverSet(mesh, [PointReceiver(mesh, (x, 0.1)) for x in np.linspace(0.1, 0.9, 5)])
+            self.shots.append(Shot(source, receivers))
+        # A single receiver records a scalar rather than a row.
+        self.shots.append(Shot(PointSource(mesh, (0.5, 0.2), RickerWavelet(10.0)),
+                               PointReceiver(mesh, (0.5, 0.6))))
+
+        self.solver = ConstantDensityHelmholtz(mesh, spatial_accuracy_order=2)
+        C = 1.0 + 0.1*np.random.rand(*mesh.shape())
+        self.m0 = self.solver.ModelParameters(mesh, {'C': C})
+
+    def test_matches_forward_model(self):
+        tools = FrequencyModeling(self.solver)
+        frequencies = [2.0, 3.5]
+        rp = ['simdata', 'dWaveOp', 'wavefield']
+
+        block = tools.forward_model_list(self.shots, self.m0, frequencies, return_parameters=rp)
+
+        for i, shot in enumerate(self.shots):
+            single = tools.forward_model(shot, self.m0, frequencies, return_parameters=rp)
+            for nu in frequencies:
+                for key in rp:
+                    assert np.shape(block[key][i][nu]) == np.shape(single[key][nu])
+                    assert np.allclose(block[key][i][nu], single[key][nu], rtol=1e-10, atol=0)
+
+        assert self.solver.solvers.statistics['misses'] == len(frequencies)
+
+    def test_shot_block_size(self):
+        frequencies = [2.0, 3.5]
+        true = self.solver.ModelParameters(self.mesh, {'C': np.ones(self.mesh.shape())})
+        for shot in self.shots:
+            shot.receivers.data_dft = FrequencyModeling(self.solver).forward_model(
+                shot, true, frequencies, return_parameters=['simdata'])['simdata']
+
+        values, gradients = list(), list()
+        for shot_block_size in [1, 2, None]:
+            objective = FrequencyLeastSquares(self.solver, shot_block_size=shot_block_size)
+            values.append(objective.evaluate(self.shots, self.m0, frequencies))
+            gradients.append(objective.compute_gradient(self.shots, self.m0, frequencies).data)
+
+        assert values[0] > 0.0
+        for value, gradient in zip(values[1:], gradients[1:]):
+            assert np.isclose(value, values[0], rtol=1e-10)
+            assert np.allclose(gradient, gradients[0], rtol=1e-10, atol=0)
+
+    def test_no_shots(self):
+        tools = FrequencyModeling(self.solver)
+        assert tools.forward_model_list([], self.m0, [2.0], return_parameters=['simdata']) == {'simdata': {}}
+
+        objective = FrequencyLeastSquares(self.solver)
+        assert objective.evaluate([], self.m0, [2.0]) == 0.0
+        assert not np.any(objective.compute_gradient([], self.m0, [2.0]).data)
+
+
+class TestExtendedModeling(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0.0, 1.0, pml, pml), (0.0, 0.5, pml, pml))
+        self.mesh = mesh = CartesianMesh(d, 31, 16)
+
+        self.shots = list()
+        for xs in [0.3, 0.7]:
+            source = PointSource(mesh, (xs, 0.05), RickerWavelet(5.0))
+            receivers = ReceiverSet(mesh, [PointReceiver(mesh, (x, 0.05)) for x in np.linspace(0.1, 0.9, 9)])
+            self.shots.append(Shot(source, receivers))
+
+        self.solver = ConstantDensityHelmholtz(mesh, spatial_accuracy_order=4)
+        C = np.ones(mesh.shape())
+        C[C.shape[0]//2:] = 1.3
+        self.m0 = self.solver.ModelParameters(mesh, {'C': C})
+
+        self.frequencies = [3.0, 4.0]
+        self.h = mesh.x.delta
+        self.max_sub_offset = 2*self.h
+        self.rng = np.random.RandomState(0)
+
+    def _extended(self):
+        ext = ExtendedModelingParameter2D(self.mesh, self.max_sub_offset, self.h)
+        ext.data[:] = self.rng.randn(*ext.sh_data)
+        return ext
+
+    def test_linear_forward_model_extend(self):
+        tools = FrequencyModeling(self.solver)
+        mesh = self.mesh
+        ext = self._extended()
+        sh_grid = mesh.shape(include_bc=True, as_grid=True)
+        nx_sub, nz = ext.sh_sub
+        z0 = mesh.z.lbc.n
+
+        dof = mesh.dof(include_bc=True)
+        dWaveOp0 = {i: {nu: self.rng.randn(dof, 1) + 1j*self.rng.randn(dof, 1) for nu in self.frequencies}
+                    for i in range(len(self.shots))}
+        simdata = tools.linear_forward_model_extend(self.shots, self.m0, ext, self.frequencies,
+                                                    self.max_sub_offset, self.h, ['simdata'],
+                                                    DWaveOp0In=dWaveOp0)['simdata']
+
+        # Reference: the source of each offset, scattered by grid slicing
+        for i, shot in enumerate(self.shots):
+            for nu in self.frequencies:
+                u0 = dWaveOp0[i][nu].reshape(sh_grid)
+                rhs = np.zeros(sh_grid, dtype=complex)
+                for ih in range(ext.sh_data[1]):
+                    xu, xv = ext.n_bcx_extend_u[ih, 0], ext.n_bcx_extend_v[ih, 0]
+                    rhs[xv:xv+nx_sub, z0:z0+nz] -= (ext.data[:, ih].reshape(nx_sub, nz) *
+                                                    u0[xu:xu+nx_sub, z0:z0+nz])
+                solver_data = self.solver.SolverData()
+                self.solver.solve(solver_data, self.solver.build_rhs(rhs.reshape(-1, 1)), nu)
+                u1 = solver_data.k.primary_wavefield
+                expected = shot.receivers.sample_data_from_array(mesh.unpad_array(u1))
+                assert np.allclose(simdata[i][nu], expected, rtol=1e-10, atol=0)
+
+    def test_migrate_shots_extend(self):
+        tools = FrequencyModeling(self.solver)
+        ext = self._extended()
+        data = tools.linear_forward_model_extend(self.shots, self.m0, ext, self.frequencies,
+                                                 self.max_sub_offset, self.h, ['simdata'])['simdata']
+
+        ic = tools.migrate_shots_extend(self.shots, self.m0, data, self.frequencies,
+                                        self.max_sub_offset, self.h,
+                                        return_parameters=['imaging_condition'])
+        assert ic.data.shape == tuple(ext.sh_data)
+
+        # The zero offset image is the usual image, over the subsurface region
+        image = tools.migrate_shot(self.shots[0], self.m0, data[0], self.frequencies)
+        image = image + tools.migrate_shot(self.shots[1], self.m0, data[1], self.frequencies)
+        nx_sub, nz = ext.sh_sub
+        x0 = (self.mesh.x.n - nx_sub)//2
+        expected = image.data.reshape(self.mesh.shape(as_grid=True))[x0:x0+nx_sub].reshape(-1)
+        assert np.allclose(ic.data[:, ext.sh_data[1]//2], expected, rtol=1e-10, atol=1e-14)
+
+        # The mesh is left untouched
+        assert self.mesh.unpad_array(np.zeros((self.mesh.dof(include_bc=True), 1))).shape == self.mesh.shape()
@@ -0,0 +1,45 @@
+import numpy as np
+
+from pysit import PML, RectangularDomain, CartesianMesh
+from pysit.modeling.hybrid_modeling import _OnTheFlyDFT
+
+
+class TestOnTheFlyDFT(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0.0, 1.0, pml, pml), (0.0, 0.8, pml, pml))
+        self.mesh = CartesianMesh(d, 21, 16)
+
+        self.dt = 1e-3
+        self.frequencies = [2.0, 3.0, 7.5]
+        self.subsample_indices = {2.0: 3, 3.0: 3, 7.5: 1}
+
+        n = self.mesh.shape(include_bc=True)[0]
+        self.fields = [np.random.rand(n, 1) for k in range(10)]
+
+    def direct_dft(self):
+        uhats = dict()
+        for nu in self.frequencies:
+            idx = self.subsample_indices[nu]
+            uhats[nu] = sum(u*np.exp(-1j*2*np.pi*nu*k*self.dt)*self.dt*idx
+                            for k, u in enumerate(self.fields) if k % idx == 0)
+        return uhats
+
+    def test_matches_direct_dft(self):
+        expected = self.direct_dft()
+
+        for region in ['full', 'bulk']:
+            dft = _OnTheFlyDFT(self.mesh, self.frequencies, self.subsample_indices, self.dt, region=region)
+            for k, u in enumerate(self.fields):
+                dft.accumulate(u, k, k*self.dt)
+            uhats = dft.results()
+
+            for nu in self.frequencies:
+                assert uhats[nu].shape == expected[nu].shape
+                bulk = self.mesh.unpad_array(uhats[nu])
+                assert np.allclose(bulk, self.mesh.unpad_array(expected[nu]), rtol=1e-12, atol=0)
+                if region == 'full':
+                    assert np.allclose(uhats[nu], expected[nu], rtol=1e-12, atol=0)
+                else:
+                    assert np.linalg.norm(uhats[nu]) < np.linalg.norm(expected[nu])
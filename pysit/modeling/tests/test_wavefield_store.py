@@ -0,0 +1,199 @@
+from math import comb
+
+import numpy as np
+import pytest
+
+from pysit.modeling.snapshot_codecs import (DowncastCodec, ThresholdCodec,
+                                            QuantizedCodec)
+from pysit.modeling.wavefield_store import (CheckpointedWavefieldStore,
+                                            CompressedWavefieldStore,
+                                            MemmapWavefieldStore,
+                                            binomial_checkpoint_offset)
+
+
+class CounterSolverData(object):
+    # Mimics a leap-frog SolverData whose state after step k is [k+1, k, k-1].
+    def __init__(self, solver):
+        self.solver = solver
+        self.us = [np.zeros(1) for x in range(3)]
+
+    def advance(self):
+        self.us[-1] *= 0
+        self.us.insert(0, self.us.pop(-1))
+
+    @property
+    def kp1(self):
+        return self.us[0]
+
+
+class CounterSolver(object):
+
+    class Mesh(object):
+        def shape(self, include_bc=False):
+            return (1, 1)
+
+    def __init__(self, nsteps):
+        self.nsteps = nsteps
+        self.dt = 1.0
+        self.mesh = self.Mesh()
+
+    def SolverData(self):
+        return CounterSolverData(self)
+
+    def time_step(self, solver_data, rhs_k, rhs_kp1):
+        solver_data.kp1[:] = solver_data.us[1] + rhs_k.ravel()
+
+    def compute_dWaveOp(self, regime, solver_data):
+        return solver_data.us[1].copy()
+
+
+class CounterModeling(object):
+
+    def __init__(self, solver):
+        self.solver = solver
+
+    def _setup_forward_injection(self, source):
+        return CounterInjection()
+
+
+class CounterInjection(object):
+    def zeros(self):
+        return np.zeros((1, 1))
+
+    def inject(self, rhs_array, k):
+        rhs_array[:] = 1.0
+        return rhs_array
+
+
+class CounterSource(object):
+    def f(self, t):
+        return 1.0
+
+
+class CounterShot(object):
+    sources = CounterSource()
+
+
+def forward(store, nsteps, imaging_period):
+    solver = CounterSolver(nsteps)
+    modeling = CounterModeling(solver)
+    store.initialize(modeling, CounterShot(), None, imaging_period)
+
+    solver_data = solver.SolverData()
+    reference = list()
+    for k in range(nsteps):
+        solver.time_step(solver_data, np.ones(1), np.ones(1))
+        store.record(k, solver_data)
+        if k % imaging_period == 0:
+            reference.append(solver.compute_dWaveOp('time', solver_data))
+        if k == nsteps-1:
+            break
+        solver_data.advance()
+    return reference
+
+
+class TestCheckpointedWavefieldStore(object):
+
+    @pytest.mark.parametrize('n_checkpoints', [1, 2, 3, 7, 50])
+    @pytest.mark.parametrize('imaging_period', [1, 4])
+    def test_reverse_sweep_is_exact(self, n_checkpoints, imaging_period):
+        store = CheckpointedWavefieldStore(n_checkpoints)
+        reference = forward(store, 100, imaging_period)
+
+        assert len(store) == len(reference)
+        for entry in range(len(store)-1, -1, -1):
+            assert np.all(store[entry] == reference[entry])
+            assert len(store._checkpoints) <= n_checkpoints
+
+        # forward access after the adjoint sweep, as for the pseudo-Hessian
+        assert all(np.all(a == b) for a, b in zip(store, reference))
+
+    def test_recomputation_bound(self):
+        nsteps, snaps = 200, 4
+        reps = 0
+        while comb(snaps + reps, snaps) < nsteps:
+            reps += 1
+
+        store = CheckpointedWavefieldStore(snaps)
+        forward(store, nsteps, 1)
+        for entry in range(len(store)-1, -1, -1):
+            store[entry]
+
+        assert store.max_checkpoints_used == snaps
+        assert store.n_recomputed_steps <= reps*nsteps
+
+    def test_offsets(self):
+        assert binomial_checkpoint_offset(10, 1) == 10
+        for nsteps in range(3, 60):
+            for snaps in range(2, 6):
+                offset = binomial_checkpoint_offset(nsteps, snaps)
+                assert 1 <= offset < nsteps
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            CheckpointedWavefieldStore(0)
+
+
+class TestMemmapWavefieldStore(object):
+
+    @pytest.mark.parametrize('imaging_period', [1, 3])
+    def test_reverse_sweep_is_exact(self, tmp_path, imaging_period):
+        store = MemmapWavefieldStore(str(tmp_path), prefetch=3, queue_length=2)
+        reference = forward(store, 50, imaging_period)
+
+        assert len(store) == len(reference)
+        for entry in range(len(store)-1, -1, -1):
+            assert np.all(store[entry] == reference[entry])
+        assert sorted(store._pending) == []
+
+        assert all(np.all(a == b) for a, b in zip(store, reference))
+        store.close()
+
+    def test_append(self, tmp_path):
+        store = MemmapWavefieldStore(str(tmp_path), dtype=np.float32)
+        store.initialize(CounterModeling(CounterSolver(4)), CounterShot(), None, 1)
+        for k in range(4):
+            store.append(np.full((2, 3), k, dtype=np.float64))
+        with pytest.raises(IndexError):
+            store.append(np.zeros((2, 3)))
+
+        assert store[-1].dtype == np.float32
+        assert np.all(store[2] == 2)
+        store.close()
+
+
+class TestCompressedWavefieldStore(object):
+
+    def setup(self):
+        x = np.linspace(0, 1, 401)
+        z = np.linspace(0, 1, 201)
+        xx, zz = np.meshgrid(x, z, indexing='ij')
+        self.field = (np.exp(-((xx-0.5)**2 + (zz-0.3)**2)/0.01) *
+                      np.cos(40*xx)).reshape(-1, 1)
+
+    @pytest.mark.parametrize('codec, tol', [(DowncastCodec(np.float32), 1e-7),
+                                            (DowncastCodec(np.float16), 1e-3),
+                                            (ThresholdCodec(1e-3), 1e-3),
+                                            (QuantizedCodec(1e-3), 1e-3)])
+    def test_error_bound(self, codec, tol):
+        store = CompressedWavefieldStore(codec, track_error=True)
+        store.append(self.field)
+
+        out = store[0]
+        assert out.shape == self.field.shape
+        assert out.dtype == self.field.dtype
+        assert np.abs(out - self.field).max() <= tol*np.abs(self.field).max()
+        assert store.max_relative_error <= tol
+        assert store.compression_ratio > 1
+
+    def test_record(self):
+        store = CompressedWavefieldStore('float32')
+        reference = forward(store, 20, 3)
+        assert len(store) == len(reference)
+        assert all(np.all(a == b) for a, b in zip(store, reference))
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            QuantizedCodec(1e-6)
+        with pytest.raises(ValueError):
+            ThresholdCodec(-1)
@@ -0,0 +1,460 @@
+import copy
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from math import comb
+
+import numpy as np
+
+from pysit.modeling.snapshot_codecs import DowncastCodec
+
+__all__ = ['WavefieldStoreBase',
+           'CheckpointedWavefieldStore',
+           'MemmapWavefieldStore',
+           'CompressedWavefieldStore']
+
+__docformat__ = "restructuredtext en"
+
+
+class WavefieldStoreBase(object):
+    """Base class for containers of the forward imaging components (dWaveOp).
+
+    `TemporalModeling.forward_model` fills a store during the forward sweep
+    and `TemporalModeling.adjoint_model` reads it back with `store[entry]`,
+    where `entry = k // imaging_period`.  A plain list is the default store;
+    subclasses trade memory for recomputation, disk, or precision.
+
+    A store is filled through two hooks:
+
+    * `initialize(modeling_tools, shot, m0, imaging_period)` is called once,
+      before the first time step.
+    * `record(k, solver_data)` is called after every time step, when
+      `solver_data` holds the fields needed to compute dWaveOp at step k.
+
+    """
+
+    def __init__(self):
+        self.imaging_period = 1
+        self.nsteps = 0
+
+    def initialize(self, modeling_tools, shot, m0, imaging_period):
+        self.imaging_period = int(imaging_period)
+        self.nsteps = modeling_tools.solver.nsteps
+
+    def record(self, k, solver_data):
+        raise NotImplementedError('\'record\' must be implemented by subclass.')
+
+    def __len__(self):
+        return (self.nsteps - 1) // self.imaging_period + 1 if self.nsteps > 0 else 0
+
+    def __getitem__(self, entry):
+        raise NotImplementedError('\'__getitem__\' must be implemented by subclass.')
+
+    def __iter__(self):
+        for entry in range(len(self)):
+            yield self[entry]
+
+
+def _snapshot_solver_data(solver_data):
+    """Copy of the time levels held by a time domain SolverData object."""
+    return ([copy.deepcopy(u) for u in solver_data.us],
+            [copy.deepcopy(u) for u in getattr(solver_data, 'u_primes', [])])
+
+
+def _restore_solver_data(solver, snapshot):
+    """A new SolverData object holding a copy of a snapshot."""
+    solver_data = solver.SolverData()
+    us, u_primes = snapshot
+    solver_data.us = [copy.deepcopy(u) for u in us]
+    if u_primes:
+        solver_data.u_primes = [copy.deepcopy(u) for u in u_primes]
+    return solver_data
+
+
+def binomial_checkpoint_offset(nsteps, snaps):
+    """Offset of the next checkpoint in a binomial (revolve) schedule.
+
+    Given `nsteps` states (steps 0 through nsteps-1) to be visited in reverse
+    and `snaps` checkpoint slots, one of which already holds step 0, returns
+    the offset of the next checkpoint such that no time step is recomputed
+    more than t times, where t is the smallest integer with
+    binom(snaps+t, snaps) >= nsteps [Griewank 1992].
+
+    Returns `nsteps` if no further checkpoint should be placed.
+
+    """
+
+    if snaps <= 1 or nsteps <= 2:
+        return nsteps
+
+    reps = 0
+    while comb(snaps + reps, snaps) < nsteps:
+        reps += 1
+
+    # After the new checkpoint, the states to its right are reversed with one
+    # slot less and at most reps repetitions, so there can be at most
+    # binom(snaps-1+reps, reps) of them.  Taking the smallest admissible
+    # offset leaves the largest possible stretch to the right, as in revolve.
+    return max(1, nsteps - comb(snaps - 1 + reps, reps))
+
+
+class CheckpointedWavefieldStore(WavefieldStoreBase):
+    """Stores SolverData checkpoints and recomputes dWaveOp on demand.
+
+    Rather than keeping a padded dWaveOp for every imaging step, at most
+    `n_checkpoints` copies of the solver state are kept in memory.  Placement
+    follows a binomial (revolve) schedule, so visiting the entries in reverse
+    order, as the adjoint sweep does, recomputes each forward step a minimal
+    number of times and yields the exact same dWaveOp as the full storage.
+
+    Parameters
+    ----------
+    n_checkpoints : int
+        Number of SolverData snapshots that may be held at once.  Memory use
+        is about 3*n_checkpoints padded wavefields (plus auxiliary fields).
+
+    Notes
+    -----
+    * Entries are recomputed with the solver's current model parameters, so
+      the store must be read before the solver is given another model, as
+      `adjoint_model` does.
+    * Entries may be accessed in any order, but only reverse (adjoint) and
+      forward sweeps are efficient.
+    * Attributes `n_recomputed_steps` and `max_checkpoints_used` report the
+      cost of the schedule.
+
+    """
+
+    def __init__(self, n_checkpoints):
+        WavefieldStoreBase.__init__(self)
+
+        if int(n_checkpoints) < 1:
+            raise ValueError('At least one checkpoint is required.')
+        self.n_checkpoints = int(n_checkpoints)
+
+        self._checkpoints = list()
+        self._work = None
+
+        self.n_recomputed_steps = 0
+        self.max_checkpoints_used = 0
+
+    def initialize(self, modeling_tools, shot, m0, imaging_period):
+        WavefieldStoreBase.initialize(self, modeling_tools, shot, m0, imaging_period)
+
+        self.modeling_tools = modeling_tools
+        self.solver = modeling_tools.solver
+        self.source = shot.sources
+
+        self._checkpoints = list()
+        self._work = None
+        self._rhs_k = None
+        self._rhs_kp1 = None
+
+        self.n_recomputed_steps = 0
+        self.max_checkpoints_used = 0
+
+        # The adjoint sweep starts with the last imaging step, so lay down the
+        # checkpoints for reversing [0, k_last] during the forward sweep.
+        self._k_last = (len(self) - 1) * self.imaging_period
+        self._next_checkpoint = 0
+
+    def record(self, k, solver_data):
+        if k == self._next_checkpoint:
+            self._push(k, solver_data)
+            self._next_checkpoint = self._plan_next(k, self._k_last)
+
+    def _plan_next(self, k, k_target):
+        free = self.n_checkpoints - len(self._checkpoints)
+        offset = binomial_checkpoint_offset(k_target - k + 1, free + 1)
+        return k + offset if k + offset < k_target else None
+
+    def _push(self, k, solver_data):
+        self._checkpoints.append((k, _snapshot_solver_data(solver_data)))
+        self.max_checkpoints_used = max(self.max_checkpoints_used, len(self._checkpoints))
+
+    def _setup_rhs(self, k):
+        if self._rhs_k is None:
+            self._source_injection = self.modeling_tools._setup_forward_injection(self.source)
+            self._rhs_k = self._source_injection.zeros()
+            self._rhs_kp1 = self._source_injection.zeros()
+        self._rhs_k = self._source_injection.inject(self._rhs_k, k)
+        self._rhs_kp1 = self._source_injection.inject(self._rhs_kp1, k+1)
+
+    def _step(self, k, solver_data):
+        """Advance solver_data from the state after time step k to the state
+        after time step k+1."""
+        solver_data.advance()
+        self._setup_rhs(k+1)
+        self.solver.time_step(solver_data, self._rhs_k, self._rhs_kp1)
+        self.n_recomputed_steps += 1
+
+    def _advance(self, k_from, k_to, solver_data, plan=True):
+        k = k_from
+        next_checkpoint = self._plan_next(k, k_to) if plan else None
+        while k < k_to:
+            self._step(k, solver_data)
+            k += 1
+            if k == next_checkpoint:
+                self._push(k, solver_data)
+                next_checkpoint = self._plan_next(k, k_to)
+        return solver_data
+
+    def __getitem__(self, entry):
+
+        if entry < 0:
+            entry += len(self)
+        if entry < 0 or entry >= len(self):
+            raise IndexError('dWaveOp entry out of range.')
+
+        k = entry * self.imaging_period
+
+        work = self._work
+        if (work is not None and work[0] <= k and
+                not any(work[0] < kc <= k for kc, s in self._checkpoints)):
+            # Forward access: continue from the last computed state.
+            solver_data = self._advance(work[0], k, work[1], plan=False)
+        else:
+            # Reverse access: checkpoints past k are no longer needed.
+            while len(self._checkpoints) > 1 and self._checkpoints[-1][0] > k:
+                self._checkpoints.pop()
+            kc, snapshot = self._checkpoints[-1]
+            if kc > k:
+                raise IndexError('No checkpoint precedes step {0}.'.format(k))
+            solver_data = _restore_solver_data(self.solver, snapshot)
+            solver_data = self._advance(kc, k, solver_data)
+
+        self._work = (k, solver_data)
+
+        return self.solver.compute_dWaveOp('time', solver_data)
+
+
+class MemmapWavefieldStore(WavefieldStoreBase):
+    """Streams the forward snapshots to a memory-mapped scratch file.
+
+    Each snapshot is copied into a preallocated `numpy.memmap` by a background
+    writer thread, so that disk writes overlap with time stepping.  Reads
+    prefetch the next few entries, in the direction of the last two accesses,
+    on a second thread, so a reverse (adjoint) sweep finds its snapshots
+    already in memory.
+
+    The store can hold either the dWaveOp components, through the
+    `dWaveOp_store` argument of `TemporalModeling.forward_model`, or the
+    wavefield, through its `wavefield_store` argument.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Scratch directory for the backing file, defaults to the system
+        temporary directory.  The file is unlinked on creation and vanishes
+        with the store.
+    prefetch : int, optional
+        Number of entries read ahead of the current one, defaults to 2.
+    queue_length : int, optional
+        Number of snapshots that may wait for the writer thread before the
+        time stepping blocks, defaults to 4.  Bounds the extra memory use.
+    dtype : numpy.dtype, optional
+        Storage precision, defaults to that of the first snapshot.
+
+    """
+
+    def __init__(self, directory=None, prefetch=2, queue_length=4, dtype=None):
+        WavefieldStoreBase.__init__(self)
+
+        self.directory = directory
+        self.prefetch = int(prefetch)
+        self.queue_length = int(queue_length)
+        self.dtype = dtype
+
+        self._file = None
+        self._data = None
+        self._writer = None
+        self._write_error = None
+        self._queue = None
+        self._reader = None
+        self._pending = dict()
+        self._last_read = None
+        self._n_entries = 0
+
+    def initialize(self, modeling_tools, shot, m0, imaging_period):
+        WavefieldStoreBase.initialize(self, modeling_tools, shot, m0, imaging_period)
+        self.close()
+        self.solver = modeling_tools.solver
+        self._n_entries = 0
+
+    def record(self, k, solver_data):
+        if k % self.imaging_period == 0:
+            self.append(self.solver.compute_dWaveOp('time', solver_data))
+
+    def append(self, arr):
+        """Queue a snapshot to be written.  `arr` must not be modified after
+        it is passed in."""
+
+        if self._n_entries >= len(self):
+            raise IndexError('Store holds at most {0} entries.'.format(len(self)))
+
+        if self._data is None:
+            self._allocate(arr)
+
+        self._queue.put((self._n_entries, arr))
+        self._n_entries += 1
+
+    def _allocate(self, arr):
+        dtype = arr.dtype if self.dtype is None else np.dtype(self.dtype)
+        self._file = tempfile.TemporaryFile(dir=self.directory)
+        self._data = np.memmap(self._file, dtype=dtype, mode='w+',
+                               shape=(len(self),) + arr.shape)
+
+        self._queue = queue.Queue(maxsize=self.queue_length)
+        self._write_error = None
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            entry, arr = item
+            # Keep draining after a failure so the time stepping never blocks;
+            # the error is raised on the first read.
+            if self._write_error is None:
+                try:
+                    self._data[entry] = arr
+                except Exception as e:
+                    self._write_error = e
+
+    def _finish_writing(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._write_error is not None:
+            raise IOError('Writing the scratch file failed: {0}'.format(self._write_error))
+
+    def _load(self, entry):
+        return np.array(self._data[entry])
+
+    def __getitem__(self, entry):
+
+        if entry < 0:
+            entry += self._n_entries
+        if entry < 0 or entry >= self._n_entries:
+            raise IndexError('Snapshot entry out of range.')
+
+        self._finish_writing()
+        if self._reader is None:
+            self._reader = ThreadPoolExecutor(max_workers=1)
+
+        future = self._pending.pop(entry, None)
+        arr = future.result() if future is not None else self._load(entry)
+
+        # Read ahead in the direction of the sweep.
+        step = -1 if (self._last_read is not None and entry < self._last_read) else 1
+        self._last_read = entry
+        ahead = [entry + step*i for i in range(1, self.prefetch+1)]
+        ahead = [e for e in ahead if 0 <= e < self._n_entries]
+        for e in list(self._pending):
+            if e not in ahead:
+                self._pending.pop(e).cancel()
+        for e in ahead:
+            if e not in self._pending:
+                self._pending[e] = self._reader.submit(self._load, e)
+
+        return arr
+
+    def close(self):
+        """Stop the worker threads and release the scratch file."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._reader is not None:
+            for future in self._pending.values():
+                future.cancel()
+            self._reader.shutdown(wait=True)
+            self._reader = None
+        self._pending = dict()
+        self._last_read = None
+        self._data = None
+        self._write_error = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class CompressedWavefieldStore(WavefieldStoreBase):
+    """Holds the forward snapshots in memory in an encoded, usually lossy, form.
+
+    Parameters
+    ----------
+    codec : pysit.modeling.SnapshotCodecBase or {'float32', 'float16'}
+        Encoding applied to each snapshot.  Strings select a DowncastCodec.
+    track_error : bool, optional
+        If True, each snapshot is decoded right after encoding and the largest
+        pointwise error, relative to the peak of the snapshot, is recorded in
+        `max_relative_error`.  Doubles the cost of the codec.
+
+    Notes
+    -----
+    * Like `MemmapWavefieldStore`, the store can also receive the wavefield
+      through `append`.
+    * `compression_ratio` is the ratio of the raw to the encoded size of the
+      snapshots stored so far.
+
+    """
+
+    def __init__(self, codec='float32', track_error=False):
+        WavefieldStoreBase.__init__(self)
+
+        if isinstance(codec, str):
+            codec = DowncastCodec(codec)
+        self.codec = codec
+        self.track_error = track_error
+
+        self._entries = list()
+        self.raw_nbytes = 0
+        self.encoded_nbytes = 0
+        self.max_relative_error = 0.0
+
+    def initialize(self, modeling_tools, shot, m0, imaging_period):
+        WavefieldStoreBase.initialize(self, modeling_tools, shot, m0, imaging_period)
+        self.solver = modeling_tools.solver
+
+        self._entries = list()
+        self.raw_nbytes = 0
+        self.encoded_nbytes = 0
+        self.max_relative_error = 0.0
+
+    def record(self, k, solver_data):
+        if k % self.imaging_period == 0:
+            self.append(self.solver.compute_dWaveOp('time', solver_data))
+
+    def append(self, arr):
+        encoded = self.codec.encode(arr)
+        self._entries.append(encoded)
+
+        self.raw_nbytes += arr.nbytes
+        self.encoded_nbytes += self.codec.nbytes(encoded)
+
+        if self.track_error:
+            peak = np.abs(arr).max()
+            if peak > 0:
+                err = np.abs(self.codec.decode(encoded) - arr).max() / peak
+                self.max_relative_error = max(self.max_relative_error, err)
+
+    @property
+    def compression_ratio(self):
+        return self.raw_nbytes / self.encoded_nbytes if self.encoded_nbytes else 1.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, entry):
+        return self.codec.decode(self._entries[entry])
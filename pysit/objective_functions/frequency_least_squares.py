@@ -14,11 +14,14 @@ __docformat__ = "restructuredtext en"
 
 class FrequencyLeastSquares(ObjectiveFunctionBase):
 
-    def __init__(self, solver, parallel_wrap_shot=ParallelWrapShotNull()):
+    def __init__(self, solver, parallel_wrap_shot=ParallelWrapShotNull(), shot_block_size=1):
+        """shot_block_size: Number of shots modeled together, with one block solve per frequency. The residuals and dWaveOp of all shots of a block are held in memory at once, so the default, 1, accumulates the misfit and the gradient shot by shot. None models all rank local shots as one block.
+        """
         self.solver = solver
         self.modeling_tools = FrequencyModeling(solver)
 
         self.parallel_wrap_shot = parallel_wrap_shot
+        self.shot_block_size = shot_block_size
 
     def _residual_list(self, shots_list, m0, frequencies=None, frequency_weights=None, dWaveOp=None, wavefield=None, **kwargs):
         """Computes residual in the usual sense for a list of shots
@@ -122,23 +125,15 @@ class FrequencyLeastSquares(ObjectiveFunctionBase):
         if frequency_weights is None:
             frequency_weights = itertools.repeat(1.0)
 
-        if 'petsc' in kwargs:
-            r_norm2, resid_list = self._residual_list(shots, m0, frequencies, frequency_weights, **kwargs)
-        else:
-            r_norm2 = 0
-            for shot in shots:
-                # ensure that the dft of the data exists
-                shot.receivers.compute_data_dft(frequencies)
-                r = self._residual(shot, m0, frequencies)
-                for nu,weight in zip(frequencies,frequency_weights):
-                    r_norm2 += weight*np.linalg.norm(r[nu])**2
-
-            # sum-reduce and communicate result
-            if self.parallel_wrap_shot.use_parallel:
-                # Allreduce wants an array, so we give it a 0-D array
-                new_r_norm2 = np.array(0.0)
-                self.parallel_wrap_shot.comm.Allreduce(np.array(r_norm2), new_r_norm2)
-                r_norm2 = new_r_norm2[()] # goofy way to access 0-D array element
+        # the shots of a block are modeled together, with one block solve per
+        # frequency
+        r_norm2 = 0.0
+        for block in self.parallel_wrap_shot.schedule_blocks(shots, self.shot_block_size):
+            block_r_norm2, resid_list = self._residual_list(block, m0, frequencies, frequency_weights, **kwargs)
+            r_norm2 += block_r_norm2
+
+        # sum-reduce and communicate result
+        r_norm2, = self.parallel_wrap_shot.reduce_sum(r_norm2)
 
         return 0.5*r_norm2 # *d_omega which does not exist for this problem !!! check if a dt needed
 
@@ -236,43 +231,25 @@ class FrequencyLeastSquares(ObjectiveFunctionBase):
 
         if frequency_weights is not None and (len(frequencies) != len(frequency_weights)):
             raise ValueError('Weights and frequencies must be the same length.')
-        if 'petsc' in kwargs and kwargs['petsc'] is not None:
-            if frequency_weights is None:
-                frequency_weights = itertools.repeat(1.0)
+        if frequency_weights is None:
+            frequency_weights = itertools.repeat(1.0)
+
+        # the shots of a block are modeled together, with one block solve per
+        # frequency for the forward and the adjoint fields
+        grad = m0.perturbation()
+        r_norm2 = 0.0
+        for block in self.parallel_wrap_shot.schedule_blocks(shots, self.shot_block_size):
+            g, block_r_norm2 = self._gradient_helper_list(block, m0, frequencies, frequency_weights, ignore_minus=True, **kwargs)
+            r_norm2 += block_r_norm2
 
-            grad = m0.perturbation()
-            g, r_norm2 = self._gradient_helper_list(shots, m0, frequencies, frequency_weights, ignore_minus=True, **kwargs)
-        
             for i in range(len(g)):
                 grad -= g[i]
 
-        else:
-            # compute the portion of the gradient due to each shot
-            grad = m0.perturbation()
-            r_norm2 = 0.0
-            for shot in shots:
-                # ensure that the dft of the data exists
-                shot.receivers.compute_data_dft(frequencies)
-
-                g, r = self._gradient_helper(shot, m0, frequencies, frequency_weights, ignore_minus=True, **kwargs)
-                grad -= g
-
-                if frequency_weights is None:
-                    frequency_weights = itertools.repeat(1.0)
-
-                for nu,weight in zip(frequencies,frequency_weights):
-                    r_norm2 += weight*np.linalg.norm(r[nu])**2
-
-            # sum-reduce and communicate result
-            if self.parallel_wrap_shot.use_parallel:
-                # Allreduce wants an array, so we give it a 0-D array
-                new_r_norm2 = np.array(0.0)
-                self.parallel_wrap_shot.comm.Allreduce(np.array(r_norm2), new_r_norm2)
-                r_norm2 = new_r_norm2[()] # goofy way to access 0-D array element
-
-                ngrad = np.zeros_like(grad.asarray())
-                self.parallel_wrap_shot.comm.Allreduce(grad.asarray(), ngrad)
-                grad=m0.perturbation(data=ngrad)
+        # sum-reduce and communicate result
+        if self.parallel_wrap_shot.use_parallel:
+            # the residual norm and the gradient are summed in one message
+            r_norm2, ngrad = self.parallel_wrap_shot.reduce_sum(r_norm2, grad.asarray(), key='gradient')
+            grad = m0.perturbation(data=ngrad)
 
         # store any auxiliary info that is requested
         if ('residual_norm' in aux_info) and aux_info['residual_norm'][0]:
@@ -292,7 +269,7 @@ class FrequencyLeastSquares(ObjectiveFunctionBase):
         result = m0.perturbation()
 
         if hessian_mode in ['approximate', 'levenberg']:
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
 
                 linear_retval = self.modeling_tools.linear_forward_model(shot, m0, m1, frequencies, return_parameters=['simdata', 'dWaveOp0'])
                 dWaveOp0 = linear_retval['dWaveOp0']
@@ -303,7 +280,7 @@ class FrequencyLeastSquares(ObjectiveFunctionBase):
                 result.toreal()
 
         elif hessian_mode == 'full':
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # Run the forward modeling step
                 dWaveOp0 = dict() # wave operator derivative wrt model for u_0
                 r0 = self._residual(shot, m0, frequencies, dWaveOp=dWaveOp0, **kwargs)
@@ -77,7 +77,7 @@ class HybridLeastSquares(ObjectiveFunctionBase):
             frequency_weights = itertools.repeat(1.0)
 
         r_norm2 = 0
-        for shot in shots:
+        for shot in self.parallel_wrap_shot.schedule(shots):
             # ensure that the dft of the data exists
             shot.receivers.compute_data_dft(frequencies)
             r = self._residual(shot, m0, frequencies)
@@ -142,7 +142,7 @@ class HybridLeastSquares(ObjectiveFunctionBase):
         # compute the portion of the gradient due to each shot
         grad = m0.perturbation()
         r_norm2 = 0.0
-        for shot in shots:
+        for shot in self.parallel_wrap_shot.schedule(shots):
             # ensure that the dft of the data exists
             shot.receivers.compute_data_dft(frequencies)
 
@@ -157,14 +157,9 @@ class HybridLeastSquares(ObjectiveFunctionBase):
 
         # sum-reduce and communicate result
         if self.parallel_wrap_shot.use_parallel:
-            # Allreduce wants an array, so we give it a 0-D array
-            new_r_norm2 = np.array(0.0)
-            self.parallel_wrap_shot.comm.Allreduce(np.array(r_norm2), new_r_norm2)
-            r_norm2 = new_r_norm2[()] # goofy way to access 0-D array element
-
-            ngrad = np.zeros_like(grad.asarray())
-            self.parallel_wrap_shot.comm.Allreduce(grad.asarray(), ngrad)
-            grad=m0.perturbation(data=ngrad)
+            # the residual norm and the gradient are summed in one message
+            r_norm2, ngrad = self.parallel_wrap_shot.reduce_sum(r_norm2, grad.asarray(), key='gradient')
+            grad = m0.perturbation(data=ngrad)
 
 
         # store any auxiliary info that is requested
@@ -186,7 +181,7 @@ class HybridLeastSquares(ObjectiveFunctionBase):
         result = m0.perturbation()
 
         if hessian_mode in ['approximate', 'levenberg']:
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # ensure that the dft of the data exists
                 shot.receivers.compute_data_dft(frequencies)
 
@@ -200,7 +195,7 @@ class HybridLeastSquares(ObjectiveFunctionBase):
 
         elif hessian_mode == 'full':
             raise NotImplementedError("Full hessian for the nonlinear hybrid frequency objective function not implemented.")
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # ensure that the dft of the data exists
                 shot.receivers.compute_data_dft(frequencies)
                 # Run the forward modeling step
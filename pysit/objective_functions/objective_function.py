@@ -24,4 +24,18 @@ class ObjectiveFunctionBase(object):
         raise NotImplementedError("Must be implemented by subclass.")
 
     def apply_hessian(self, operand, *args, **kwargs):
-        raise NotImplementedError("Must be implemented by subclass.")
\ No newline at end of file
+        raise NotImplementedError("Must be implemented by subclass.")
+
+    def linearized_objective(self, *args, **kwargs):
+        raise NotImplementedError("Must be implemented by subclass.")
+
+    def _filter_observed_data(self, shot, dobs=None):
+        """ Applies filter_op to the observed data dobs of shot.  If dobs is
+            not given, the data of the receivers interpolated to the solver
+            times are filtered, and the result is cached by the receivers
+            where the filter supports it.  The result must not be modified. """
+        if dobs is not None:
+            return self.filter_op * dobs
+        if hasattr(self.filter_op, 'filter_observed_data'):
+            return self.filter_op.filter_observed_data(shot, self.solver.ts())
+        return self.filter_op * shot.receivers.interpolate_data(self.solver.ts())
@@ -72,7 +72,7 @@ class TemporalCorrelate(ObjectiveFunctionBase):
             dpred = shot.receivers.time_window(self.solver.ts()) * dpred
 
         if self.filter_op is not None:
-            dobs = self.filter_op * shot.receivers.interpolate_data(self.solver.ts())
+            dobs = self._filter_observed_data(shot)
             dpred = self.filter_op * dpred
             # resid = self.filter_op * resid
             # adjoint_src = self.filter_op * resid
@@ -142,7 +142,7 @@ class TemporalCorrelate(ObjectiveFunctionBase):
         """ Evaluate the least squares objective function over a list of shots."""
 
         r_norm2 = 0
-        for shot in shots:
+        for shot in self.parallel_wrap_shot.schedule(shots):
             r, adjoint_src = self._residual(shot, m0)
             if self.zero_lag is False:
                 r_norm2 += np.linalg.norm(r)**2
@@ -234,7 +234,7 @@ class TemporalCorrelate(ObjectiveFunctionBase):
         grad = m0.perturbation()
         r_norm2 = 0.0
         pseudo_h_diag = np.zeros(m0.asarray().shape)
-        for shot in shots:
+        for shot in self.parallel_wrap_shot.schedule(shots):
             if ('pseudo_hess_diag' in aux_info) and aux_info['pseudo_hess_diag'][0]:
                 g, r, h = self._gradient_helper(shot, m0, ignore_minus=True, ret_pseudo_hess_diag_comp = True, **kwargs)
                 pseudo_h_diag += h 
@@ -249,19 +249,14 @@ class TemporalCorrelate(ObjectiveFunctionBase):
 
         # sum-reduce and communicate result
         if self.parallel_wrap_shot.use_parallel:
-            # Allreduce wants an array, so we give it a 0-D array
-            new_r_norm2 = np.array(0.0)
-            self.parallel_wrap_shot.comm.Allreduce(np.array(r_norm2), new_r_norm2)
-            r_norm2 = new_r_norm2[()] # goofy way to access 0-D array element
-
-            ngrad = np.zeros_like(grad.asarray())
-            self.parallel_wrap_shot.comm.Allreduce(grad.asarray(), ngrad)
-            grad=m0.perturbation(data=ngrad)
-            
+            # the residual norm, the gradient and the pseudo hessian diagonal
+            # are summed in one message
             if ('pseudo_hess_diag' in aux_info) and aux_info['pseudo_hess_diag'][0]:
-                pseudo_h_diag_temp = np.zeros(pseudo_h_diag.shape)
-                self.parallel_wrap_shot.comm.Allreduce(pseudo_h_diag, pseudo_h_diag_temp)
-                pseudo_h_diag = pseudo_h_diag_temp 
+                r_norm2, ngrad, pseudo_h_diag = self.parallel_wrap_shot.reduce_sum(
+                    r_norm2, grad.asarray(), pseudo_h_diag, key='gradient')
+            else:
+                r_norm2, ngrad = self.parallel_wrap_shot.reduce_sum(r_norm2, grad.asarray(), key='gradient')
+            grad = m0.perturbation(data=ngrad)
 
         # account for the measure in the integral over time
         r_norm2 *= self.solver.dt
@@ -286,7 +281,7 @@ class TemporalCorrelate(ObjectiveFunctionBase):
         result = m0.perturbation()
 
         if hessian_mode in ['approximate', 'levenberg']:
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # Run the forward modeling step
                 retval = self.modeling_tools.forward_model(shot, m0, return_parameters=['dWaveOp'])
                 dWaveOp0 = retval['dWaveOp']
@@ -297,7 +292,7 @@ class TemporalCorrelate(ObjectiveFunctionBase):
                 result += self.modeling_tools.migrate_shot(shot, m0, d1, dWaveOp=dWaveOp0)
 
         elif hessian_mode == 'full':
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # Run the forward modeling step
                 dWaveOp0 = list() # wave operator derivative wrt model for u_0
                 r0, adjoint_src = self._residual(shot, m0, dWaveOp=dWaveOp0, **kwargs)
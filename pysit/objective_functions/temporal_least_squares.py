@@ -6,6 +6,7 @@ import copy as copy
 from pysit.objective_functions.objective_function import ObjectiveFunctionBase
 from pysit.util.parallel import ParallelWrapShotNull
 from pysit.modeling.temporal_modeling import TemporalModeling
+from pysit.modeling.wavefield_store import CheckpointedWavefieldStore, MemmapWavefieldStore, CompressedWavefieldStore
 
 __all__ = ['TemporalLeastSquares']
 
@@ -15,9 +16,13 @@ __docformat__ = "restructuredtext en"
 class TemporalLeastSquares(ObjectiveFunctionBase):
     """ How to compute the parts of the objective you need to do optimization """
 
-    def __init__(self, solver, filter_op=None, parallel_wrap_shot=ParallelWrapShotNull(), imaging_period=1, normalize_trace=False, regularization=None, normalize_obs=True):
+    def __init__(self, solver, filter_op=None, parallel_wrap_shot=ParallelWrapShotNull(), imaging_period=1, normalize_trace=False, regularization=None, normalize_obs=True, checkpoints=None, scratch_dir=None, compression=None, cache_wavefields=False):
         """imaging_period: Imaging happens every 'imaging_period' timesteps. Use higher numbers to reduce memory consumption at the cost of lower gradient accuracy.
             By assigning this value to the class, it will automatically be used when the gradient function of the temporal objective function is called in an inversion context.
+           checkpoints: If set, the gradient keeps at most this many solver states in memory and recomputes the forward imaging components in the adjoint sweep, following a binomial checkpointing schedule. The gradient is unchanged.
+           scratch_dir: If set, the forward imaging components (and the wavefield, for variable density) are streamed to memory-mapped files in this directory rather than held in memory. Ignored for the imaging components if checkpoints is set.
+           compression: If set, the forward imaging components are held in memory in encoded form, e.g., 'float32', 'float16', or a pysit.modeling.SnapshotCodecBase instance such as QuantizedCodec(1e-3). Lossy codecs perturb the gradient; requesting 'gradient_relative_error' in the aux_info of compute_gradient reports the relative error against the uncompressed gradient. Ignored if checkpoints or scratch_dir is set.
+           cache_wavefields: If True, the gradient keeps the forward imaging components of all shots in memory until the next gradient, so that linearized_objective, e.g., in the 'born' line search, only runs the linearized solves. Requires imaging_period 1 and in-memory imaging components.
         """
         self.solver = solver
         self.modeling_tools = TemporalModeling(solver)
@@ -29,6 +34,15 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
         self.filter_op = filter_op
         self.normalize_trace = normalize_trace
         self.normalize_obs = normalize_obs
+        self.checkpoints = checkpoints
+        self.scratch_dir = scratch_dir
+        self.compression = compression
+        self.cache_wavefields = cache_wavefields
+
+        # Residuals (and forward imaging components) of the shots of the last
+        # gradient, and the model at which they were computed, reused by
+        # `linearized_objective`
+        self._linearization_cache = (None, dict())
 
     def _residual(self, shot, m0, dWaveOp=None, wavefield=None):
         """Computes residual in the usual sense.
@@ -54,8 +68,14 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
         if wavefield is not None:
             rp.append('wavefield')
 
+        # A list is filled by copying out below, any other container is a
+        # wavefield store that the forward model fills in place.
+        dWaveOp_store = None if (dWaveOp is None or isinstance(dWaveOp, list)) else dWaveOp
+        wavefield_store = None if (wavefield is None or isinstance(wavefield, list)) else wavefield
+
         # Run the forward modeling step
-        retval = self.modeling_tools.forward_model(shot, m0, self.imaging_period, return_parameters=rp)
+        retval = self.modeling_tools.forward_model(shot, m0, self.imaging_period, return_parameters=rp,
+                                                   dWaveOp_store=dWaveOp_store, wavefield_store=wavefield_store)
 
         # Compute the residual vector by interpolating the measured data to the
         # timesteps used in the previous forward modeling stage.
@@ -85,7 +105,7 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
         #     resid = shot.receivers.interpolate_data(self.solver.ts()) - dpred
 
         if self.filter_op is not None:
-            dobs = self.filter_op * dobs
+            dobs = self._filter_observed_data(shot)
             dpred = self.filter_op * dpred
             resid = dobs - dpred
             adjoint_src = self.filter_op.__adj_mul__(resid)
@@ -131,9 +151,9 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
 
 
         # If the second derivative info is needed, copy it out
-        if dWaveOp is not None:
+        if dWaveOp is not None and dWaveOp_store is None:
             dWaveOp[:] = retval['dWaveOp'][:]
-        if wavefield is not None:
+        if wavefield is not None and wavefield_store is None:
             wavefield[:] = retval['wavefield'][:]
 
         return resid, adjoint_src
@@ -142,7 +162,7 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
         """ Evaluate the least squares objective function over a list of shots."""
 
         r_norm2 = 0
-        for shot in shots:
+        for shot in self.parallel_wrap_shot.schedule(shots):
             r, adjoint_src = self._residual(shot, m0)
             r_norm2 += np.linalg.norm(r)**2
 
@@ -161,7 +181,7 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
 
         return output
 
-    def _gradient_helper(self, shot, m0, ignore_minus=False, ret_pseudo_hess_diag_comp=False, **kwargs):
+    def _gradient_helper(self, shot, m0, ignore_minus=False, ret_pseudo_hess_diag_comp=False, linearization=None, **kwargs):
         """Helper function for computing the component of the gradient due to a
         single shot.
 
@@ -171,17 +191,27 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
         ----------
         shot : pysit.Shot
             Shot for which to compute the residual.
+        linearization : dict, optional
+            If given, the residual of the shot, and its forward imaging
+            components if `cache_wavefields` is set, are stored in it.
 
         """
 
         # Compute the residual vector and its norm
-        dWaveOp = []
+        if self.checkpoints is not None:
+            dWaveOp = CheckpointedWavefieldStore(self.checkpoints)
+        elif self.scratch_dir is not None:
+            dWaveOp = MemmapWavefieldStore(self.scratch_dir)
+        elif self.compression is not None:
+            dWaveOp = CompressedWavefieldStore(self.compression)
+        else:
+            dWaveOp = []
 
         # If this is true, then we are dealing with variable density. In this case, we want our forward solve
         # To also return the wavefield, because we need to take gradients of the wavefield in the adjoint model
         # Step to calculate the gradient of our objective in terms of m2 (ie. 1/rho)
         if hasattr(m0, 'kappa') and hasattr(m0, 'rho'):
-            wavefield = []
+            wavefield = [] if self.scratch_dir is None else MemmapWavefieldStore(self.scratch_dir)
         else:
             wavefield = None
 
@@ -191,6 +221,12 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
         g = self.modeling_tools.migrate_shot(
             shot, m0, adjoint_src, self.imaging_period, dWaveOp=dWaveOp, wavefield=wavefield)
 
+        if linearization is not None:
+            keep = self.cache_wavefields and self.imaging_period == 1 and isinstance(dWaveOp, list)
+            # Keyed on the shot itself rather than its id, so that the cache
+            # keeps the shot alive and a new shot never hits a stale entry
+            linearization[shot] = (r, dWaveOp if keep else None)
+
         if not ignore_minus:
             g = -1*g
 
@@ -240,32 +276,35 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
         grad = m0.perturbation()
         r_norm2 = 0.0
         pseudo_h_diag = np.zeros(m0.asarray().shape)
-        for shot in shots:
+        # Release the previous linearization before the new one is built
+        self._linearization_cache = (None, dict())
+        linearization = dict()
+        for shot in self.parallel_wrap_shot.schedule(shots):
             if ('pseudo_hess_diag' in aux_info) and aux_info['pseudo_hess_diag'][0]:
                 g, r, h = self._gradient_helper(
-                    shot, m0, ignore_minus=True, ret_pseudo_hess_diag_comp=True, **kwargs)
+                    shot, m0, ignore_minus=True, ret_pseudo_hess_diag_comp=True, linearization=linearization, **kwargs)
                 pseudo_h_diag += h
             else:
-                g, r = self._gradient_helper(shot, m0, ignore_minus=True, **kwargs)
+                g, r = self._gradient_helper(shot, m0, ignore_minus=True, linearization=linearization, **kwargs)
 
             grad -= g  # handle the minus 1 in the definition of the gradient of this objective
             r_norm2 += np.linalg.norm(r)**2
 
+        self._linearization_cache = (np.array(m0.data, copy=True), linearization)
+
         # sum-reduce and communicate result
         if self.parallel_wrap_shot.use_parallel:
-            # Allreduce wants an array, so we give it a 0-D array
-            new_r_norm2 = np.array(0.0)
-            self.parallel_wrap_shot.comm.Allreduce(np.array(r_norm2), new_r_norm2)
-            r_norm2 = new_r_norm2[()]  # goofy way to access 0-D array element
-
-            ngrad = np.zeros_like(grad.asarray())
-            self.parallel_wrap_shot.comm.Allreduce(grad.asarray(), ngrad)
+            # the residual norm, the gradient and the pseudo hessian diagonal
+            # are summed in one message
+            if ('pseudo_hess_diag' in aux_info) and aux_info['pseudo_hess_diag'][0]:
+                r_norm2, ngrad, pseudo_h_diag = self.parallel_wrap_shot.reduce_sum(
+                    r_norm2, grad.asarray(), pseudo_h_diag, key='gradient')
+            else:
+                r_norm2, ngrad = self.parallel_wrap_shot.reduce_sum(r_norm2, grad.asarray(), key='gradient')
             grad = m0.perturbation(data=ngrad)
 
-            if ('pseudo_hess_diag' in aux_info) and aux_info['pseudo_hess_diag'][0]:
-                pseudo_h_diag_temp = np.zeros(pseudo_h_diag.shape)
-                self.parallel_wrap_shot.comm.Allreduce(pseudo_h_diag, pseudo_h_diag_temp)
-                pseudo_h_diag = pseudo_h_diag_temp
+        if self.regularization is not None:
+            reg_val, reg_grad = self.regularization(m0.data)
 
         # account for the measure in the integral over time
         r_norm2 *= self.solver.dt
@@ -274,7 +313,6 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
 
         obj_val = 0.5*r_norm2
         if self.regularization is not None:
-            reg_val, reg_grad = self.regularization(m0.data)
             grad.data += reg_grad
             obj_val += reg_val
 
@@ -286,9 +324,114 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
             aux_info['objective_value'] = (True, obj_val)
         if ('pseudo_hess_diag' in aux_info) and aux_info['pseudo_hess_diag'][0]:
             aux_info['pseudo_hess_diag'] = (True, pseudo_h_diag)
+        if ('gradient_relative_error' in aux_info) and aux_info['gradient_relative_error'][0]:
+            aux_info['gradient_relative_error'] = (True, self._gradient_relative_error(shots, m0, grad, **kwargs))
 
         return grad
 
+    def _gradient_relative_error(self, shots, m0, grad, **kwargs):
+        """Relative error of a gradient computed with `compression` against
+        the gradient from the uncompressed forward imaging components.
+
+        The reference costs a second gradient.  Without compression, or if it
+        is ignored because checkpoints or scratch_dir is set, the error is 0.
+        """
+
+        if self.compression is None or self.checkpoints is not None or self.scratch_dir is not None:
+            return 0.0
+
+        compression, self.compression = self.compression, None
+        try:
+            reference = self.compute_gradient(shots, m0, **kwargs)
+        finally:
+            self.compression = compression
+
+        return np.linalg.norm(grad.data - reference.data) / np.linalg.norm(reference.data)
+
+    def _linear_residual(self, shot, d1):
+        """Applies the time window, filter and trace normalization of
+        `_residual` to the linearized data d1."""
+
+        if shot.receivers.time_window is not None:
+            d1 = shot.receivers.time_window(self.solver.ts()) * d1
+
+        if self.filter_op is not None:
+            d1 = self.filter_op * d1
+
+        if self.normalize_trace is True:
+            dobs = shot.receivers.interpolate_data(self.solver.ts())
+            if self.filter_op is not None:
+                dobs = self._filter_observed_data(shot)
+            norm_obs = np.linalg.norm(dobs, axis=0)
+            d1 = d1 / np.where(norm_obs > 1e-14, norm_obs, 1.0)
+
+        return d1
+
+    def linearized_objective(self, shots, m0, m1, **kwargs):
+        """Predicts the objective along the direction m1 from linearized data.
+
+        One linear forward model per shot gives the data perturbation
+        d1 = F m1, and the objective at m0 + alpha*m1 is predicted as
+        0.5*dt*||r0 - alpha*d1||^2, plus the regularization at m0 + alpha*m1.
+        The residuals r0 at m0 are those of the last `compute_gradient`, if
+        that was at m0, and are only recomputed otherwise.  With
+        `cache_wavefields`, the linear forward models also reuse its forward
+        imaging components, rather than solving for the background wavefield
+        again.
+
+        Parameters
+        ----------
+        shots : list of pysit.Shot
+            List of Shots for which to compute.
+        m0 : ModelParameters
+            The base point of the line search.
+        m1 : ModelPerturbation
+            The search direction.
+
+        Returns
+        -------
+        predict : callable
+            Maps alpha to the predicted objective value.
+
+        """
+
+        if self.normalize_trace is True and self.normalize_obs is not True:
+            raise NotImplementedError('Traces normalized by the predicted data are not linear in the model.')
+
+        cached_model, linearization = self._linearization_cache
+        if cached_model is None or cached_model.shape != m0.data.shape or not np.array_equal(cached_model, m0.data):
+            linearization = dict()
+
+        rr, rd, dd = 0.0, 0.0, 0.0
+        for shot in self.parallel_wrap_shot.schedule(shots):
+            if shot in linearization:
+                r0, dWaveOp0 = linearization[shot]
+            else:
+                r0, adjoint_src = self._residual(shot, m0, **kwargs)
+                dWaveOp0 = None
+
+            retval = self.modeling_tools.linear_forward_model(shot, m0, m1, return_parameters=['simdata'],
+                                                              dWaveOp0=dWaveOp0)
+            d1 = self._linear_residual(shot, retval['simdata'])
+
+            rr += np.sum(r0*r0)
+            rd += np.sum(r0*d1)
+            dd += np.sum(d1*d1)
+
+        if self.parallel_wrap_shot.use_parallel:
+            rr, rd, dd = self.parallel_wrap_shot.reduce_sum(rr, rd, dd)
+
+        dt = self.solver.dt
+
+        def predict(alpha):
+            output = 0.5*dt*(rr - 2*alpha*rd + alpha**2*dd)
+            if self.regularization is not None:
+                reg_val, reg_grad = self.regularization((m0 + alpha*m1).data)
+                output += reg_val
+            return output
+
+        return predict
+
     def apply_hessian(self, shots, m0, m1, hessian_mode='approximate', levenberg_mu=0.0, *args, **kwargs):
 
         modes = ['approximate', 'full', 'levenberg']
@@ -299,7 +442,7 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
         result = m0.perturbation()
 
         if hessian_mode in ['approximate', 'levenberg']:
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # Run the forward modeling step
                 retval = self.modeling_tools.forward_model(shot, m0, return_parameters=['dWaveOp'])
                 dWaveOp0 = retval['dWaveOp']
@@ -311,7 +454,7 @@ class TemporalLeastSquares(ObjectiveFunctionBase):
                 result += self.modeling_tools.migrate_shot(shot, m0, d1, dWaveOp=dWaveOp0)
 
         elif hessian_mode == 'full':
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # Run the forward modeling step
                 dWaveOp0 = list()  # wave operator derivative wrt model for u_0
                 r0, adjoint_src = self._residual(shot, m0, dWaveOp=dWaveOp0, **kwargs)
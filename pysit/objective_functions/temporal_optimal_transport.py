@@ -4,7 +4,7 @@ import numpy as np
 
 from pysit.objective_functions.objective_function import ObjectiveFunctionBase
 from pysit.util.parallel import ParallelWrapShotNull
-from pysit.util.compute_tools import optimal_transport_fwi
+from pysit.util.compute_tools import optimal_transport_fwi_gather
 from pysit.modeling.temporal_modeling import TemporalModeling
 
 __all__ = ['TemporalOptimalTransport']
@@ -33,6 +33,23 @@ class TemporalOptimalTransport(ObjectiveFunctionBase):
         self.auto_expa = auto_expa
         self.FlagCnsdNeg = FlagCnsdNeg
 
+    def _exponents(self, dobs, mask):
+        """Exponents of the exponential transform of the traces of `dobs`.
+
+        With auto_expa, exp_a is divided by the maximum of each trace in
+        `mask` over log(5).  Traces outside the mask, and traces without a
+        positive value, e.g., silent ones, keep exp_a.
+
+        """
+        exp_a = np.array(np.broadcast_to(np.asarray(self.exp_a, dtype=np.float64), dobs.shape[1:]))
+        if self.auto_expa is True:
+            dmax = np.max(dobs[:, mask], axis=0) if np.any(mask) else np.zeros(0)
+            scale = np.ones_like(dmax)
+            positive = dmax > 0
+            scale[positive] = np.log(5.0) / dmax[positive]
+            exp_a[mask] *= scale
+        return exp_a
+
     def _residual(self, shot, m0, dWaveOp=None, wavefield=None):
         """Computes residual in the usual sense.
 
@@ -83,7 +100,7 @@ class TemporalOptimalTransport(ObjectiveFunctionBase):
         #     dpred = shot.receivers.time_window(self.solver.ts()) * retval['simdata']
 
         if self.filter_op is not None:
-            dobs = self.filter_op * shot.receivers.interpolate_data(self.solver.ts())
+            dobs = self._filter_observed_data(shot)
             dpred = self.filter_op * dpred
             # resid = self.filter_op * resid
             # adjoint_src = self.filter_op * resid
@@ -92,43 +109,30 @@ class TemporalOptimalTransport(ObjectiveFunctionBase):
             # dpred = retval['simdata']
             # adjoint_src = resid
 
-        shape_dobs = np.shape(dobs)
         if self.paddata is True:
             npad = int(2.0/self.solver.dt)
         else:
             npad = 0
-        shape_resid = [shape_dobs[0]+2*npad, shape_dobs[1]]
-        resid = np.zeros(shape_resid)
-        adjoint_src = np.zeros(shape_dobs)
-        
-        for i in range(0, shape_dobs[1]):
-            xrec = shot.receivers.receiver_list[i].position[0]
-            if xrec > m0.mesh.domain.x.rbound:
-                resid[:, i] = 0.0
-                adjoint_src[:, i] = 0.0
-                # ot_value = 0.0
-            else:
-                if self.auto_expa is True:
-                    exp_ai = np.log(5.0) / np.max(dobs[:, i])
-                else:
-                    exp_ai = 1.0
-
-                resid[:, i], adjoint_src[:, i], ot_value = optimal_transport_fwi(dobs[:, i], dpred[:, i], self.solver.dt, 
-                                                                                transform_mode=self.transform_mode, 
-                                                                                c_ratio=self.c_ratio, exp_a=self.exp_a * exp_ai,
-                                                                                env_p=self.env_p, npad=npad)
-                if self.FlagCnsdNeg is True:                                                                                
-                    if self.auto_expa is True:
-                        exp_ai = np.log(5.0) / np.max(-dobs[:, i])
-                    else:
-                        exp_ai = 1.0
-                    resid2, adjoint_src2, ot_value = optimal_transport_fwi(-dobs[:, i], -dpred[:, i], self.solver.dt, 
-                                                                                    transform_mode=self.transform_mode, 
-                                                                                    c_ratio=self.c_ratio, exp_a=self.exp_a * exp_ai,
-                                                                                    env_p=self.env_p, npad=npad)
-
-                    resid[:,i] += resid2
-                    adjoint_src[:, i] += -adjoint_src2
+
+        # Receivers beyond the right boundary of the domain are not used
+        xrec = np.array([r.position[0] for r in shot.receivers.receiver_list])
+        mask = xrec <= m0.mesh.domain.x.rbound
+
+        exp_a = self._exponents(dobs, mask)
+
+        resid, adjoint_src, ot_value = optimal_transport_fwi_gather(dobs, dpred, self.solver.dt,
+                                                                    transform_mode=self.transform_mode,
+                                                                    c_ratio=self.c_ratio, exp_a=exp_a,
+                                                                    env_p=self.env_p, npad=npad, mask=mask)
+        if self.FlagCnsdNeg is True:
+            exp_a = self._exponents(-dobs, mask)
+
+            resid2, adjoint_src2, ot_value = optimal_transport_fwi_gather(-dobs, -dpred, self.solver.dt,
+                                                                          transform_mode=self.transform_mode,
+                                                                          c_ratio=self.c_ratio, exp_a=exp_a,
+                                                                          env_p=self.env_p, npad=npad, mask=mask)
+            resid += resid2
+            adjoint_src -= adjoint_src2
 
         if self.filter_op is not None:
             adjoint_src = self.filter_op.__adj_mul__(adjoint_src)
@@ -146,7 +150,7 @@ class TemporalOptimalTransport(ObjectiveFunctionBase):
         """ Evaluate the least squares objective function over a list of shots."""
 
         r_norm2 = 0
-        for shot in shots:
+        for shot in self.parallel_wrap_shot.schedule(shots):
             r, adjoint_src = self._residual(shot, m0)
             r_norm2 += np.linalg.norm(r)**2
 
@@ -243,7 +247,7 @@ class TemporalOptimalTransport(ObjectiveFunctionBase):
         grad = m0.perturbation()
         r_norm2 = 0.0
         pseudo_h_diag = np.zeros(m0.asarray().shape)
-        for shot in shots:
+        for shot in self.parallel_wrap_shot.schedule(shots):
             if ('pseudo_hess_diag' in aux_info) and aux_info['pseudo_hess_diag'][0]:
                 g, r, h = self._gradient_helper(shot, m0, ignore_minus=True, ret_pseudo_hess_diag_comp = True, **kwargs)
                 pseudo_h_diag += h 
@@ -255,19 +259,14 @@ class TemporalOptimalTransport(ObjectiveFunctionBase):
 
         # sum-reduce and communicate result
         if self.parallel_wrap_shot.use_parallel:
-            # Allreduce wants an array, so we give it a 0-D array
-            new_r_norm2 = np.array(0.0)
-            self.parallel_wrap_shot.comm.Allreduce(np.array(r_norm2), new_r_norm2)
-            r_norm2 = new_r_norm2[()] # goofy way to access 0-D array element
-
-            ngrad = np.zeros_like(grad.asarray())
-            self.parallel_wrap_shot.comm.Allreduce(grad.asarray(), ngrad)
-            grad=m0.perturbation(data=ngrad)
-            
+            # the residual norm, the gradient and the pseudo hessian diagonal
+            # are summed in one message
             if ('pseudo_hess_diag' in aux_info) and aux_info['pseudo_hess_diag'][0]:
-                pseudo_h_diag_temp = np.zeros(pseudo_h_diag.shape)
-                self.parallel_wrap_shot.comm.Allreduce(pseudo_h_diag, pseudo_h_diag_temp)
-                pseudo_h_diag = pseudo_h_diag_temp 
+                r_norm2, ngrad, pseudo_h_diag = self.parallel_wrap_shot.reduce_sum(
+                    r_norm2, grad.asarray(), pseudo_h_diag, key='gradient')
+            else:
+                r_norm2, ngrad = self.parallel_wrap_shot.reduce_sum(r_norm2, grad.asarray(), key='gradient')
+            grad = m0.perturbation(data=ngrad)
 
         # account for the measure in the integral over time
         r_norm2 *= self.solver.dt
@@ -295,7 +294,7 @@ class TemporalOptimalTransport(ObjectiveFunctionBase):
         result = m0.perturbation()
 
         if hessian_mode in ['approximate', 'levenberg']:
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # Run the forward modeling step
                 retval = self.modeling_tools.forward_model(shot, m0, return_parameters=['dWaveOp'])
                 dWaveOp0 = retval['dWaveOp']
@@ -306,7 +305,7 @@ class TemporalOptimalTransport(ObjectiveFunctionBase):
                 result += self.modeling_tools.migrate_shot(shot, m0, d1, dWaveOp=dWaveOp0)
 
         elif hessian_mode == 'full':
-            for shot in shots:
+            for shot in self.parallel_wrap_shot.schedule(shots):
                 # Run the forward modeling step
                 dWaveOp0 = list() # wave operator derivative wrt model for u_0
                 r0, adjoint_src = self._residual(shot, m0, dWaveOp=dWaveOp0, **kwargs)
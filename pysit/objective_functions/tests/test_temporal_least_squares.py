@@ -0,0 +1,82 @@
+import copy
+
+import numpy as np
+
+from pysit import *
+from pysit.gallery import horizontal_reflector
+from pysit.modeling import QuantizedCodec
+
+
+class TestTemporalLeastSquares(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0.1, 1.0, pml, pml), (0.1, 0.8, pml, pml))
+        m = CartesianMesh(d, 46, 36)
+        C, C0, m, d = horizontal_reflector(m)
+
+        self.shots = equispaced_acquisition(m, RickerWavelet(10.0), sources=1, source_depth=0.2,
+                                            receivers='max', receiver_depth=0.2)
+        self.solver = ConstantDensityAcousticWave(m, spatial_accuracy_order=2, trange=(0.0, 0.6),
+                                                  kernel_implementation='cpp')
+        generate_seismic_data(self.shots, self.solver, self.solver.ModelParameters(m, {'C': C}))
+
+        self.m0 = self.solver.ModelParameters(m, {'C': C0})
+
+    def _direction(self, objective):
+        # Steepest descent, scaled to perturb the model by 5%
+        m1 = -1.0*objective.compute_gradient(self.shots, self.m0)
+        return m1, 0.05*np.linalg.norm(self.m0.linearize())/np.linalg.norm(m1.data)
+
+    def test_linearized_objective(self):
+        objective = TemporalLeastSquares(self.solver)
+        m1, alpha = self._direction(objective)
+
+        predict = objective.linearized_objective(self.shots, self.m0, m1)
+        f0 = objective.evaluate(self.shots, self.m0)
+        assert np.isclose(predict(0.0), f0, rtol=1e-12)
+
+        # The prediction is the Gauss-Newton expansion of the objective: its
+        # slope is that of the objective, its curvature misses the term of
+        # the second derivative of the data.
+        h = alpha/32
+        fp = objective.evaluate(self.shots, self.m0 + h*m1)
+        fm = objective.evaluate(self.shots, self.m0 + (-h)*m1)
+        assert np.isclose((predict(h) - predict(-h))/(2*h), (fp - fm)/(2*h), rtol=1e-3)
+        assert np.isclose(predict(h) - 2*f0 + predict(-h), fp - 2*f0 + fm, rtol=0.1)
+
+    def test_linearized_objective_cached_wavefields(self):
+        objective = TemporalLeastSquares(self.solver)
+        m1, alpha = self._direction(objective)
+        expected = objective.linearized_objective(self.shots, self.m0, m1)(alpha)
+
+        objective = TemporalLeastSquares(self.solver, cache_wavefields=True)
+        m1, alpha = self._direction(objective)
+        assert len(objective._linearization_cache[1]) == len(self.shots)
+        assert np.isclose(objective.linearized_objective(self.shots, self.m0, m1)(alpha), expected, rtol=1e-10)
+
+    def test_linearized_objective_new_shots(self):
+        # Shots which did not enter the gradient are never served from the
+        # cache, even with the same model
+        objective = TemporalLeastSquares(self.solver, cache_wavefields=True)
+        m1, alpha = self._direction(objective)
+
+        shots = copy.deepcopy(self.shots)
+        for shot in shots:
+            shot.receivers.data = 2.0*shot.receivers.data
+        expected = TemporalLeastSquares(self.solver).linearized_objective(shots, self.m0, m1)(alpha)
+        assert np.isclose(objective.linearized_objective(shots, self.m0, m1)(alpha), expected, rtol=1e-10)
+        assert not np.isclose(objective.linearized_objective(self.shots, self.m0, m1)(alpha), expected)
+
+    def test_compression_error(self):
+        reference = TemporalLeastSquares(self.solver).compute_gradient(self.shots, self.m0)
+
+        for compression, tol in ((None, 0.0), ('float32', 1e-6), (QuantizedCodec(1e-3), 1e-2)):
+            objective = TemporalLeastSquares(self.solver, compression=compression)
+            aux_info = {'gradient_relative_error': (True, None)}
+            grad = objective.compute_gradient(self.shots, self.m0, aux_info=aux_info)
+
+            error = np.linalg.norm(grad.data - reference.data)/np.linalg.norm(reference.data)
+            assert np.isclose(aux_info['gradient_relative_error'][1], error, rtol=1e-10, atol=1e-300)
+            assert error <= tol
+            assert objective.compression is compression
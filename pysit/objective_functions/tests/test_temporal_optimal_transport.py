@@ -0,0 +1,25 @@
+import numpy as np
+
+from pysit import *
+
+
+class TestTemporalOptimalTransport(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0.1, 1.0, pml, pml), (0.1, 0.8, pml, pml))
+        m = CartesianMesh(d, 46, 36)
+        self.solver = ConstantDensityAcousticWave(m, spatial_accuracy_order=2, trange=(0.0, 0.6),
+                                                  kernel_implementation='cpp')
+
+    def test_auto_exponents(self):
+        objective = TemporalOptimalTransport(self.solver, transform_mode='exponential', exp_a=2.0)
+        dobs = np.random.rand(50, 4)
+        dobs[:, 1] = 0.0
+        mask = np.array([True, True, True, False])
+
+        # Silent and unused traces keep exp_a
+        with np.errstate(divide='raise', invalid='raise'):
+            exp_a = objective._exponents(dobs, mask)
+        assert np.allclose(exp_a[[0, 2]], 2.0*np.log(5.0)/np.max(dobs[:, [0, 2]], axis=0))
+        assert np.all(exp_a[[1, 3]] == 2.0)
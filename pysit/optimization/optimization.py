@@ -100,6 +100,7 @@ class OptimizationBase(object):
               objective_frequency=0,
               run_time_frequency=0,
               alpha_frequency=1,
+              history_store=None,
               *args, **kwargs):
         """Resets the state of the optimization algorithm.
 
@@ -113,12 +114,16 @@ class OptimizationBase(object):
             Iteration frequency that the step vector and step length should be stored.
         objective_frequency : int
             Iteration frequency that the value of the objective function should be stored.
+        history_store : pysit.util.sample_store.SampleStore, optional
+            If given, histories are appended to this on-disk store instead of
+            being kept in memory.  Models and gradients are stored as arrays.
 
         """
 
         # if we are not appending reset things
         # if things have not been set yet, reset things
         if not append_mode or not hasattr(self, 'iteration'):
+            self.history_store = history_store
             self.base_model = self.solver.ModelParameters(self.solver.mesh)
             self.iteration = 0
 
@@ -185,7 +190,9 @@ class OptimizationBase(object):
 
         f = getattr(self, arg + "_frequency")
         # Only store the history if this index matches the frequency.
-        if f and (force or not np.mod(i,f)):
+        if f and (force or not np.mod(i,f)) and getattr(self, 'history_store', None) is not None:
+            self.history_store.append(arg, val, index=i)
+        elif f and (force or not np.mod(i,f)):
             loc = getattr(self, arg + "_history")
 #           if not loc.has_key(i):
 #               loc[i] = []
@@ -214,7 +221,14 @@ class OptimizationBase(object):
         """
         f = getattr(self, arg + "_frequency")
         # Only store the history if this index matches the frequency.
-        if f:
+        if f and getattr(self, 'history_store', None) is not None:
+            if arg not in self.history_store:
+                return []
+            # Later entries of the same iteration replace earlier ones
+            indices, data = self.history_store.read(arg)
+            hist = {int(k): v for k, v in zip(indices, data)}
+            return list(zip(*sorted(hist.items())))
+        elif f:
             hist = getattr(self, arg + "_history")
             return list(zip(*sorted(hist.items())))
         else:
@@ -473,8 +487,10 @@ class OptimizationBase(object):
             The gradient in model space.
         direction : Solver.ModelData
             The search direction in model space.
-        method : {'constant', 'linear', 'quadratic', 'linesearch'}, optional
-            The technique used to select alpha.
+        method : {'constant', 'linear', 'backtrack', 'Wolfe', 'born'}, optional
+            The technique used to select alpha.  'born' backtracks on the
+            objective predicted from linearized data, and evaluates the full
+            objective only to accept the step, see `_born_line_search`.
         alpha : float, optional
             The returned value for 'constant'.
 
@@ -497,6 +513,9 @@ class OptimizationBase(object):
         elif self.ls_method == 'Wolfe':
             return self._Wolfe_line_search(shots, gradient, direction, objective_arguments, **kwargs)
 
+        elif self.ls_method == 'born':
+            return self._born_line_search(shots, gradient, direction, objective_arguments, **kwargs)
+
         else:
             raise ValueError('Alpha selection method {0} invalid'.format(self.ls_method))
 
@@ -671,3 +690,95 @@ class OptimizationBase(object):
 
         return alpha
 
+    def _born_line_search(self, shots, gradient, direction, objective_arguments,
+                                        current_objective_value=None,
+                                        alpha0_kwargs={}, **kwargs):
+        """Backtracking line search in which trial steps are screened with the
+        objective predicted from linearized data.
+
+        The full objective is evaluated at the initial step.  If that step
+        is rejected, the objective function predicts its values along
+        `direction` from one linear forward model per shot, reusing the
+        residuals of the gradient, and the step is cut until the prediction
+        satisfies the sufficient decrease condition.  The full objective is
+        then only evaluated to accept the predicted step.  Objectives without
+        `linearized_objective` are searched as in `_backtrack_line_search`.
+
+        """
+
+        geom_fac = self.geom_fac
+        geom_fac_up = self.geom_fac_up
+        goldstein_c = self.goldstein_c
+
+        fp_comp = self.fp_comp
+        if current_objective_value is None:
+            fk = self.objective_function.evaluate(shots, self.base_model, **objective_arguments)
+        else:
+            fk = current_objective_value
+
+        myalpha0_kwargs = dict()
+        myalpha0_kwargs.update(alpha0_kwargs)
+        myalpha0_kwargs.update({'upscale_factor' : geom_fac_up})
+
+        alpha = self._compute_alpha0(current_objective_value, gradient, **myalpha0_kwargs)
+        slope = gradient.inner_product(direction)
+
+        def sufficient_decrease(f, alpha):
+            cmpval = fk + alpha * goldstein_c * slope
+            return ((f <= cmpval) or ((abs(f-cmpval)/abs(f)) <= fp_comp)), cmpval
+
+        stop = False
+        itercnt = 1
+        predcnt = 0
+        predict = None
+        self._print("  Starting: ", alpha, fk)
+        Alphas = []
+        Objs = []
+        while not stop:
+            # Cut the initial alpha until it is as large as can be and still satisfy the valid conditions for an updated model.
+            valid = False
+            alpha *= 2
+            while not valid:
+                alpha /= 2
+                model = self.base_model + alpha*direction
+                valid = model.validate()
+
+            if predict and predcnt <= self.max_linesearch_iterations:
+                fpred = predict(alpha)
+                accepted, cmpval = sufficient_decrease(fpred, alpha)
+                self._print("  Predicted {0}: a:{1}; {2} ?<= {3}".format(predcnt, alpha, fpred, cmpval))
+                if not accepted:
+                    predcnt += 1
+                    alpha = alpha * geom_fac
+                    continue
+
+            self.solver.model_parameters = model
+
+            fkp1 = self.objective_function.evaluate(shots, model, **objective_arguments)
+            Alphas.append(alpha)
+            Objs.append(fkp1)
+
+            accepted, cmpval = sufficient_decrease(fkp1, alpha)
+
+            self._print("  Pass {0}: a:{1}; {2} ?<= {3}".format(itercnt, alpha, fkp1, cmpval))
+
+            if accepted:
+                stop = True
+            elif itercnt > self.max_linesearch_iterations:
+                stop = True
+                alpha_idx = np.argmin(Objs)
+                alpha = Alphas[alpha_idx]
+                self._print('Too many passes ({0}), attempting to use current alpha ({1}).'.format(alpha_idx, alpha))
+            else:
+                itercnt += 1
+                alpha = alpha * geom_fac
+                if predict is None:
+                    try:
+                        predict = self.objective_function.linearized_objective(shots, self.base_model, direction,
+                                                                               **objective_arguments)
+                    except NotImplementedError:
+                        predict = False
+
+        self.prev_alpha = alpha
+
+        return alpha
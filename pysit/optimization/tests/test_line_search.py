@@ -0,0 +1,55 @@
+import numpy as np
+
+from pysit import *
+from pysit.gallery import horizontal_reflector
+
+
+class TestBornLineSearch(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0.1, 1.0, pml, pml), (0.1, 0.8, pml, pml))
+        m = CartesianMesh(d, 46, 36)
+        C, C0, m, d = horizontal_reflector(m)
+
+        self.shots = equispaced_acquisition(m, RickerWavelet(10.0), sources=1, source_depth=0.2,
+                                            receivers='max', receiver_depth=0.2)
+        self.solver = ConstantDensityAcousticWave(m, spatial_accuracy_order=2, trange=(0.0, 0.6),
+                                                  kernel_implementation='cpp')
+        generate_seismic_data(self.shots, self.solver, self.solver.ModelParameters(m, {'C': C}))
+
+        self.m0 = self.solver.ModelParameters(m, {'C': C0})
+
+    def test_decrease(self):
+        objective = TemporalLeastSquares(self.solver)
+        optimizer = GradientDescent(objective)
+        optimizer.reset(False)
+        optimizer.set_linesearch_configuration()
+        optimizer.initialize(self.m0)
+        optimizer.ls_method = 'born'
+
+        predictions = list()
+        linearized_objective = objective.linearized_objective
+        def spy(*args, **kwargs):
+            predict = linearized_objective(*args, **kwargs)
+            predictions.append(predict)
+            return predict
+        objective.linearized_objective = spy
+
+        f0 = objective.evaluate(self.shots, self.m0)
+        gradient = objective.compute_gradient(self.shots, self.m0)
+        direction = -1*gradient
+
+        # Start from a step which perturbs the model by half, so that it is
+        # rejected and the trial steps are screened by the prediction
+        alpha0 = 0.5*np.linalg.norm(self.m0.linearize())/np.linalg.norm(direction.data)
+        optimizer.prev_alpha = optimizer.geom_fac_up*alpha0
+        alpha = optimizer.select_alpha(self.shots, gradient, direction, {},
+                                       current_objective_value=f0,
+                                       alpha0_kwargs={'reset': False})
+
+        assert len(predictions) == 1
+        f = objective.evaluate(self.shots, self.m0 + alpha*direction)
+        assert 0 < alpha < alpha0
+        assert f <= f0 + optimizer.goldstein_c*alpha*gradient.inner_product(direction)
+        assert f < f0
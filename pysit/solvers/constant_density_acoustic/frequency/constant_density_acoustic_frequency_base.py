@@ -1,6 +1,8 @@
-import scipy.sparse.linalg as spspla
+import numpy as np
 
 from pysit.util import ConstructableDict
+from pysit.util.factorization import FactorizationCache
+from pysit.util.shifted_laplacian import build_shifted_laplacian_solver
 
 from ..constant_density_acoustic_base import *
 
@@ -31,14 +33,31 @@ class ConstantDensityAcousticFrequencyBase(ConstantDensityAcousticBase):
                            'boundary_conditions': None,
                            'precision': None}
 
-    def __init__(self, mesh, solver_style='sparseLU', **kwargs):
+    def __init__(self, mesh, solver_style='sparseLU', factorization_memory=None,
+                 iterative_options=None, **kwargs):
 
         # A dictionary that holds the helmholtz operators as a function of nu
         self.linear_operators = ConstructableDict(self._build_helmholtz_operator)
 
-        # A dictionary that holds the helmholtz solver as a function of nu
+        # A cache that holds the helmholtz solver as a function of nu.  Model
+        # updates clear the factorizations, but the fill-reducing orderings
+        # are kept for the refactorizations.  factorization_memory, in bytes,
+        # bounds the cached factorizations.
         solver_builder = self.__getattribute__(solver_style_map[solver_style])
-        self.solvers = ConstructableDict(solver_builder)
+        self.solvers = FactorizationCache(solver_builder, max_bytes=factorization_memory)
+
+        # Factorizations for the multiple right hand side petsc solves, as a
+        # function of (nu, petsc solver type)
+        self.petsc_solvers = FactorizationCache(self._build_petsc_solver, max_bytes=factorization_memory)
+
+        # Settings of the 'iterative' and 'amg' solver styles, see
+        # ShiftedLaplacianSolver, plus 'shift', the relative imaginary shift
+        # of the squared frequency in the preconditioned operator.  Previous
+        # solutions are kept as initial guesses across model updates and
+        # every Krylov solve is recorded in iterative_history.
+        self.iterative_options = dict() if iterative_options is None else dict(iterative_options)
+        self.iterative_guesses = dict()
+        self.iterative_history = list()
 
         ConstantDensityAcousticBase.__init__(self,
                                              mesh,
@@ -49,13 +68,18 @@ class ConstantDensityAcousticFrequencyBase(ConstantDensityAcousticBase):
 
         self.linear_operators.clear()
         self.solvers.clear()
+        self.petsc_solvers.clear()
         self._rebuild_operators()
 
     def _rebuild_operators(self):
         raise NotImplementedError("'_rebuild_operators' must be implemented in a subclass")
 
     def _build_sparseLU_solver(self, nu):
-        return spspla.factorized(self.linear_operators[nu])
+        return self.solvers.factorize(self.linear_operators[nu])
+
+    def _build_petsc_solver(self, key):
+        nu, petsc = key
+        return PetscWrapper().factorize(self.linear_operators[nu], petsc)
 
     def _build_petsc_mumps_solver(self, nu):
         dummy_wrapper = PetscWrapper()
@@ -70,10 +94,10 @@ class ConstantDensityAcousticFrequencyBase(ConstantDensityAcousticBase):
         return dummy_wrapper.factorize(self.linear_operators[nu], 'mkl_pardiso')
 
     def _build_amg_solver(self, nu):
-        raise NotImplementedError('AMG solver for helmholtz is not implemented.')
+        return build_shifted_laplacian_solver(self, nu, 'amg')
 
     def _build_iterative_solver(self, nu):
-        raise NotImplementedError('Iterative solver for helmholtz is not implemented.')
+        return build_shifted_laplacian_solver(self, nu, 'ilu')
 
     def solve(self, *args, **kwargs):
         """Framework for a single execution of the solver at a given frequency. """
@@ -7,7 +7,7 @@ from .constant_density_acoustic_time_scalar_base import *
 
 from pysit.util import Bunch
 from pysit.util import PositiveEvenIntegers
-from pysit.util.derivatives import build_derivative_matrix
+from pysit.util.derivatives import build_derivative_matrix, build_derivative_stencil
 from pysit.util.matrix_helpers import build_sigma, make_diag_mtx
 
 from pysit.util.solvers import inherit_dict
@@ -21,6 +21,7 @@ from ._constant_density_acoustic_time_scalar_cpp import (
     constant_density_acoustic_time_scalar_2D_6omp)
 
 __all__ = ['ConstantDensityAcousticTimeScalar_2D_numpy',
+           'ConstantDensityAcousticTimeScalar_2D_numpy_stencil',
            'ConstantDensityAcousticTimeScalar_2D_cpp',
            'ConstantDensityAcousticTimeScalar_2D_omp']
 
@@ -156,6 +157,93 @@ class ConstantDensityAcousticTimeScalar_2D_numpy(ConstantDensityAcousticTimeScal
         self.A_f = Stilde_inv
 
 
+@inherit_dict('supports', '_local_support_spec')
+class ConstantDensityAcousticTimeScalar_2D_numpy_stencil(ConstantDensityAcousticTimeScalar_2D):
+    """ NumPy kernel which applies the finite difference operators by array
+        slicing, without assembling sparse operators.  Model updates only
+        recompute pointwise coefficients. """
+
+    _local_support_spec = {'kernel_implementation': 'numpy_stencil',
+                           'spatial_accuracy_order': PositiveEvenIntegers,
+                           'precision': ['single', 'double']}
+
+    def _rebuild_operators(self):
+
+        ConstantDensityAcousticTimeScalar_2D._rebuild_operators(self)
+
+        oc = self.operator_components
+
+        built = oc.get('_stencil_components_built', False)
+
+        # build the static components
+        if not built:
+            oc.grid_shape = tuple(self.mesh.shape(include_bc=True, as_grid=True))
+            order = self.spatial_accuracy_order
+
+            oc.Dxx = build_derivative_stencil(self.mesh, 2, order, 'x', dtype=self.dtype)
+            oc.Dzz = build_derivative_stencil(self.mesh, 2, order, 'z', dtype=self.dtype)
+            oc.Dx = build_derivative_stencil(self.mesh, 1, order, 'x', dtype=self.dtype)
+            oc.Dz = build_derivative_stencil(self.mesh, 1, order, 'z', dtype=self.dtype)
+
+            sx = oc.sx.reshape(oc.grid_shape)
+            sz = oc.sz.reshape(oc.grid_shape)
+
+            # For each auxiliary field: its derivative, the coefficient of the
+            # derivative of u, and its damping
+            oc.aux_terms = [(oc.Dx, (sz-sx).astype(self.dtype), sx.astype(self.dtype)),
+                            (oc.Dz, (sx-sz).astype(self.dtype), sz.astype(self.dtype))]
+
+            oc.work = [np.zeros(oc.grid_shape, dtype=self.dtype) for i in range(2)]
+
+            oc._stencil_components_built = True
+
+        # Only the pointwise coefficients of the primary wavefield depend on
+        # the model
+        m = (self.model_parameters.C**-2).reshape(oc.grid_shape)
+        dt = self.dt
+        sxPsz = oc.sxPsz.reshape(oc.grid_shape)
+        sxsz = oc.sxsz.reshape(oc.grid_shape)
+
+        S = m/dt**2 + m*sxPsz/dt
+
+        oc.coeff_k = ((2*m/dt**2 + m*sxPsz/dt - m*sxsz) / S).astype(self.dtype)
+        oc.coeff_km1 = (-(m/dt**2) / S).astype(self.dtype)
+        oc.coeff_f = (1.0 / S).astype(self.dtype)
+
+    def time_step(self, solver_data, rhs_k, rhs_kp1):
+
+        oc = self.operator_components
+        sh = (3,) + oc.grid_shape
+        dt = self.dt
+
+        u_km1 = solver_data.km1.data.reshape(sh)[0]
+        u_k, Phix_k, Phiz_k = solver_data.k.data.reshape(sh)
+        u_kp1, Phix_kp1, Phiz_kp1 = solver_data.kp1.data.reshape(sh)
+        acc, work = oc.work
+
+        # Laplacian and PML terms of the primary wavefield
+        oc.Dxx.apply(u_k, out=acc)
+        acc += oc.Dzz.apply(u_k, out=work)
+        acc += oc.Dx.apply(Phix_k, out=work)
+        acc += oc.Dz.apply(Phiz_k, out=work)
+        acc += rhs_k.reshape(oc.grid_shape)
+        acc *= oc.coeff_f
+
+        # Phi_kp1 = Phi_k + dt (c_u D u_k - sigma Phi_k)
+        for (D, c_u, sigma), Phi_k, Phi_kp1 in zip(oc.aux_terms, (Phix_k, Phiz_k), (Phix_kp1, Phiz_kp1)):
+            D.apply(u_k, out=work)
+            work *= c_u
+            np.multiply(sigma, Phi_k, out=Phi_kp1)
+            work -= Phi_kp1
+            work *= dt
+            np.add(Phi_k, work, out=Phi_kp1)
+
+        np.multiply(oc.coeff_k, u_k, out=u_kp1)
+        np.multiply(oc.coeff_km1, u_km1, out=work)
+        u_kp1 += work
+        u_kp1 += acc
+
+
 @inherit_dict('supports', '_local_support_spec')
 class ConstantDensityAcousticTimeScalar_2D_cpp(ConstantDensityAcousticTimeScalar_2D):
 
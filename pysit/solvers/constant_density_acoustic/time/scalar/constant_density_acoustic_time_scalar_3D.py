@@ -7,7 +7,7 @@ from .constant_density_acoustic_time_scalar_base import *
 
 from pysit.util import Bunch
 from pysit.util import PositiveEvenIntegers
-from pysit.util.derivatives import build_derivative_matrix
+from pysit.util.derivatives import build_derivative_matrix, build_derivative_stencil
 from pysit.util.matrix_helpers import build_sigma, make_diag_mtx
 
 from pysit.util.solvers import inherit_dict
@@ -21,6 +21,7 @@ from ._constant_density_acoustic_time_scalar_cpp import (
     constant_density_acoustic_time_scalar_3D_6omp)
 
 __all__ = ['ConstantDensityAcousticTimeScalar_3D_numpy',
+           'ConstantDensityAcousticTimeScalar_3D_numpy_stencil',
            'ConstantDensityAcousticTimeScalar_3D_cpp',
            'ConstantDensityAcousticTimeScalar_3D_omp']
 
@@ -186,6 +187,111 @@ class ConstantDensityAcousticTimeScalar_3D_numpy(ConstantDensityAcousticTimeScal
         self.A_f = Stilde_inv
 
 
+@inherit_dict('supports', '_local_support_spec')
+class ConstantDensityAcousticTimeScalar_3D_numpy_stencil(ConstantDensityAcousticTimeScalar_3D):
+    """ NumPy kernel which applies the finite difference operators by array
+        slicing, without assembling sparse operators.  Model updates only
+        recompute pointwise coefficients. """
+
+    _local_support_spec = {'kernel_implementation': 'numpy_stencil',
+                           'spatial_accuracy_order': PositiveEvenIntegers,
+                           'precision': ['single', 'double']}
+
+    def _rebuild_operators(self):
+
+        ConstantDensityAcousticTimeScalar_3D._rebuild_operators(self)
+
+        oc = self.operator_components
+
+        built = oc.get('_stencil_components_built', False)
+
+        # build the static components
+        if not built:
+            oc.grid_shape = tuple(self.mesh.shape(include_bc=True, as_grid=True))
+            order = self.spatial_accuracy_order
+
+            oc.Dxx = build_derivative_stencil(self.mesh, 2, order, 'x', dtype=self.dtype)
+            oc.Dyy = build_derivative_stencil(self.mesh, 2, order, 'y', dtype=self.dtype)
+            oc.Dzz = build_derivative_stencil(self.mesh, 2, order, 'z', dtype=self.dtype)
+            oc.Dx = build_derivative_stencil(self.mesh, 1, order, 'x', dtype=self.dtype)
+            oc.Dy = build_derivative_stencil(self.mesh, 1, order, 'y', dtype=self.dtype)
+            oc.Dz = build_derivative_stencil(self.mesh, 1, order, 'z', dtype=self.dtype)
+
+            sx = oc.sx.reshape(oc.grid_shape)
+            sy = oc.sy.reshape(oc.grid_shape)
+            sz = oc.sz.reshape(oc.grid_shape)
+
+            # For each auxiliary field: its derivative, the coefficients of
+            # the derivatives of u and psi, and its damping
+            oc.aux_terms = [(oc.Dx, (sy+sz-sx).astype(self.dtype), (sy*sz).astype(self.dtype), sx.astype(self.dtype)),
+                            (oc.Dy, (sx+sz-sy).astype(self.dtype), (sz*sx).astype(self.dtype), sy.astype(self.dtype)),
+                            (oc.Dz, (sx+sy-sz).astype(self.dtype), (sx*sy).astype(self.dtype), sz.astype(self.dtype))]
+
+            oc.work = [np.zeros(oc.grid_shape, dtype=self.dtype) for i in range(3)]
+
+            oc._stencil_components_built = True
+
+        # Only the pointwise coefficients of the primary wavefield depend on
+        # the model
+        m = (self.model_parameters.C**-2).reshape(oc.grid_shape)
+        dt = self.dt
+        sxPsyPsz = oc.sxPsyPsz.reshape(oc.grid_shape)
+        sxsyPsxszPsysz = oc.sxsyPsxszPsysz.reshape(oc.grid_shape)
+        sxsysz = oc.sxsysz.reshape(oc.grid_shape)
+
+        S = m/dt**2 + m*sxPsyPsz/dt
+
+        oc.coeff_k = ((2*m/dt**2 + m*sxPsyPsz/dt - m*sxsyPsxszPsysz) / S).astype(self.dtype)
+        oc.coeff_km1 = (-(m/dt**2) / S).astype(self.dtype)
+        oc.coeff_f = (1.0 / S).astype(self.dtype)
+        oc.coeff_psi = (-m*sxsysz).astype(self.dtype)
+
+    def time_step(self, solver_data, rhs_k, rhs_kp1):
+
+        oc = self.operator_components
+        sh = (5,) + oc.grid_shape
+        dt = self.dt
+
+        u_km1 = solver_data.km1.data.reshape(sh)[0]
+        u_k, psi_k = solver_data.k.data.reshape(sh)[:2]
+        u_kp1, psi_kp1 = solver_data.kp1.data.reshape(sh)[:2]
+        Phis_k = solver_data.k.data.reshape(sh)[2:]
+        Phis_kp1 = solver_data.kp1.data.reshape(sh)[2:]
+        acc, work, Du = oc.work
+
+        # Laplacian and PML terms of the primary wavefield
+        oc.Dxx.apply(u_k, out=acc)
+        acc += oc.Dyy.apply(u_k, out=work)
+        acc += oc.Dzz.apply(u_k, out=work)
+        np.multiply(oc.coeff_psi, psi_k, out=work)
+        acc += work
+        for (D, c_u, c_psi, sigma), Phi_k in zip(oc.aux_terms, Phis_k):
+            acc += D.apply(Phi_k, out=work)
+        acc += rhs_k.reshape(oc.grid_shape)
+        acc *= oc.coeff_f
+
+        # Phi_kp1 = Phi_k + dt (c_u D u_k + c_psi D psi_k - sigma Phi_k)
+        for (D, c_u, c_psi, sigma), Phi_k, Phi_kp1 in zip(oc.aux_terms, Phis_k, Phis_kp1):
+            D.apply(u_k, out=Du)
+            Du *= c_u
+            D.apply(psi_k, out=work)
+            work *= c_psi
+            Du += work
+            np.multiply(sigma, Phi_k, out=work)
+            Du -= work
+            Du *= dt
+            np.add(Phi_k, Du, out=Phi_kp1)
+
+        # psi_kp1 = psi_k + dt u_k
+        np.multiply(u_k, dt, out=psi_kp1)
+        psi_kp1 += psi_k
+
+        np.multiply(oc.coeff_k, u_k, out=u_kp1)
+        np.multiply(oc.coeff_km1, u_km1, out=work)
+        u_kp1 += work
+        u_kp1 += acc
+
+
 @inherit_dict('supports', '_local_support_spec')
 class ConstantDensityAcousticTimeScalar_3D_cpp(ConstantDensityAcousticTimeScalar_3D):
 
@@ -1,3 +1,14 @@
+import numpy as np
+
+try:
+    from scipy.sparse._sparsetools import csr_matvec, csr_matvecs
+except ImportError:
+    try:
+        from scipy.sparse.sparsetools import csr_matvec, csr_matvecs
+    except ImportError:
+        csr_matvec = None
+        csr_matvecs = None
+
 from ..constant_density_acoustic_time_base import *
 from pysit.solvers.solver_data import SolverDataTimeBase
 
@@ -21,7 +32,8 @@ class _ConstantDensityAcousticTimeScalar_SolverData(SolverDataTimeBase):
 
     def advance(self):
 
-        self.us[-1] *= 0
+        # Every time_step of this solver family overwrites all of kp1, so the
+        # oldest time level is recycled without zeroing it first.
         self.us.insert(0, self.us.pop(-1))
 
     @property
@@ -49,6 +61,53 @@ class _ConstantDensityAcousticTimeScalar_SolverData(SolverDataTimeBase):
         self.us[2] = arg
 
 
+class _ConstantDensityAcousticTimeScalar_BatchedSolverData(object):
+    """Solver state for several shots propagated through the same model.
+
+    Each time level is a C-ordered array of shape (n, nshots), where n is the
+    length of a WavefieldVector, so that column j holds the state of shot j
+    and row i holds unknown i of every shot.
+
+    """
+
+    def __init__(self, solver, temporal_accuracy_order, nshots, **kwargs):
+
+        self.solver = solver
+
+        self.temporal_accuracy_order = temporal_accuracy_order
+
+        self.nshots = nshots
+
+        n = solver.WavefieldVector(solver.mesh, dtype=solver.dtype).data.shape[0]
+
+        # self.us[0] is kp1, [1] is k or current, [2] is km1
+        self.us = [np.zeros((n, nshots), dtype=solver.dtype) for x in range(3)]
+
+    def advance(self):
+
+        # time_step_batch overwrites all of kp1, as time_step does.
+        self.us.insert(0, self.us.pop(-1))
+
+    def primary_wavefield(self, level):
+        """Returns a view of the padded primary wavefield of every shot, an
+        array of shape (dof, nshots), at time level `level` ('kp1', 'k' or
+        'km1')."""
+        dof = self.solver.mesh.dof(include_bc=True)
+        return getattr(self, level)[:dof]
+
+    @property
+    def kp1(self):
+        return self.us[0]
+
+    @property
+    def k(self):
+        return self.us[1]
+
+    @property
+    def km1(self):
+        return self.us[2]
+
+
 @inherit_dict('supports', '_local_support_spec')
 class ConstantDensityAcousticTimeScalarBase(ConstantDensityAcousticTimeBase):
 
@@ -62,21 +121,100 @@ class ConstantDensityAcousticTimeScalarBase(ConstantDensityAcousticTimeBase):
         self.A_k   = None
         self.A_f   = None
 
+        # CSR copies of the stepping operators, keyed by the A_k they were
+        # built from.
+        self._step_operators = None
+
         self.temporal_accuracy_order = 2
 
         ConstantDensityAcousticTimeBase.__init__(self, mesh, **kwargs)
 
+    def _get_step_operators(self):
+        if self._step_operators is None or self._step_operators[0] is not self.A_k:
+            # The source only enters the primary wavefield, so only the
+            # leading dof columns of A_f are ever used.
+            dof = self.mesh.dof(include_bc=True)
+            self._step_operators = (self.A_k,
+                                    self.A_k.tocsr(),
+                                    self.A_km1.tocsr(),
+                                    self.A_f.tocsr()[:, :dof].tocsr())
+        return self._step_operators[1:]
+
     def time_step(self, solver_data, rhs_k, rhs_kp1):
+        u_km1 = solver_data.km1.data
+        u_k   = solver_data.k.data
+        u_kp1 = solver_data.kp1.data
+
+        A_k, A_km1, A_f = self._get_step_operators()
+
+        rhs_k = rhs_k.reshape(-1, 1)
+
+        if (csr_matvec is not None and
+                all(A.dtype == u_kp1.dtype for A in (A_k, A_km1, A_f)) and
+                u_k.dtype == u_km1.dtype == u_kp1.dtype == rhs_k.dtype):
+            # Accumulate the three sparse products directly into u_kp1,
+            # without temporaries.
+            y = u_kp1.ravel()
+            y.fill(0)
+            for A, x in ((A_k, u_k), (A_km1, u_km1), (A_f, rhs_k)):
+                csr_matvec(A.shape[0], A.shape[1], A.indptr, A.indices, A.data,
+                           x.ravel(), y)
+        else:
+            u_kp1[:] = A_k*u_k
+            u_kp1 += A_km1*u_km1
+            u_kp1 += A_f*rhs_k
+
+    @property
+    def supports_batched_time_step(self):
+        """True if `time_step_batch` is available, which requires the
+        assembled stepping operators of the numpy kernels."""
+        return self.supports.get('kernel_implementation') == 'numpy'
+
+    def time_step_batch(self, solver_data, rhs_k, rhs_kp1):
+        """Advances every shot of a batched solver data by one time step.
+
+        All shots share `A_k`, `A_km1` and `A_f`, so the step is three sparse
+        matrix times dense matrix products over the trailing shot axis rather
+        than one set of sparse matrix-vector products per shot.
+
+        Parameters
+        ----------
+        solver_data : BatchedSolverData
+        rhs_k, rhs_kp1 : ndarray
+            Padded right hand sides of shape (dof, nshots).
+
+        """
+
+        if not self.supports_batched_time_step:
+            raise NotImplementedError('Batched time stepping requires the numpy kernel.')
+
         u_km1 = solver_data.km1
         u_k   = solver_data.k
         u_kp1 = solver_data.kp1
 
-        f_bar = self.WavefieldVector(self.mesh, dtype=self.dtype)
-        f_bar.u += rhs_k
-
-        u_kp1 += self.A_k*u_k.data + self.A_km1*u_km1.data + self.A_f*f_bar.data
+        A_k, A_km1, A_f = self._get_step_operators()
+
+        if (csr_matvecs is not None and
+                all(A.dtype == u_kp1.dtype for A in (A_k, A_km1, A_f)) and
+                u_k.dtype == u_km1.dtype == u_kp1.dtype == rhs_k.dtype and
+                rhs_k.flags.c_contiguous):
+            nshots = u_kp1.shape[1]
+            y = u_kp1.ravel()
+            y.fill(0)
+            for A, x in ((A_k, u_k), (A_km1, u_km1), (A_f, rhs_k)):
+                csr_matvecs(A.shape[0], A.shape[1], nshots, A.indptr, A.indices,
+                            A.data, x.ravel(), y)
+        else:
+            u_kp1[:] = A_k.dot(u_k)
+            u_kp1 += A_km1.dot(u_km1)
+            u_kp1 += A_f.dot(rhs_k)
 
     _SolverData = _ConstantDensityAcousticTimeScalar_SolverData
 
     def SolverData(self, *args, **kwargs):
         return self._SolverData(self, self.temporal_accuracy_order, **kwargs)
+
+    _BatchedSolverData = _ConstantDensityAcousticTimeScalar_BatchedSolverData
+
+    def BatchedSolverData(self, nshots, **kwargs):
+        return self._BatchedSolverData(self, self.temporal_accuracy_order, nshots, **kwargs)
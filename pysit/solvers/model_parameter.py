@@ -945,35 +945,27 @@ class ExtendedModelingParameter2D(object):
         self.compute_padding_index(mesh, n_h_extend)
 
     def compute_padding_index(self, mesh, n_h_extend):
-        mesh_ih = copy.deepcopy(mesh)
+        # Flat indices, in the padded grid, of the subsurface region seen by
+        # u and v at the first offset; the other offsets are shifted by
+        # multiples of skip_index.
         sh_grid = mesh.shape(include_bc=True, as_grid=True)
-        dof_sub = self.dof_sub
-        sh_sub = self.sh_sub
-        index = np.array(range(0, np.prod(sh_grid)))
-        index = np.reshape(index,(np.prod(sh_grid), 1))
-        mesh._shapes[(False, False)] = (dof_sub, 1)
-        mesh._shapes[(False, True)] = sh_sub
-        
-        for i in range(1):
-            n_bcx_extend_u_ih = self.n_bcx_extend_u[i, :]
-            n_bcx_extend_v_ih = self.n_bcx_extend_v[i, :]
-            mesh.parameters[0].lbc._n = n_bcx_extend_u_ih[0]
-            mesh.parameters[0].rbc._n = n_bcx_extend_u_ih[1]
-        
-            self.padding_index_u.append(mesh.unpad_array(index))
-        
-            mesh.parameters[0].lbc._n = n_bcx_extend_v_ih[0]
-            mesh.parameters[0].rbc._n = n_bcx_extend_v_ih[1]
-        
-            self.padding_index_v.append(mesh.unpad_array(index))
-
-        mesh._shapes[(False, False)] = mesh_ih._shapes[(False, False)]
-        mesh._shapes[(False, True)] = mesh_ih._shapes[(False, True)]
-        mesh.parameters[0].lbc._n = mesh_ih.parameters[0]['lbc'].n
-        mesh.parameters[0].rbc._n = mesh_ih.parameters[0]['rbc'].n
-    
-    
-    
+        index = np.arange(np.prod(sh_grid)).reshape(sh_grid)
+        nbc_z = mesh.parameters[1].lbc.n
+        nx_sub, nz = self.sh_sub
+
+        for n_bcx, padding_index in ((self.n_bcx_extend_u[0, :], self.padding_index_u),
+                                     (self.n_bcx_extend_v[0, :], self.padding_index_v)):
+            sub = index[n_bcx[0]:n_bcx[0]+nx_sub, nbc_z:nbc_z+nz]
+            padding_index.append(sub.reshape((-1, 1)))
+
+    def offset_padding_index(self, mesh):
+        """ Returns the flat indices, in the padded grid of `mesh`, of the
+            subsurface regions seen by u and by v, as two arrays of shape
+            (dof_sub, nh) whose column ih is offset ih. """
+        nzp = mesh.shape(include_bc=True, as_grid=True)[1]
+        index_u = self.padding_index_u[0] + nzp*(self.n_bcx_extend_u[:, 0] - self.n_bcx_extend_u[0, 0])
+        index_v = self.padding_index_v[0] + nzp*(self.n_bcx_extend_v[:, 0] - self.n_bcx_extend_v[0, 0])
+        return index_u, index_v
 
     def setter(self, value):
         self.data = np.reshape(value, self.sh_data)
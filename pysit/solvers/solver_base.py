@@ -114,6 +114,10 @@ class SolverBase(object):
             else:
                 if self._mp is None or np.linalg.norm(self._mp.without_padding().data - mp.data) != 0.0:
                     self._mp = mp.with_padding(padding_mode='edge')
+                else:
+                    # Setting the current model again, e.g., once per shot,
+                    # keeps the operators and factorizations built for it.
+                    return
 
             self._process_mp_reset()
 
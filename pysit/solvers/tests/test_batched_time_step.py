@@ -0,0 +1,52 @@
+import numpy as np
+
+from pysit.core import PML, RectangularDomain, CartesianMesh
+
+from pysit.solvers import ConstantDensityAcousticWave
+
+
+class TestBatchedTimeStep(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+
+        x_config = (0.0, 1.0, pml, pml)
+        z_config = (0.0, 0.8, pml, pml)
+
+        d = RectangularDomain(x_config, z_config)
+        self.m = CartesianMesh(d, 30, 24)
+
+        self.solver = ConstantDensityAcousticWave(self.m,
+                                                  spatial_accuracy_order=4,
+                                                  trange=(0.0, 0.1),
+                                                  kernel_implementation='numpy')
+        C = 1.0 + 0.1*np.random.rand(*self.m.shape())
+        self.solver.model_parameters = self.solver.ModelParameters(self.m, {'C': C})
+
+    def test_matches_time_step(self):
+        solver = self.solver
+        nshots = 3
+
+        batch = solver.BatchedSolverData(nshots)
+        singles = [solver.SolverData() for j in range(nshots)]
+
+        sh = self.m.shape(include_bc=True)
+        for step in range(2):
+            rhs_k = np.random.rand(sh[0], nshots)
+            rhs_kp1 = np.random.rand(sh[0], nshots)
+            for j in range(nshots):
+                # Seed every time level, so all three operators matter.
+                if step == 0:
+                    for level in range(3):
+                        singles[j].us[level].data[:] = np.random.rand(*singles[j].us[level].data.shape)
+                        batch.us[level][:, j] = singles[j].us[level].data[:, 0]
+                solver.time_step(singles[j], rhs_k[:, j:j+1].copy(), rhs_kp1[:, j:j+1].copy())
+            solver.time_step_batch(batch, rhs_k, rhs_kp1)
+
+            for j in range(nshots):
+                assert np.allclose(batch.kp1[:, j], singles[j].kp1.data[:, 0], rtol=1e-12, atol=0)
+                singles[j].advance()
+            batch.advance()
+
+        assert batch.primary_wavefield('k').shape == (sh[0], nshots)
+        assert solver.supports_batched_time_step
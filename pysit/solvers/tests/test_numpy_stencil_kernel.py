@@ -0,0 +1,101 @@
+import numpy as np
+
+from pysit.core import PML, Dirichlet, RectangularDomain, CartesianMesh
+from pysit.core import PointSource, PointReceiver, RickerWavelet, Shot
+from pysit.modeling import TemporalModeling
+
+from pysit.solvers import ConstantDensityAcousticWave
+
+
+class TestNumpyStencilKernel(object):
+
+    def setup(self):
+        pml = PML(0.1, 100)
+        dirichlet = Dirichlet()
+
+        x_config = (0.0, 1.0, pml, dirichlet)
+        y_config = (0.0, 0.7, pml, pml)
+        z_config = (0.0, 0.6, pml, pml)
+
+        self.meshes = [CartesianMesh(RectangularDomain((0.0, 0.6, pml, dirichlet)), 41),
+                       CartesianMesh(RectangularDomain(x_config, z_config), 31, 21),
+                       CartesianMesh(RectangularDomain(x_config, y_config, z_config), 15, 13, 11)]
+
+        self.rng = np.random.RandomState(0)
+
+    def _solvers(self, mesh, order, kernels):
+        C = 1.0 + 0.2*self.rng.rand(*mesh.shape())
+        solvers = list()
+        for kernel in kernels:
+            solver = ConstantDensityAcousticWave(mesh,
+                                                 spatial_accuracy_order=order,
+                                                 trange=(0.0, 0.1),
+                                                 kernel_implementation=kernel)
+            solver.model_parameters = solver.ModelParameters(mesh, {'C': C})
+            solvers.append(solver)
+        return solvers
+
+    def test_matches_numpy_time_step(self):
+        for mesh in self.meshes:
+            for order in (2, 6):
+                solvers = self._solvers(mesh, order, ('numpy', 'numpy_stencil'))
+                states = [solver.SolverData() for solver in solvers]
+
+                # Seed every time level, auxiliary fields included
+                for level in range(3):
+                    x = self.rng.rand(*states[0].us[level].data.shape)
+                    for sd in states:
+                        sd.us[level].data[:] = x
+
+                for step in range(3):
+                    rhs = self.rng.rand(mesh.dof(include_bc=True), 1)
+                    for solver, sd in zip(solvers, states):
+                        solver.time_step(sd, rhs, rhs)
+                    expected, result = states[0].kp1.data, states[1].kp1.data
+                    assert np.allclose(result, expected, rtol=0, atol=1e-12*np.abs(expected).max())
+                    for sd in states:
+                        sd.advance()
+
+    def test_model_update(self):
+        mesh = self.meshes[1]
+        solver, = self._solvers(mesh, 4, ('numpy_stencil',))
+        oc = solver.operator_components
+        Dxx = oc.Dxx
+
+        C = 1.5 + 0.2*self.rng.rand(*mesh.shape())
+        solver.model_parameters = solver.ModelParameters(mesh, {'C': C})
+
+        # Only the pointwise coefficients are rebuilt; away from the PML they
+        # are those of the undamped leap-frog scheme
+        assert oc.Dxx is Dxx
+        m = solver.model_parameters.C.reshape(oc.grid_shape)**-2
+        interior = oc.sxPsz.reshape(oc.grid_shape) == 0
+        assert np.allclose(oc.coeff_km1[interior], -1.0)
+        assert np.allclose(oc.coeff_f[interior], solver.dt**2/m[interior])
+
+    def test_matches_compiled_kernel(self):
+        # The compiled kernels discretize the PML slightly differently, so the
+        # stencil kernel must be as close to them as the numpy kernel is.
+        mesh = CartesianMesh(RectangularDomain((0.0, 1.0, PML(0.1, 100), PML(0.1, 100)),
+                                               (0.0, 0.8, PML(0.1, 100), PML(0.1, 100))), 46, 36)
+        C = np.ones(mesh.shape())
+        C[C.shape[0]//2:] = 1.5
+
+        source = PointSource(mesh, (0.5, 0.1), RickerWavelet(10.0))
+        receiver = PointReceiver(mesh, (0.7, 0.1))
+
+        data = dict()
+        for kernel in ('numpy', 'numpy_stencil', 'cpp'):
+            solver = ConstantDensityAcousticWave(mesh,
+                                                 spatial_accuracy_order=4,
+                                                 trange=(0.0, 0.5),
+                                                 kernel_implementation=kernel)
+            shot = Shot(source, receiver)
+            tools = TemporalModeling(solver)
+            retval = tools.forward_model(shot, solver.ModelParameters(mesh, {'C': C}),
+                                         return_parameters=['simdata'])
+            data[kernel] = retval['simdata']
+
+        norm = np.linalg.norm(data['numpy'])
+        assert np.linalg.norm(data['numpy_stencil'] - data['numpy']) < 1e-10*norm
+        assert np.linalg.norm(data['numpy_stencil'] - data['cpp']) < 5e-2*norm
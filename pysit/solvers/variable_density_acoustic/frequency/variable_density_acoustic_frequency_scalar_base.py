@@ -39,6 +39,33 @@ class VariableDensityAcousticFrequencyScalarBase(VariableDensityAcousticFrequenc
 
         solver_data.k.data = u
 
+    def solve_block(self, rhs_block, nu, petsc=None):
+        """Solves for several right hand sides at a given frequency with a
+        single factorization.
+
+        Parameters
+        ----------
+        rhs_block : ndarray
+            Right hand sides, one WavefieldVector's data per column.
+        nu : float
+            Frequency.
+        petsc : str, optional
+            Petsc direct solver, e.g., 'mumps', to use instead of the
+            solver's own factorization.
+
+        Returns
+        -------
+        ndarray
+            Solutions, one per column of `rhs_block`, with as many rows as
+            the Helmholtz operator, which for compact operators only holds
+            the primary wavefield.
+
+        """
+        ndof = self.linear_operators[nu].shape[1]
+        if petsc is None:
+            return self.solvers[nu](rhs_block[0:ndof])
+        return self.petsc_solvers[(nu, petsc)](rhs_block[0:ndof])
+
     def solve_petsc(self, solver_data_list, rhs_list, nu, *args, **kwargs ):
         #try catch for the petsc4py use in multiple rhs solve
         try:
@@ -57,24 +84,20 @@ class VariableDensityAcousticFrequencyScalarBase(VariableDensityAcousticFrequenc
                 raise ValueError('solver and right hand side list must be the same size')
             else:
                 #Building the Helmholtz operator for petsc
-                H = self._build_helmholtz_operator(nu)
+                H = self.linear_operators[nu]
                 ndof = H.shape[1]
                 nshot = len(rhs_list)
 
-                # creating the B rhs Matrix            
-                B = PETSc.Mat().createDense([ndof, nshot])
-                B.setUp()
+                # stacking the rhs as the columns of a column major block, which
+                # the wrapper hands to petsc without copying
+                B = np.empty((ndof, nshot), dtype=np.result_type(*rhs_list), order='F')
                 for i in range(nshot):
-                    B.setValues(list(range(0, ndof)), [i], rhs_list[i])
-
-                B.assemblyBegin()
-                B.assemblyEnd()
+                    B[:, i] = np.reshape(rhs_list[i], -1)[0:ndof]
 
-                # call the wrapper to solve the system
-                wrapper = PetscWrapper()
+                # solve with the factorization, which is reused until the model changes
                 try:
-                    linear_solver = wrapper.factorize(H, petsc, PETSc.COMM_WORLD)
-                    Uhat = linear_solver(B.getDenseArray())
+                    linear_solver = self.petsc_solvers[(nu, petsc)]
+                    Uhat = linear_solver(B)
                 except:
                     raise SyntaxError('petsc = '+str(petsc)+' is not a correct solver you can only use \'superlu_dist\', \'mumps\' or \'mkl_pardiso\' ')
                 
@@ -99,7 +122,7 @@ class VariableDensityAcousticFrequencyScalarBase(VariableDensityAcousticFrequenc
             raise ImportError('petsc4py is not installed, please install it and try again')
 
         #Building the Helmholtz operator for petsc
-        H = self._build_helmholtz_operator(frequency)
+        H = self.linear_operators[frequency]
         
         ndof = H.shape[1]
         nshot = len(rhs_list)
@@ -110,20 +133,16 @@ class VariableDensityAcousticFrequencyScalarBase(VariableDensityAcousticFrequenc
             nwfield = len(self.WavefieldVector.aux_names) + 1
             usize = ndof/nwfield
 
-        # creating the B rhs Matrix
-        B = PETSc.Mat().createDense([ndof, nshot])
-        B.setUp()
+        # stacking the rhs as the columns of a column major block, which
+        # the wrapper hands to petsc without copying
+        B = np.empty((ndof, nshot), dtype=np.result_type(*rhs_list), order='F')
         for i in range(nshot):
-            B.setValues(list(range(0, ndof)), [i], rhs_list[i])
-
-        B.assemblyBegin()
-        B.assemblyEnd()
+            B[:, i] = np.reshape(rhs_list[i], -1)[0:ndof]
 
-        # call the wrapper to solve the system
-        wrapper = PetscWrapper()
+        # solve with the factorization, which is reused until the model changes
         try:
-            linear_solver = wrapper.factorize(H, petsc, PETSc.COMM_WORLD)
-            Uhat = linear_solver(B.getDenseArray())
+            linear_solver = self.petsc_solvers[(frequency, petsc)]
+            Uhat = linear_solver(B)
         except:
             raise SyntaxError('petsc = '+str(petsc)+' is not a correct solver you can only use \'superlu_dist\', \'mumps\' or \'mkl_pardiso\' ')               
         
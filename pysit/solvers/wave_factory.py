@@ -4,12 +4,15 @@ from .constant_density_acoustic import(ConstantDensityAcousticTimeODE_1D,
                                        ConstantDensityAcousticTimeODE_2D,
                                        ConstantDensityAcousticTimeODE_3D,
                                        ConstantDensityAcousticTimeScalar_1D_numpy,
+                                       ConstantDensityAcousticTimeScalar_1D_numpy_stencil,
                                        ConstantDensityAcousticTimeScalar_1D_cpp,
                                        ConstantDensityAcousticTimeScalar_1D_omp,
                                        ConstantDensityAcousticTimeScalar_2D_numpy,
+                                       ConstantDensityAcousticTimeScalar_2D_numpy_stencil,
                                        ConstantDensityAcousticTimeScalar_2D_cpp,
                                        ConstantDensityAcousticTimeScalar_2D_omp,
                                        ConstantDensityAcousticTimeScalar_3D_numpy,
+                                       ConstantDensityAcousticTimeScalar_3D_numpy_stencil,
                                        ConstantDensityAcousticTimeScalar_3D_cpp,
                                        ConstantDensityAcousticTimeScalar_3D_omp)
 
@@ -49,12 +52,15 @@ VariableDensityAcousticWave = VariableDensityAcousticWaveFactory()
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_1D_numpy)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_1D_cpp)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_1D_omp)
+ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_1D_numpy_stencil)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_2D_numpy)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_2D_cpp)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_2D_omp)
+ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_2D_numpy_stencil)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_3D_numpy)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_3D_cpp)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_3D_omp)
+ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeScalar_3D_numpy_stencil)
 
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeODE_1D)
 ConstantDensityAcousticWave.register(ConstantDensityAcousticTimeODE_2D)
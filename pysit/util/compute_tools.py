@@ -3,6 +3,7 @@ import copy as copy
 
 import scipy.io as sio
 from scipy import signal
+import scipy.fft as spfft
 import matplotlib.pyplot as plt
 from scipy.signal import hilbert
 
@@ -13,8 +14,8 @@ import obspy.io.segy.core as segy
 
 __all__ = ['odn2grid', 'odn2grid_data_2D_time', 'odn2grid_data_3D_time',
            'odn2grid_data_2D_freq', 'odn2grid_data_3D_freq', 'low_pass_filter',
-           'high_pass_filter', 'band_pass_filter', 'correlate_fun', 'optimal_transport_fwi', 
-           'padding_zeros_fun', 'un_padding_zeros_fun', 'padding_zeros_op', 'envelope_fun',
+           'high_pass_filter', 'band_pass_filter', 'correlate_fun', 'optimal_transport_fwi',
+           'optimal_transport_fwi_gather', 'padding_zeros_fun', 'un_padding_zeros_fun', 'padding_zeros_op', 'envelope_fun',
            'opSmooth1D', 'opSmooth2D']
 
 def odn2grid(o, d, n):
@@ -197,11 +198,116 @@ class opSmooth2D(object):
 
 
 
-class high_pass_filter(object):
+class _fft_filter(object):
+    ''' Application of a filter, given by its frequency response, to whole
+        gathers at once.
+
+        All traces are transformed by one real FFT along the filter axis.  The
+        response is applied as the real part of the complex filter, i.e.,
+        averaged with its reflection in frequency, which keeps the operator
+        self-adjoint.  Zero padded copies of the input are assembled in a
+        reusable workspace, and filtered observed data are cached by the
+        receivers of each shot, see `filter_observed_data`.
+    '''
+
+    label = 'fft'
+
+    def _setup_transform(self, response):
+        n = self.nsmp_cmp
+        response = 0.5*(response + np.roll(response[::-1], 1))
+        self.rfft_response = response[:n//2+1]
+        self._workspace = dict()
+
+    def __mul__(self, x):
+
+        x_shape = np.shape(x)
+
+        if len(x_shape) == 1:
+            if x_shape[0] != self.shape[1]:
+                raise ValueError(
+                    'The size of input x should be equal to the shape[1] of the {0} filter object'.format(self.label))
+
+        else:
+            if x_shape[self.axis] != self.shape[1]:
+                raise ValueError(
+                    "The length of input x's operating axis should be equal to the shape[1] of the {0} filter object".format(self.label))
+
+        return self._apply(x, adjoint=False)
+
+    def __adj_mul__(self, x):
+        x_shape = np.shape(x)
+
+        if len(x_shape) == 1:
+            if x_shape[0] != self.shape[0]:
+                raise ValueError(
+                    'The size of input x should be equal to the shape[0] of the {0} filter object for adj_mul'.format(self.label))
+
+        else:
+            if x_shape[self.axis] != self.shape[0]:
+                raise ValueError(
+                    "The length of input x's operating axis should be equal to the shape[0] of the {0} filter object for adj_mul".format(self.label))
+
+        return self._apply(x, adjoint=True)
+
+    def _padded(self, x, axis):
+        # Copies x into the interior of a zero padded workspace
+        shape = list(x.shape)
+        shape[axis] = self.nsmp_cmp
+        key = (tuple(shape), axis)
+        if key not in self._workspace:
+            self._workspace[key] = np.zeros(shape)
+        y = self._workspace[key]
+
+        sl = [slice(None)]*x.ndim
+        sl[axis] = slice(self.padding_zeros_op.nl, self.padding_zeros_op.nl+self.nsmp_org)
+        y[tuple(sl)] = x
+        return y
+
+    def _apply(self, x, adjoint=False):
+        x = np.asarray(x, dtype=np.float64)
+        axis = self.axis if x.ndim > 1 else 0
+
+        if self.padding_zeros is True and not adjoint:
+            x = self._padded(x, axis)
+
+        sh = [1]*x.ndim
+        sh[axis] = -1
+
+        y = spfft.rfft(x, axis=axis)
+        y *= self.rfft_response.reshape(sh)
+        y = spfft.irfft(y, n=self.nsmp_cmp, axis=axis, overwrite_x=True)
+
+        if self.padding_zeros is True and adjoint:
+            sl = [slice(None)]*x.ndim
+            sl[axis] = slice(self.padding_zeros_op.nl, self.padding_zeros_op.nl+self.nsmp_org)
+            y = y[tuple(sl)]
+
+        return y
+
+    def _apply_filter(self, x):
+        return self._apply(x, adjoint=False)
+
+    def _apply_adj_filter(self, x):
+        return self._apply(x, adjoint=True)
+
+    def filter_observed_data(self, shot, ts):
+        ''' Returns the filtered observed data of a shot, interpolated to the
+            times ts.
+
+            The result is cached by the receivers, with their interpolated
+            data, see `ReceiverBase.filter_data`.  It is shared, and must not
+            be modified.
+        '''
+        return shot.receivers.filter_data(self, ts)
+
+
+class high_pass_filter(_fft_filter):
     ''' This is a low pass filter object that conducts the 1D low pass filtering
         
     '''
 
+    label = 'high pass'
+
     def __init__(self, nsmp, T, cut_freq, transit_freq_length=1.0, axis=0, padding_zeros=False, nl=0, nr=0):
         '''
         Input:
@@ -251,77 +357,16 @@ class high_pass_filter(object):
         high_pass_filter[0:n_cut] = low_freq_part
         high_pass_filter[self.nsmp_cmp-n_cut:self.nsmp_cmp] = high_freq_part
 
-        self.high_pass_filter = high_pass_filter 
-
-    def __mul__(self, x):
-        
-        x_shape = np.shape(x)
+        self.high_pass_filter = high_pass_filter
+        self._setup_transform(high_pass_filter)
 
-        if len(x_shape) == 1:
-            if x_shape[0] != self.shape[1]:
-                raise ValueError(
-                    'The size of input x should be equal to the shape[1] of the high pass filter object')
-
-            else:
-               y = self._apply_filter(x) 
-
-        else:
-            if x_shape[self.axis] != self.shape[1]:
-                raise ValueError(
-                    "The length of input x's operating axis should be equal to the shape[1] of the high pass filter object")
-            else:
-                y = np.apply_along_axis(self._apply_filter, self.axis, x)
-
-        return y
-
-    def __adj_mul__(self, x):
-        x_shape = np.shape(x)
-
-        if len(x_shape) == 1:
-            if x_shape[0] != self.shape[0]:
-                raise ValueError(
-                    'The size of input x should be equal to the shape[0] of the high pass filter object for adj_mul')
-
-            else:
-               y = self._apply_adj_filter(x)
-
-        else:
-            if x_shape[self.axis] != self.shape[0]:
-                raise ValueError(
-                    "The length of input x's operating axis should be equal to the shape[0] of the high pass filter object for adj_mul")
-            else:
-                y = np.apply_along_axis(self._apply_adj_filter, self.axis, x)
-
-        return y
-
-    def _apply_filter(self, x):
-        if self.padding_zeros is True:
-            y = self.padding_zeros_op * x
-            y = np.fft.fft(y)
-        else:
-            y = np.fft.fft(x)
-
-        y = self.high_pass_filter * y
-        y = np.fft.ifft(y)
-        return y.real
-
-    def _apply_adj_filter(self, x):
-        y = np.fft.fft(x)
-        y = self.high_pass_filter * y
-        y = np.fft.ifft(y)
-        y = y.real
-
-        if self.padding_zeros is True:
-            y = self.padding_zeros_op.__adj_mul__(y.real)
-
-        return y
-
-
-class low_pass_filter(object):
+class low_pass_filter(_fft_filter):
     ''' This is a low pass filter object that conducts the 1D low pass filtering
         
     '''
 
+    label = 'low pass'
+
     def __init__(self, nsmp, T, cut_freq, transit_freq_length=1.0, axis=0, padding_zeros=False, nl=0, nr=0):
         '''
         Input:
@@ -371,77 +416,15 @@ class low_pass_filter(object):
         low_pass_filter[self.nsmp_cmp-n_cut:self.nsmp_cmp] = high_freq_part
 
         self.low_pass_filter = low_pass_filter
+        self._setup_transform(low_pass_filter)
 
-    def __mul__(self, x):
-
-        x_shape = np.shape(x)
-
-        if len(x_shape) == 1:
-            if x_shape[0] != self.shape[1]:
-                raise ValueError(
-                    'The size of input x should be equal to the shape[1] of the low pass filter object')
-
-            else:
-               y = self._apply_filter(x)
-
-        else:
-            if x_shape[self.axis] != self.shape[1]:
-                raise ValueError(
-                    "The length of input x's operating axis should be equal to the shape[1] of the low pass filter object")
-            else:
-                y = np.apply_along_axis(self._apply_filter, self.axis, x)
-
-        return y
-
-    def __adj_mul__(self, x):
-        x_shape = np.shape(x)
-
-        if len(x_shape) == 1:
-            if x_shape[0] != self.shape[0]:
-                raise ValueError(
-                    'The size of input x should be equal to the shape[0] of the low pass filter object for adj_mul')
-
-            else:
-               y = self._apply_adj_filter(x)
-
-        else:
-            if x_shape[self.axis] != self.shape[0]:
-                raise ValueError(
-                    "The length of input x's operating axis should be equal to the shape[0] of the low pass filter object for adj_mul")
-            else:
-                y = np.apply_along_axis(self._apply_adj_filter, self.axis, x)
-
-        return y
-
-    def _apply_filter(self, x):
-        if self.padding_zeros is True:
-            y = self.padding_zeros_op * x
-            y = np.fft.fft(y)
-        else:
-            y = np.fft.fft(x)
-
-        y = self.low_pass_filter * y
-        y = np.fft.ifft(y)
-        return y.real
-
-    def _apply_adj_filter(self, x):
-        y = np.fft.fft(x)
-        y = self.low_pass_filter * y
-        y = np.fft.ifft(y)
-        y = y.real
-
-        if self.padding_zeros is True:
-            y = self.padding_zeros_op.__adj_mul__(y.real)
-
-        return y 
-
-
-
-class band_pass_filter(object):
+class band_pass_filter(_fft_filter):
     ''' This is a low pass filter object that conducts the 1D low pass filtering
         
     '''
 
+    label = 'band pass'
+
     def __init__(self, nsmp, T, freq_band, transit_freq_length=1.0, axis=0, padding_zeros=False, nl=0, nr=0):
         '''
         Input:
@@ -476,69 +459,7 @@ class band_pass_filter(object):
         HPF = high_pass_filter(nsmp, T, freq_band[0], transit_freq_length=transit_freq_length, axis=axis, padding_zeros=padding_zeros, nl=nl, nr=nr)
 
         self.band_pass_filter = LPF.low_pass_filter * HPF.high_pass_filter
-
-    def __mul__(self, x):
-
-        x_shape = np.shape(x)
-
-        if len(x_shape) == 1:
-            if x_shape[0] != self.shape[1]:
-                raise ValueError(
-                    'The size of input x should be equal to the shape[1] of the band pass filter object')
-
-            else:
-               y = self._apply_filter(x)
-
-        else:
-            if x_shape[self.axis] != self.shape[1]:
-                raise ValueError(
-                    "The length of input x's operating axis should be equal to the shape[1] of the band pass filter object")
-            else:
-                y = np.apply_along_axis(self._apply_filter, self.axis, x)
-
-        return y
-
-    def __adj_mul__(self, x):
-        x_shape = np.shape(x)
-
-        if len(x_shape) == 1:
-            if x_shape[0] != self.shape[0]:
-                raise ValueError(
-                    'The size of input x should be equal to the shape[0] of the band pass filter object for adj_mul')
-
-            else:
-               y = self._apply_adj_filter(x)
-
-        else:
-            if x_shape[self.axis] != self.shape[0]:
-                raise ValueError(
-                    "The length of input x's operating axis should be equal to band shape[0] of the low pass filter object for adj_mul")
-            else:
-                y = np.apply_along_axis(self._apply_adj_filter, self.axis, x)
-
-        return y
-
-    def _apply_filter(self, x):
-        if self.padding_zeros is True:
-            y = self.padding_zeros_op * x
-            y = np.fft.fft(y)
-        else:
-            y = np.fft.fft(x)
-        
-        y = self.band_pass_filter * y
-        y = np.fft.ifft(y)
-        return y.real
-
-    def _apply_adj_filter(self, x):
-        y = np.fft.fft(x)
-        y = self.band_pass_filter * y
-        y = np.fft.ifft(y)
-        y = y.real
-
-        if self.padding_zeros is True:
-            y = self.padding_zeros_op.__adj_mul__(y.real)
-
-        return y 
+        self._setup_transform(self.band_pass_filter)
 
 def envelope_fun(data, p):
     data_Hilbert = hilbert(data, axis=0).imag
@@ -639,157 +560,179 @@ def padding_zeros_fun(data, n_data, nl, nr):
 def un_padding_zeros_fun(data, n_data, nl, nr):
     return data[nl:nl+n_data]
 
-def optimal_transport_fwi(dobs, dpred, dt, transform_mode='linear', c_ratio=5.0, exp_a=1.0, env_p=2.0, npad=0):
+def _ot_distribution(d, transform_mode, c, exp_a, env_p, dt):
+    # Transforms the traces of d to distributions.  Returns the unnormalized
+    # transform, its normalization and the derivative of the transform.
+    if transform_mode == 'linear':
+        f = d + c
+        df = None
+    elif transform_mode == 'quadratic':
+        f = d ** 2.0
+        df = 2.0*d
+    elif transform_mode == 'absolute':
+        f = np.abs(d)
+        df = np.sign(d)
+    elif transform_mode == 'exponential':
+        f = np.exp(d * exp_a)
+        df = f * exp_a
+    elif transform_mode == 'envelope':
+        f, df = envelope_fun(d, env_p)
+    else:
+        raise ValueError('Unknown transform mode {0}.'.format(transform_mode))
+
+    return f, np.sum(f, axis=0)*dt, df
+
+def _inverse_cdf(F, G, dt):
+    # np.interp(F[:, i], G[:, i], t) for all traces i at once, with t = k*dt.
+    # F and G are nondecreasing along axis 0.  A stable sort of G stacked on
+    # F ranks every F[k] after the values of G not larger than it, so that
+    # the position of F[k] minus k is searchsorted(G, F[k], side='right').
+    ndata, ntr = G.shape
+    order = np.argsort(np.concatenate((G, F), axis=0), axis=0, kind='stable')
+    position = np.empty_like(order)
+    np.put_along_axis(position, order, np.arange(2*ndata).reshape((-1, 1)), axis=0)
+    k = np.arange(ndata).reshape((-1, 1))
+    j = np.clip(position[ndata:] - k - 1, 0, ndata-2)
+
+    G0 = np.take_along_axis(G, j, axis=0)
+    G1 = np.take_along_axis(G, j+1, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        IGoF = (j + (F - G0) / (G1 - G0)) * dt
+    IGoF = np.where(F >= G[-1], (ndata-1)*dt, IGoF)
+    IGoF = np.where(F < G[0], 0.0, IGoF)
+    return IGoF
+
+def optimal_transport_fwi_gather(dobs, dpred, dt, transform_mode='linear', c_ratio=5.0, exp_a=1.0, env_p=2.0, npad=0, mask=None):
+    """ Quadratic Wasserstein misfit and adjoint source of all traces of a
+        gather.
+
+    The traces are transformed to distributions, and their cumulative
+    distributions inverted, in one pass over the gather.
+
+    Parameters
+    ----------
+    dobs, dpred : ndarray
+        Observed and predicted data, of shape (nt, ntraces).
+    dt : float
+        Time step.
+    transform_mode : {'linear', 'quadratic', 'absolute', 'exponential', 'envelope'}
+        Transform of the traces to positive functions.
+    c_ratio : float, optional
+        Shift of the linear transform, relative to the maximum of each observed
+        trace.
+    exp_a : float or ndarray, optional
+        Exponent of the exponential transform, of all traces or of each trace.
+    env_p : float, optional
+        Power of the envelope transform.
+    npad : int, optional
+        Number of zeros padded at both ends of the traces.
+    mask : ndarray of bool, optional
+        Traces taken into account.  The others have zero residual and adjoint
+        source.
+
+    Returns
+    -------
+    resid : ndarray
+        Residual, of shape (nt+2*npad, ntraces), whose squared norm is the
+        misfit.
+    adj_src : ndarray
+        Adjoint source, of shape (nt, ntraces).
+    ot_value : ndarray
+        Misfit of each trace.
+
+    Notes
+    -----
+    A predicted trace whose transform is negative somewhere, e.g., a linear
+    transform with too small a shift, has a residual of 1e10 and a zero
+    adjoint source.  A trace whose observed or predicted transform has no
+    mass, e.g., a silent trace under the linear transform, has zero residual
+    and adjoint source.
+
+    """
+
+    dobs = np.asarray(dobs, dtype=np.float64)
+    dpred = np.asarray(dpred, dtype=np.float64)
+    nt, ntr = dobs.shape
+    ndata = nt + 2*npad
+
+    resid = np.zeros((ndata, ntr))
+    adj_src = np.zeros((nt, ntr))
+
+    if mask is None:
+        mask = np.ones(ntr, dtype=bool)
+    mask = np.asarray(mask, dtype=bool)
+    exp_a = np.broadcast_to(np.asarray(exp_a, dtype=np.float64), (ntr,))[mask]
 
-    ## Transform_mode: linear, quadratic, absolute, exponential
-    
     # Normalization and transfer data to a distribution
-    c = c_ratio * np.abs(np.max(np.abs(dobs)))
-    dobs = padding_zeros_fun(dobs, len(dobs), npad, npad)
-    dpred = padding_zeros_fun(dpred, len(dpred), npad, npad)
-    
+    c = c_ratio * np.max(np.abs(dobs[:, mask]), axis=0)
+    dobs = np.pad(dobs[:, mask], ((npad, npad), (0, 0)))
+    dpred = np.pad(dpred[:, mask], ((npad, npad), (0, 0)))
 
-        
+    g, sg, dg = _ot_distribution(dobs, transform_mode, c, exp_a, env_p, dt)
+    f_unnormalized, s, df = _ot_distribution(dpred, transform_mode, c, exp_a, env_p, dt)
 
-    if transform_mode == 'linear':          
-        # if c < np.abs(np.min(dpred)):
-        #     print('c {0}'.format(c))
-        #     print('min dpred {0}'.format(np.min(dpred)))
+    # Traces without mass, e.g., silent observed traces under the linear
+    # transform, cannot be normalized to distributions
+    massive = (sg > 0) & (s > 0)
+    sg = np.where(massive, sg, 1.0)
+    s = np.where(massive, s, 1.0)
+    g = g / sg
+    f = f_unnormalized / s
 
-        g = dobs + c
-        g = g / (np.sum(g)*dt)
-        f_plus_c = dpred + c
-        s = (np.sum(f_plus_c)*dt)
-        f = f_plus_c / s
-    elif transform_mode == 'quadratic':
-        g = dobs ** 2.0
-        g = g / (np.sum(g)*dt)
-        f_quadr = dpred ** 2.0
-        s = np.sum(f_quadr)*dt
-        f = f_quadr / s
-    elif transform_mode == 'absolute':
-        g = np.abs(dobs)
-        g = g / (np.sum(g)*dt)
-        f_abs = np.abs(dpred)
-        s = np.sum(f_abs)*dt
-        f = f_abs / s
-    elif transform_mode == 'exponential':
-        g = np.exp(dobs * exp_a)
-        g = g / (np.sum(g)*dt)
-        f_exp = np.exp(dpred * exp_a)
-        s = np.sum(f_exp)*dt
-        f = f_exp / s
-    elif transform_mode == 'envelope':
-        g, df_envo = envelope_fun(dobs, env_p)
-        g = g / (np.sum(g)*dt)
-        f_env, df_env = envelope_fun(dpred, env_p)
-        s = np.sum(f_env)*dt
-        f = f_env / s
-
-    if np.min(f) < 0:
-        resid = 1e10
-        adj_src = np.zeros(dpred.shape)
-        # print('small c used')
-        return resid, adj_src, np.linalg.norm(resid)**2.0
-
-
-    f[np.where(np.abs(f)<1e-20)] = 0.0
-    g[np.where(np.abs(g)<1e-20)] = 0.0
-    ndata = len(f)
-    t = np.array(range(0,ndata)) * dt
-    
-    if transform_mode == 'linear': 
-        if c < np.abs(np.min(dpred)):
-            print('min f {0}'.format(np.min(f)))
-            print('min g {0}'.format(np.min(g)))
-
-    F = np.zeros(ndata)
-    G = np.zeros(ndata)
-    g_IGoF = np.zeros(ndata)
-    IGoF = np.zeros(ndata)
-    IGoF_ind = np.zeros(ndata)
-
-    # Compute F(t) and G(t)
-    int_f = 0.0
-    int_g = 0.0
-    for i in range(0, ndata):
-        int_f += f[i]
-        int_g += g[i]
-        F[i] = int_f
-        G[i] = int_g
+    # Traces with a negative transform are not distributions
+    valid = ~(np.min(f, axis=0) < 0)
+    f = np.where(valid, f, 0.0)
+
+    f[np.abs(f) < 1e-20] = 0.0
+    g[np.abs(g) < 1e-20] = 0.0
+    t = (np.arange(ndata) * dt).reshape((-1, 1))
 
     # Compute G^{-1} o F(t)
-    # IGoF[ndata-1] = (ndata-1)*dt
-    # IGoF_ind[ndata-1] = ndata-1
-
-    IGoF = np.interp(F, G, t)
-    g_IGoF = np.interp(IGoF, t, g)
-
-    # IGoF_ind = IGoF_ind.astype(int)
-    # # F[ndata-1] = G[ndata-1]
-    # F[np.where(F>G[ndata-1])] = G[ndata-1]-10**(-10)
-    # for i in range(0, ndata):
-
-    #     IGoF_ind[i] = int(np.searchsorted(G, F[i]))
-    #     if IGoF_ind[i] == ndata:
-    #         # print('F: ',F)
-    #         # print('G: ',G[ndata-1])
-    #         # print('Dpred: ', dpred)
-    #         IGoF_ind[i] = ndata-1
-
-    #     if IGoF_ind[i] == 0:
-    #         IGoF[i] = IGoF_ind[i] * dt
-    #         g_IGoF[i] = g[0]
-    #     else:
-    #         beta = (G[IGoF_ind[i]] - F[i]) / (G[IGoF_ind[i]] - G[IGoF_ind[i]-1])
-    #         IGoF[i] = (IGoF_ind[i] - beta) * dt
-    #         g_IGoF[i] = g[IGoF_ind[i]] - beta * (g[IGoF_ind[i]] - g[IGoF_ind[i]-1])
-
-
-    # idx = np.where(IGoF_ind>ndata-1)
-    # IGoF_ind[idx] = ndata-1
-    # if c < np.abs(np.min(dpred)):
-    #     print('min IGoF_ind {0}'.format(np.min(IGoF_ind)))
-    #     print('max IGoF_ind {0}'.format(np.max(IGoF_ind)))
+    F = np.cumsum(f, axis=0)
+    G = np.cumsum(g, axis=0)
+    IGoF = _inverse_cdf(F, G, dt)
+
+    # g o G^{-1} o F(t), by linear interpolation of g on the time grid
+    j = np.clip((IGoF / dt).astype(int), 0, ndata-2)
+    g0 = np.take_along_axis(g, j, axis=0)
+    g1 = np.take_along_axis(g, j+1, axis=0)
+    g_IGoF = g0 + (g1 - g0) / dt * (IGoF - j*dt)
 
     # Compute residual
     t_minus_IGoF = t - IGoF
-    resid = np.sqrt(f) * t_minus_IGoF
-#    print('min resid {0}'.format(np.min(resid)))
-#    print('max resid {0}'.format(np.max(resid)))
+    r = np.sqrt(f) * t_minus_IGoF
 
     # Compute adjoint source
-
     adj_src1 = t_minus_IGoF * t_minus_IGoF
-    # adj_src2 = (-2*f*dt / g[IGoF_ind]) * t_minus_IGoF
-    f_divid_g = np.zeros(ndata)
-    idx_gnot0 = np.where(g_IGoF > 0)
+    f_divid_g = np.zeros_like(f)
+    idx_gnot0 = g_IGoF > 0
     f_divid_g[idx_gnot0] = -2*f[idx_gnot0]*dt / g_IGoF[idx_gnot0]
+    adj_src2 = np.cumsum((f_divid_g * t_minus_IGoF)[::-1], axis=0)[::-1]
 
-    adj_src2 = f_divid_g * t_minus_IGoF
+    adj = adj_src1 + adj_src2
+    adj = adj / s - dt/(s**2.0)*np.sum(f_unnormalized * adj, axis=0)
+    if df is not None:
+        adj *= df
 
-    for i in range(ndata-2, -1, -1):
-        adj_src2[i] += adj_src2[i+1]
+    r[:, ~valid] = 1e10
+    adj[:, ~valid] = 0.0
+    r[:, ~massive] = 0.0
+    adj[:, ~massive] = 0.0
 
-    adj_src = adj_src1+adj_src2
-    
+    resid[:, mask] = r
+    adj_src[:, mask] = adj[npad:npad+nt]
 
-    if transform_mode == 'linear':
-        adj_src = adj_src / s - (dt/(s**2.0)*np.dot(f_plus_c, adj_src))*np.ones(ndata)
-    elif transform_mode == 'quadratic':
-        adj_src = (adj_src / s - (dt/(s**2.0)*np.dot(f_quadr, adj_src))*np.ones(ndata))*2.0*dpred
-        # adj_src = adj_src / s - (dt/(s**2.0)*np.dot(f_quadr, adj_src))*2.0*dpred
-    elif transform_mode == 'absolute':
-        adj_src = (adj_src / s - (dt/(s**2.0)*np.dot(f_abs, adj_src))*np.ones(ndata))*np.sign(dpred)
-    elif transform_mode == 'exponential':
-        adj_src = (adj_src / s - (dt/(s**2.0)*np.dot(f_exp, adj_src))*np.ones(ndata))*(np.exp(dpred*exp_a) * exp_a)
-    elif transform_mode == 'envelope':
-        adj_src = (adj_src / s - (dt/(s**2.0)*np.dot(f_env, adj_src)) * np.ones(ndata))*(df_env)
+    return resid, adj_src, np.sum(resid**2.0, axis=0)
 
-    adj_src = un_padding_zeros_fun(adj_src, len(dobs)-2*npad, npad, npad)
+def optimal_transport_fwi(dobs, dpred, dt, transform_mode='linear', c_ratio=5.0, exp_a=1.0, env_p=2.0, npad=0):
+    """ Quadratic Wasserstein misfit of a single trace, see
+        `optimal_transport_fwi_gather`. """
 
-    return resid, adj_src, np.linalg.norm(resid)**2.0
+    resid, adj_src, ot_value = optimal_transport_fwi_gather(np.reshape(dobs, (-1, 1)), np.reshape(dpred, (-1, 1)), dt,
+                                                            transform_mode=transform_mode, c_ratio=c_ratio, exp_a=exp_a,
+                                                            env_p=env_p, npad=npad)
 
+    return resid[:, 0], adj_src[:, 0], ot_value[0]
 
 if __name__ == '__main__':
     
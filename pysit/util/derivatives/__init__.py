@@ -1,2 +1,3 @@
 from .derivatives import *
-from .fdweight import *
\ No newline at end of file
+from .fdweight import *
+from .stencils import *
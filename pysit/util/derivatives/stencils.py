@@ -0,0 +1,155 @@
+import numpy as np
+import scipy.sparse as spsp
+
+from pyamg.gallery import stencil_grid
+
+from pysit.util.derivatives.fdweight import centered_difference
+from pysit.util.derivatives.derivatives import _build_derivative_matrix_part, _set_bc
+
+__all__ = ['AxisDerivativeStencil', 'build_derivative_stencil']
+
+__docformat__ = "restructuredtext en"
+
+
+def build_derivative_stencil(mesh, derivative, order_accuracy, dimension, dtype=np.float64):
+    """ Builds the derivative along one dimension of a structured cartesian
+        mesh, applied to grid arrays by slicing.
+
+    Parameters
+    ----------
+    mesh : pysit.CartesianMesh
+    derivative : int
+        Order of the derivative.
+    order_accuracy : int
+        Even order of accuracy.
+    dimension : {'x', 'y', 'z'}
+        Dimension along which to differentiate.
+    dtype : numpy dtype, optional
+        Type of the coefficients.
+
+    """
+
+    if mesh.type != 'structured-cartesian':
+        raise NotImplementedError('Derivative stencil builder not available (yet) for {0} meshes.'.format(mesh.discretization))
+
+    axis = {'x': 0, 'y': 1, 'z': mesh.dim-1}[dimension]
+    param = mesh.parameters[dimension]
+    shape = tuple(mesh.shape(include_bc=True, as_grid=True))
+
+    return AxisDerivativeStencil(shape, axis, derivative, order_accuracy, h=param.delta,
+                                 lbc=_set_bc(param.lbc), rbc=_set_bc(param.rbc), dtype=dtype)
+
+
+class AxisDerivativeStencil(object):
+    """ Finite difference derivative along one axis of a grid array, applied
+        by array slicing.
+
+    The operator is the one dimensional factor of `build_derivative_matrix`:
+    the centered stencil, truncated at the ends of the axis, whose rows at
+    the boundaries are replaced according to the boundary conditions.  Each
+    stencil coefficient is one scaled, shifted slice of the flattened input,
+    accumulated in place, and the boundary rows are then overwritten.  No
+    matrix is kept.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the grid arrays, including the boundary padding.
+    axis : int
+        Axis along which to differentiate.
+    derivative, order_accuracy : int
+        Order of the derivative and of its accuracy.
+    h : float
+        Grid spacing along the axis.
+    lbc, rbc : str or tuple
+        Boundary conditions, as for `build_derivative_matrix`.
+    dtype : numpy dtype, optional
+        Type of the coefficients and of the work array.
+
+    """
+
+    def __init__(self, shape, axis, derivative, order_accuracy, h=1.0, lbc='d', rbc='d', dtype=np.float64):
+
+        self.shape = tuple(shape)
+        self.axis = axis
+        self.dtype = np.dtype(dtype)
+
+        npoints = self.shape[axis]
+        coeffs = centered_difference(derivative, order_accuracy)/(h**derivative)
+        center = len(coeffs)//2
+
+        # (offset, coefficient) of the nonzero stencil coefficients, with the
+        # center first, if it is nonzero
+        stencil = [(k-center, c) for k, c in enumerate(coeffs) if c != 0.0 and abs(k-center) < npoints]
+        stencil.sort(key=lambda oc: oc[0] != 0)
+        self.stencil = [(offset, self.dtype.type(c)) for offset, c in stencil]
+
+        # Rows which are not interior rows of the full stencil, or where the
+        # one dimensional operator differs from it, i.e., the rows set by the
+        # boundary conditions
+        D = _build_derivative_matrix_part(npoints, derivative, order_accuracy, h=h, lbc=lbc, rbc=rbc)
+        S = stencil_grid(coeffs, (npoints, ), format='csr')
+        diff = spsp.csr_matrix(D - S)
+        diff.eliminate_zeros()
+        D = spsp.csr_matrix(D)
+
+        self.halo = min(center, npoints)
+        rows = set(diff.nonzero()[0])
+        rows.update(range(self.halo))
+        rows.update(range(npoints-self.halo, npoints))
+
+        self.boundary_rows = list()
+        for i in sorted(rows):
+            row = D.getrow(i)
+            self.boundary_rows.append((i, list(zip(row.indices, row.data.astype(self.dtype)))))
+
+        # Distance between neighbors along the axis, in the flattened array
+        self.stride = int(np.prod(self.shape[axis+1:], dtype=int))
+
+        self._work = np.zeros(self.shape, dtype=self.dtype)
+
+    def _slice(self, sl):
+        index = [slice(None)]*len(self.shape)
+        index[self.axis] = sl
+        return tuple(index)
+
+    def apply(self, u, out=None):
+        """ Returns the derivative of the grid array u, into `out` if given.
+            Both arrays must be C contiguous. """
+
+        if out is None:
+            out = np.empty(self.shape, dtype=np.result_type(u, self.dtype))
+
+        # Along the flattened arrays, a shift of the axis is a shift by a
+        # multiple of the stride.  Away from the first and last `halo` rows,
+        # which are boundary rows, the shifted slices stay on the same line.
+        N = out.size
+        lo = self.halo*self.stride
+        hi = N - lo
+        u_flat = u.reshape(-1)
+        out_flat = out.reshape(-1)
+        work = self._work.reshape(-1)
+
+        if hi > lo:
+            offset, c = self.stencil[0]
+            if offset == 0:
+                np.multiply(u_flat[lo:hi], c, out=out_flat[lo:hi])
+                stencil = self.stencil[1:]
+            else:
+                out_flat[lo:hi] = 0
+                stencil = self.stencil
+
+            for offset, c in stencil:
+                shift = offset*self.stride
+                np.multiply(u_flat[lo+shift:hi+shift], c, out=work[lo:hi])
+                out_flat[lo:hi] += work[lo:hi]
+
+        work = self._work
+        for i, row in self.boundary_rows:
+            dst = self._slice(slice(i, i+1))
+            out[dst] = 0
+            for j, c in row:
+                np.multiply(u[self._slice(slice(j, j+1))], c, out=work[dst])
+                out[dst] += work[dst]
+
+        return out
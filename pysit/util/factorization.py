@@ -0,0 +1,168 @@
+from collections import OrderedDict
+import hashlib
+
+import numpy as np
+import scipy.sparse as spsp
+import scipy.sparse.linalg as spspla
+
+__all__ = ['FactorizationCache', 'SparseLUFactorization']
+
+__docformat__ = "restructuredtext en"
+
+
+class SparseLUFactorization(object):
+    """Sparse LU factorization with a reusable fill-reducing ordering.
+
+    The column ordering depends only on the sparsity pattern, so it can be
+    computed once and handed to later factorizations of matrices with the
+    same pattern, which then skip the ordering and only perform the numeric
+    factorization.
+
+    Parameters
+    ----------
+    A : scipy.sparse matrix
+        Square matrix to factor.
+    ordering : ndarray of int, optional
+        Column ordering, e.g., the `ordering` of a previous factorization.
+        If not given, SuperLU computes one with `permc_spec`.
+    permc_spec : str, optional
+        SuperLU ordering method used when `ordering` is not given.
+
+    Attributes
+    ----------
+    ordering : ndarray of int
+        Column ordering used for this factorization.
+    nbytes : int
+        Storage of the L and U factors.
+
+    """
+
+    def __init__(self, A, ordering=None, permc_spec='COLAMD'):
+
+        A = spsp.csc_matrix(A)
+
+        if ordering is None:
+            self.lu = spspla.splu(A, permc_spec=permc_spec)
+            # perm_c maps columns of A to factored unknowns, so the ordering
+            # of the columns of A is its inverse.
+            self.ordering = np.argsort(self.lu.perm_c)
+            self._permuted = False
+        else:
+            self.lu = spspla.splu(A[:, ordering], permc_spec='NATURAL')
+            self.ordering = ordering
+            self._permuted = True
+
+        L, U = self.lu.L, self.lu.U
+        self.nbytes = sum(arr.nbytes for arr in (L.data, L.indices, L.indptr,
+                                                 U.data, U.indices, U.indptr))
+
+    def __call__(self, rhs):
+        """Solves A x = rhs for one or more right hand sides."""
+        y = self.lu.solve(rhs)
+        if not self._permuted:
+            return y
+        x = np.empty_like(y)
+        x[self.ordering] = y
+        return x
+
+
+class FactorizationCache(object):
+    """Memoizes factorizations of a family of operators, e.g., the Helmholtz
+    operators at several frequencies.
+
+    Behaves like a `ConstructableDict`: indexing with a key returns the
+    cached factorization or builds it with `builder(key)`.  Additionally,
+
+    * the factorizations are evicted in least recently used order when their
+      total `nbytes` exceeds `max_bytes`,
+    * `clear`, called when the model changes, drops the numeric
+      factorizations but keeps the symbolic orderings, which `factorize`
+      reuses for matrices with an already seen sparsity pattern,
+    * hits, misses, evictions and ordering reuses are counted in
+      `statistics`.
+
+    Parameters
+    ----------
+    builder : callable
+        Maps a key to a factorization, i.e., a callable solving with it.
+        Factorizations without an `nbytes` attribute count as zero bytes.
+    max_bytes : int, optional
+        Memory budget for the cached factorizations.  Unbounded by default.
+        The most recently built factorization is always kept.
+
+    """
+
+    def __init__(self, builder, max_bytes=None):
+        self.builder = builder
+        self.max_bytes = max_bytes
+
+        self._factors = OrderedDict()
+        self._orderings = dict()
+
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self._statistics = dict(hits=0, misses=0, evictions=0, ordering_hits=0, ordering_misses=0)
+
+    @property
+    def statistics(self):
+        """Dictionary of counters and the current `nbytes`."""
+        stats = dict(self._statistics)
+        stats['nbytes'] = self.nbytes
+        return stats
+
+    @property
+    def nbytes(self):
+        return sum(getattr(f, 'nbytes', 0) for f in self._factors.values())
+
+    def __getitem__(self, key):
+        if key in self._factors:
+            self._statistics['hits'] += 1
+            self._factors.move_to_end(key)
+            return self._factors[key]
+
+        self._statistics['misses'] += 1
+        factor = self.builder(key)
+        self._factors[key] = factor
+        self._evict()
+        return factor
+
+    def __contains__(self, key):
+        return key in self._factors
+
+    def __len__(self):
+        return len(self._factors)
+
+    def keys(self):
+        return list(self._factors.keys())
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while len(self._factors) > 1 and self.nbytes > self.max_bytes:
+            self._factors.popitem(last=False)
+            self._statistics['evictions'] += 1
+
+    def clear(self):
+        """Drops the numeric factorizations, keeping the orderings."""
+        self._factors.clear()
+
+    def factorize(self, A):
+        """Returns a SparseLUFactorization of `A`, reusing the ordering
+        computed for an earlier matrix with the same sparsity pattern."""
+        A = spsp.csc_matrix(A)
+        A.sort_indices()
+
+        digest = hashlib.sha1()
+        digest.update(A.indptr.astype(np.int64).tobytes())
+        digest.update(A.indices.astype(np.int64).tobytes())
+        pattern = (A.shape, A.nnz, digest.hexdigest())
+
+        if pattern in self._orderings:
+            self._statistics['ordering_hits'] += 1
+            return SparseLUFactorization(A, ordering=self._orderings[pattern])
+
+        self._statistics['ordering_misses'] += 1
+        factor = SparseLUFactorization(A)
+        self._orderings[pattern] = factor.ordering
+        return factor
@@ -1,16 +1,220 @@
+import multiprocessing
+import pickle
+import time
+import traceback
+
+import numpy as np
+
 try:
     from mpi4py import MPI
     hasmpi = True
 except:
     hasmpi = False
 
-__all__ = ['hasmpi', 'ParallelWrapShotNull', 'ParallelWrapShot']
+__all__ = ['hasmpi', 'ParallelWrapShotNull', 'ParallelWrapShot', 'ParallelWrapShotLocal',
+           'LocalComm', 'LocalShotExecutor']
+
+# The communicator of the current process, if it is a worker started by a
+# LocalShotExecutor.
+_local_comm = None
 
 class ParallelWrapShotBase(object):
 
     def __init__(self, *args, **kwargs):
         raise NotImplementedError('ParallelWrapShotBase.__init__ should never be called.')
 
+    def _init_scheduling(self, scheduling, reduction_precision='double'):
+        if scheduling not in ['static', 'dynamic']:
+            raise ValueError("Shot scheduling must be 'static' or 'dynamic'.")
+        if reduction_precision not in ['single', 'double']:
+            raise ValueError("Reduction precision must be 'single' or 'double'.")
+        self.scheduling = scheduling
+        self.reduction_precision = reduction_precision
+        self._counter_base = 0
+        self._compensation = dict()
+        self.statistics = dict(loops=0, shots=0, busy_time=0.0, idle_time=0.0)
+        self._loop_busy = list()
+
+        # The shared counter is created collectively, here, rather than in the
+        # first scheduled loop, which the ranks need not enter together
+        if self.use_parallel and scheduling == 'dynamic':
+            self._create_counter()
+
+    def reduce_sum(self, *values, **kwargs):
+        """Returns the list of the sums of scalars and arrays over all ranks.
+
+        All values are packed into one message, which is reduced with one
+        Allreduce.
+
+        With `reduction_precision` 'single', arrays are transported in
+        float32 with error feedback: the rounding error of the values sent
+        by this rank is stored under `key` and added to the values sent by
+        the next reduction with the same key, e.g., the gradient of the
+        next iteration.  The values sent over a run then sum to the exact
+        values up to a single rounding error, rather than one per
+        reduction.  The carried error is at most one float32 rounding of the
+        values, so that a reduction, e.g., of a line search trial, perturbs
+        the next one by no more than its own rounding.  Scalars are sent
+        exactly, in a second, float64, message.
+
+        Parameters
+        ----------
+        values : float or ndarray
+        key : hashable, optional
+            Identifies the reduced quantities for the error feedback.
+
+        """
+
+        if not self.use_parallel:
+            return list(values)
+
+        key = kwargs.get('key', None)
+        real = not any(np.iscomplexobj(v) for v in values)
+        dtype = np.float64 if real else np.complex128
+        single = real and self.reduction_precision == 'single'
+
+        if single:
+            scalars = [np.asarray(v, dtype=dtype).reshape(-1) for v in values if np.ndim(v) == 0]
+            arrays = list()
+            for i, v in enumerate(values):
+                if np.ndim(v) > 0:
+                    v = np.asarray(v, dtype=np.float64).reshape(-1)
+                    slot = (key, i, v.size)
+                    if key is not None and slot in self._compensation:
+                        v = v + self._compensation[slot]
+                    sent = v.astype(np.float32)
+                    if key is not None:
+                        self._compensation[slot] = v - sent
+                    arrays.append(sent)
+            messages = [scalars, arrays]
+        else:
+            messages = [[np.asarray(v, dtype=dtype).reshape(-1) for v in values]]
+
+        totals = list()
+        for parts in messages:
+            sendbuf = np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+            recvbuf = np.empty_like(sendbuf)
+            self.comm.Allreduce(sendbuf, recvbuf)
+            totals.append(recvbuf)
+
+        offsets = [0]*len(totals)
+        sums = list()
+        for v in values:
+            # In single precision, scalars and arrays come from different
+            # messages.
+            m = 1 if (single and np.ndim(v) > 0) else 0
+            n = np.size(v)
+            total = totals[m][offsets[m]:offsets[m]+n]
+            offsets[m] += n
+            if np.ndim(v) == 0:
+                sums.append(total[0].item())
+            else:
+                sums.append(total.astype(np.result_type(v, np.float64)).reshape(np.shape(v)))
+        return sums
+
+    def schedule(self, shots):
+        """Iterates over the shots this rank processes in a collective loop.
+
+        With 'static' scheduling, `shots` are the rank local shots, e.g., as
+        distributed by the acquisition functions, and all of them are
+        processed.  With 'dynamic' scheduling, every rank holds all shots
+        and each rank takes the next unprocessed shot from a shared counter
+        whenever it finishes one, so that expensive shots do not leave the
+        other ranks idle.
+
+        The time spent in the loop is accumulated in `statistics`; the time
+        spent waiting for the slowest rank is computed by
+        `gather_statistics`.
+
+        """
+        if self.use_parallel and self.scheduling == 'dynamic':
+            scheduled = self._dynamic_shots(shots)
+        else:
+            scheduled = iter(shots)
+        return self._timed((shot, 1) for shot in scheduled)
+
+    def schedule_blocks(self, shots, block_size=None):
+        """Like `schedule`, but iterates over lists of shots, for modeling
+        tools that process several shots at once.  With 'static' scheduling
+        the shots are split into consecutive blocks of `block_size` shots,
+        all shots forming one block if it is None.  With 'dynamic' scheduling
+        every block is a single shot.  Blocks are never empty: a rank without
+        shots gets no block."""
+        if self.use_parallel and self.scheduling == 'dynamic':
+            return self._timed(([shot], 1) for shot in self._dynamic_shots(shots))
+        shots = list(shots)
+        if block_size is None:
+            block_size = max(len(shots), 1)
+        blocks = [shots[i:i+block_size] for i in range(0, len(shots), block_size)]
+        return self._timed((block, len(block)) for block in blocks)
+
+    def _timed(self, scheduled):
+        # Yields the items of (item, number of shots) pairs, recording the
+        # busy time of the loop.  Static loops end without a barrier, the
+        # collective that follows a loop synchronizes the ranks anyway.
+        if not self.use_parallel:
+            for item, count in scheduled:
+                yield item
+            return
+
+        tt = time.time()
+        nshots = 0
+        for item, count in scheduled:
+            nshots += count
+            yield item
+        busy = time.time() - tt
+
+        if self.scheduling == 'dynamic':
+            # With the shared counter, no rank may draw for the next loop
+            # before every rank has drawn its past the end index of this one
+            self.comm.Barrier()
+
+        self.statistics['loops'] += 1
+        self.statistics['shots'] += nshots
+        self.statistics['busy_time'] += busy
+        self._loop_busy.append(busy)
+
+    def _dynamic_shots(self, shots):
+        # Each rank draws indices until one is past the end, so a loop
+        # consumes len(shots) + size counter values, and the next loop
+        # starts after them.
+        base = self._counter_base
+        self._counter_base += len(shots) + self.size
+
+        while True:
+            i = self._fetch_and_increment() - base
+            if i >= len(shots):
+                break
+            yield shots[i]
+
+    def _create_counter(self):
+        pass
+
+    def _fetch_and_increment(self):
+        raise NotImplementedError('Dynamic scheduling is not supported by {0}.'.format(type(self).__name__))
+
+    def close(self):
+        """Releases the shared counter.  Must be called on all ranks."""
+        pass
+
+    def gather_statistics(self):
+        """Returns the `statistics` of every rank, ordered by rank.  Must be
+        called on all ranks.
+
+        The idle time of a rank is, summed over the loops, the time it would
+        have waited at the end of each loop for the slowest rank."""
+        if not self.use_parallel:
+            return [dict(self.statistics)]
+        loop_busy = np.array(self.comm.allgather(self._loop_busy)).reshape(self.size, -1)
+        idle = (loop_busy.max(axis=0) - loop_busy).sum(axis=1)
+        self.statistics['idle_time'] = float(idle[self.rank])
+        return self.comm.allgather(dict(self.statistics))
+
+    def reset_statistics(self):
+        for key in self.statistics:
+            self.statistics[key] = type(self.statistics[key])(0)
+        del self._loop_busy[:]
+
 class ParallelWrapShotNull(ParallelWrapShotBase):
 
     def __init__(self, *args, **kwargs):
@@ -20,19 +224,36 @@ class ParallelWrapShotNull(ParallelWrapShotBase):
         self.size = 1
         self.rank = 0
 
+        self._init_scheduling(kwargs.get('scheduling', 'static'),
+                              kwargs.get('reduction_precision', 'double'))
+
 class ParallelWrapShot(ParallelWrapShotBase):
+    """Shot parallelism over the ranks of an MPI communicator.
 
-    def __new__(cls, *args, **kwargs):
+    Parameters
+    ----------
+    comm : mpi4py communicator, optional
+        Defaults to MPI.COMM_WORLD.
+    scheduling : {'static', 'dynamic'}, optional
+        How the shot loops of the objective functions are distributed, see
+        `schedule`.  For 'dynamic' scheduling, every rank must hold all
+        shots, i.e., the acquisition is built without `parallel_shot_wrap`.
+    reduction_precision : {'double', 'single'}, optional
+        Transport precision of the arrays summed by `reduce_sum`, e.g., the
+        gradient.
 
-        if not hasmpi:
-            return ParallelWrapShotNull(*args, **kwargs)
+    """
+
+    def __new__(cls, *args, **kwargs):
 
-        if MPI.COMM_WORLD.Get_size() <= 1:
+        if not hasmpi or MPI.COMM_WORLD.Get_size() <= 1:
+            if _local_comm is not None:
+                return ParallelWrapShotLocal(*args, **kwargs)
             return ParallelWrapShotNull(*args, **kwargs)
 
         return super().__new__(cls)
 
-    def __init__(self, comm=None, *args, **kwargs):
+    def __init__(self, comm=None, *args, scheduling='static', reduction_precision='double', **kwargs):
         if comm is None:
             self.comm = MPI.COMM_WORLD
         else:
@@ -42,10 +263,280 @@ class ParallelWrapShot(ParallelWrapShotBase):
         self.size = self.comm.Get_size()
         self.rank = self.comm.Get_rank()
 
+        self._window = None
+        self._init_scheduling(scheduling, reduction_precision)
+
+    def _create_counter(self):
+        # The shared counter lives on rank 0 and is accessed with one-sided
+        # atomics, so no rank has to act as a dedicated master.
+        self._counter = np.zeros(1, dtype=np.int64)
+        memory = self._counter if self.rank == 0 else None
+        self._window = MPI.Win.Create(memory, disp_unit=self._counter.itemsize, comm=self.comm)
+
+    def close(self):
+        """Frees the window of the shared counter.  Must be called on all
+        ranks."""
+        if self._window is not None:
+            self._window.Free()
+            self._window = None
+
+    def __del__(self):
+        # Freeing the window is collective, and impossible after MPI_Finalize
+        if getattr(self, '_window', None) is not None and not MPI.Is_finalized():
+            self.close()
+
+    def _fetch_and_increment(self):
+        one = np.ones(1, dtype=np.int64)
+        value = np.zeros(1, dtype=np.int64)
+        self._window.Lock(0, MPI.LOCK_SHARED)
+        self._window.Fetch_and_op(one, value, 0, 0, MPI.SUM)
+        self._window.Unlock(0)
+        return int(value[0])
+
+class ParallelWrapShotLocal(ParallelWrapShotBase):
+    """Shot parallelism over the processes of a LocalShotExecutor.
+
+    Inside a worker of a LocalShotExecutor, ParallelWrapShot() returns an
+    instance of this class, so scripts written for MPI run unchanged.
+
+    """
+
+    def __init__(self, comm=None, *args, scheduling='static', reduction_precision='double', **kwargs):
+        if comm is None or not isinstance(comm, LocalComm):
+            comm = _local_comm
+        if comm is None:
+            raise ValueError('ParallelWrapShotLocal must be used within a LocalShotExecutor.')
+
+        self.comm = comm
+        self.size = self.comm.Get_size()
+        self.rank = self.comm.Get_rank()
+        self.use_parallel = self.size > 1
+
+        self._init_scheduling(scheduling, reduction_precision)
+
+    def _fetch_and_increment(self):
+        return self.comm.fetch_and_add(1)
+
+
+class LocalComm(object):
+    """Communicator between the processes of a single node.
+
+    Implements the subset of the mpi4py communicator interface used by the
+    objective functions and optimization routines: `Allreduce`, `allreduce`,
+    `Bcast`, `bcast`, `allgather`, `Barrier`, `Get_rank` and `Get_size`.
+    Only sum reductions are supported.  Additionally, `fetch_and_add`
+    atomically updates a shared counter, for dynamic shot scheduling.
+
+    Data is exchanged through one shared memory buffer per process, allocated
+    before the processes are started.  Longer messages are sent in chunks of
+    the buffer size.  Sums are accumulated in rank order, so every process
+    obtains bitwise identical results.
+
+    Parameters
+    ----------
+    size : int
+        Number of processes.
+    buffer_bytes : int, optional
+        Size of the shared buffer of each process.
+    context : multiprocessing context, optional
+
+    """
+
+    def __init__(self, size, buffer_bytes=2**22, context=None):
+        context = multiprocessing if context is None else context
+
+        self.size = size
+        self.rank = 0
+        self.buffer_bytes = buffer_bytes
+
+        self._barrier = context.Barrier(size)
+        self._counter = context.Value('q', 0)
+        self._buffers = [context.RawArray('b', buffer_bytes) for i in range(size)]
+
+    def Get_rank(self):
+        return self.rank
+
+    def Get_size(self):
+        return self.size
+
+    def Barrier(self):
+        self._barrier.wait()
+
+    barrier = Barrier
+
+    def fetch_and_add(self, increment):
+        """Adds `increment` to the shared counter and returns its previous
+        value."""
+        with self._counter.get_lock():
+            value = self._counter.value
+            self._counter.value += increment
+        return value
+
+    def _abort(self):
+        self._barrier.abort()
+
+    def _buffer(self, rank, dtype, count):
+        return np.frombuffer(self._buffers[rank], dtype=dtype, count=count)
+
+    @staticmethod
+    def _check_op(op):
+        if op is not None and not (hasmpi and op == MPI.SUM):
+            raise NotImplementedError('LocalComm only supports sum reductions.')
+
+    def Allreduce(self, sendbuf, recvbuf, op=None):
+        """Sums `sendbuf` over all processes into `recvbuf`."""
+        self._check_op(op)
+
+        send = np.ascontiguousarray(sendbuf).reshape(-1)
+        if recvbuf.size != send.size:
+            raise ValueError('Send and receive buffers must have the same size.')
+
+        chunk = self.buffer_bytes // send.dtype.itemsize
+        total = np.empty(send.shape, dtype=send.dtype)
+        for start in range(0, send.size, chunk):
+            stop = min(start + chunk, send.size)
+            self._buffer(self.rank, send.dtype, stop-start)[:] = send[start:stop]
+            self.Barrier()
+            total[start:stop] = self._buffer(0, send.dtype, stop-start)
+            for rank in range(1, self.size):
+                total[start:stop] += self._buffer(rank, send.dtype, stop-start)
+            self.Barrier()
+
+        recvbuf[...] = total.reshape(recvbuf.shape)
+
+    def allreduce(self, sendobj, op=None):
+        """Returns the sum of `sendobj`, a number or an array, over all
+        processes."""
+        send = np.asarray(sendobj)
+        recv = np.empty_like(send)
+        self.Allreduce(send, recv, op=op)
+        return recv if isinstance(sendobj, np.ndarray) else recv[()]
+
+    def Bcast(self, buf, root=0):
+        """Copies the array `buf` of process `root` into `buf` of all
+        processes."""
+        flat = buf.reshape(-1)
+        chunk = self.buffer_bytes // flat.dtype.itemsize
+        for start in range(0, flat.size, chunk):
+            stop = min(start + chunk, flat.size)
+            if self.rank == root:
+                self._buffer(root, flat.dtype, stop-start)[:] = flat[start:stop]
+            self.Barrier()
+            if self.rank != root:
+                flat[start:stop] = self._buffer(root, flat.dtype, stop-start)
+            self.Barrier()
+
+    def bcast(self, obj, root=0):
+        """Returns the object `obj` of process `root` on all processes."""
+        if self.rank == root:
+            data = np.frombuffer(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)
+            length = np.array(data.size, dtype=np.int64)
+        else:
+            length = np.array(0, dtype=np.int64)
+        self.Bcast(length, root=root)
+
+        if self.rank != root:
+            data = np.empty(int(length), dtype=np.uint8)
+        self.Bcast(data, root=root)
+        return obj if self.rank == root else pickle.loads(data.tobytes())
+
+    def allgather(self, sendobj):
+        """Returns the list of `sendobj` of all processes."""
+        return [self.bcast(sendobj, root=rank) for rank in range(self.size)]
+
+
+def _local_worker(comm, rank, function, args, kwargs, connection):
+    global _local_comm
+    comm.rank = rank
+    _local_comm = comm
+    try:
+        result = (True, function(*args, **kwargs))
+    except BaseException:
+        comm._abort()
+        result = (False, traceback.format_exc())
+
+    try:
+        connection.send(result)
+    except Exception:
+        connection.send((False, traceback.format_exc()))
+    connection.close()
+
+
+class LocalShotExecutor(object):
+    """Runs a function in several processes on one node, each with a
+    ParallelWrapShotLocal, as `mpirun -n nprocs` would without MPI.
+
+    The function is typically the body of an MPI script: it sets up the
+    problem, distributes the shots with `parallel_shot_wrap=ParallelWrapShot()`
+    and runs the inversion, during which the objective function sums the
+    gradients of the process local shots through the shared memory of a
+    LocalComm.
+
+    Parameters
+    ----------
+    nprocs : int, optional
+        Number of processes, by default the number of cpus.
+    buffer_bytes : int, optional
+        Size of the shared communication buffer of each process.
+    start_method : str, optional
+        multiprocessing start method.  'fork' by default, where available,
+        otherwise the function and its arguments must be picklable.
+
+    Examples
+    --------
+    >>> def main(nshots):
+    ...     pwrap = ParallelWrapShot()
+    ...     # ... shots, solver and objective as in an MPI script ...
+    ...     return result
+    >>> result = LocalShotExecutor(8).run(main, 16)[0]
+
+    Notes
+    -----
+    Each process runs its own solver, so the number of threads of the
+    numerical libraries should usually be limited, e.g., OMP_NUM_THREADS=1.
+
+    """
+
+    def __init__(self, nprocs=None, buffer_bytes=2**22, start_method=None):
+        self.nprocs = multiprocessing.cpu_count() if nprocs is None else nprocs
+        self.buffer_bytes = buffer_bytes
+
+        if start_method is None and 'fork' in multiprocessing.get_all_start_methods():
+            start_method = 'fork'
+        self.context = multiprocessing.get_context(start_method)
+
+    def run(self, function, *args, **kwargs):
+        """Calls `function(*args, **kwargs)` in every process and returns
+        the list of return values ordered by rank."""
+
+        comm = LocalComm(self.nprocs, buffer_bytes=self.buffer_bytes, context=self.context)
+
+        processes = list()
+        connections = list()
+        for rank in range(self.nprocs):
+            receiver, sender = self.context.Pipe(duplex=False)
+            p = self.context.Process(target=_local_worker,
+                                     args=(comm, rank, function, args, kwargs, sender))
+            p.start()
+            sender.close()
+            processes.append(p)
+            connections.append(receiver)
 
+        results = list()
+        for rank, (p, connection) in enumerate(zip(processes, connections)):
+            try:
+                results.append(connection.recv())
+            except EOFError:
+                p.join()
+                results.append((False, 'Process exited with code {0}.'.format(p.exitcode)))
+            p.join()
 
-if __name__ == '__main__':
+        # Report the root failure rather than the broken barriers it caused
+        # in the other processes.
+        failures = [(rank, message) for rank, (ok, message) in enumerate(results) if not ok]
+        if failures:
+            primary = [f for f in failures if 'BrokenBarrierError' not in f[1]] or failures
+            rank, message = primary[0]
+            raise RuntimeError('Process {0} of {1} failed:\n{2}'.format(rank, self.nprocs, message))
 
-#   x = ParallelWrapShotBase()
-    y = ParallelWrapShotNull()
-    z = ParallelWrapShot('foo')
+        return [value for ok, value in results]
@@ -0,0 +1,306 @@
+import copy
+
+import numpy as np
+
+try:
+    import h5py
+    has_h5py = True
+except ImportError:
+    has_h5py = False
+
+__all__ = ['SampleStore', 'ChainRecorder', 'restore_like']
+
+__docformat__ = "restructuredtext en"
+
+
+def restore_like(template, row):
+    """Returns a stored row as an object like `template`.  Objects with a
+    `data` attribute, e.g., model parameters, are copied with the row as
+    their data."""
+    if hasattr(template, 'data') and not isinstance(template, np.ndarray):
+        m = copy.deepcopy(template)
+        m.data = np.reshape(row, m.data.shape).astype(m.data.dtype)
+        return m
+    return np.reshape(row, np.shape(template)).astype(np.asarray(template).dtype)
+
+
+class SampleStore(object):
+    """Append-only on-disk store of named series, e.g., MCMC samples or
+    optimization histories.
+
+    Every series is a pair of resizable, chunked HDF5 datasets, `<name>/data`
+    of shape (n, ...) and `<name>/index` of shape (n,), grown along their
+    first axis.  Appended rows are buffered in memory and written in blocks of
+    `buffer_rows`, so that the memory footprint is bounded and every row is
+    written once.  Reopening an existing file in mode 'a' continues its
+    series, which allows runs to be resumed.
+
+    Parameters
+    ----------
+    fname : str
+        Name of the HDF5 file.
+    mode : {'a', 'w', 'r'}, optional
+        Append to an existing file or create it, overwrite, or read only.
+    buffer_rows : int, optional
+        Number of rows of a series held in memory before they are written.
+    chunk_rows : int, optional
+        Number of rows of an HDF5 chunk.  Defaults to `buffer_rows`.
+    dtype : numpy dtype, optional
+        Storage type of the data of new series.  Complex values are stored
+        as complex.
+
+    Notes
+    -----
+    Small metadata, e.g., the state needed to resume a run, is kept in
+    `attrs`, which is written through to the file.
+
+    """
+
+    def __init__(self, fname, mode='a', buffer_rows=64, chunk_rows=None, dtype=np.float64):
+
+        if not has_h5py:
+            raise ImportError('SampleStore requires h5py.')
+        if mode not in ['a', 'w', 'r']:
+            raise ValueError("Mode must be 'a', 'w' or 'r'.")
+
+        self.fname = fname
+        self.mode = mode
+        self.buffer_rows = buffer_rows
+        self.chunk_rows = chunk_rows if chunk_rows is not None else buffer_rows
+        self.dtype = np.dtype(dtype)
+
+        self._file = h5py.File(fname, mode)
+        self._buffers = dict()
+
+    @property
+    def attrs(self):
+        return self._file.attrs
+
+    def keys(self):
+        names = set(self._file.keys()) | set(self._buffers.keys())
+        return sorted(names)
+
+    def __contains__(self, name):
+        return name in self._buffers or name in self._file
+
+    def __len__(self):
+        return len(self.keys())
+
+    def length(self, name):
+        """Number of rows of a series, including buffered ones."""
+        n = self._file[name]['index'].shape[0] if name in self._file else 0
+        return n + len(self._buffers.get(name, ([], []))[0])
+
+    def _create(self, name, row):
+        dtype = np.result_type(row.dtype, self.dtype) if row.dtype.kind in 'fc' else row.dtype
+        group = self._file.create_group(name)
+        group.create_dataset('data', shape=(0,) + row.shape, maxshape=(None,) + row.shape,
+                             chunks=(self.chunk_rows,) + row.shape, dtype=dtype)
+        group.create_dataset('index', shape=(0,), maxshape=(None,),
+                             chunks=(self.chunk_rows,), dtype=np.int64)
+
+    def append(self, name, value, index=None):
+        """Appends one row to a series.
+
+        Parameters
+        ----------
+        name : str
+            Name of the series, created on its first row.
+        value : scalar or array_like
+            Row.  All rows of a series have the same shape.  Objects with a
+            `data` attribute, e.g., model parameters, store that.
+        index : int, optional
+            Index of the row, e.g., the iteration.  Defaults to the length of
+            the series.
+
+        """
+
+        if self.mode == 'r':
+            raise ValueError('Store is read only.')
+
+        if not isinstance(value, np.ndarray):
+            value = getattr(value, 'data', value)
+        row = np.array(value)
+        if index is None:
+            index = self.length(name)
+
+        rows, indices = self._buffers.setdefault(name, (list(), list()))
+        if rows and row.shape != rows[0].shape:
+            raise ValueError('Row of shape {0} does not match series {1} of shape {2}.'.format(row.shape, name, rows[0].shape))
+        rows.append(row)
+        indices.append(index)
+
+        if len(rows) >= self.buffer_rows:
+            self._flush(name)
+
+    def _flush(self, name):
+        rows, indices = self._buffers.pop(name, ([], []))
+        if not rows:
+            return
+
+        if name not in self._file:
+            self._create(name, rows[0])
+        data = self._file[name]['data']
+        index = self._file[name]['index']
+        if data.shape[1:] != rows[0].shape:
+            raise ValueError('Row of shape {0} does not match series {1} of shape {2}.'.format(rows[0].shape, name, data.shape[1:]))
+
+        n, k = data.shape[0], len(rows)
+        data.resize(n + k, axis=0)
+        index.resize(n + k, axis=0)
+        data[n:] = np.stack(rows)
+        index[n:] = indices
+
+    def flush(self):
+        """Writes all buffered rows to the file."""
+        for name in list(self._buffers.keys()):
+            self._flush(name)
+        self._file.flush()
+
+    def read(self, name, start=None, stop=None):
+        """Returns the indices and the data of rows start:stop of a series."""
+        self._flush(name)
+        group = self._file[name]
+        sl = slice(start, stop)
+        return group['index'][sl], group['data'][sl]
+
+    def last(self, name):
+        """Returns the index and the data of the last row of a series, or
+        None, None if it is empty."""
+        if self.length(name) == 0:
+            return None, None
+        indices, rows = self.read(name, -1, None)
+        return int(indices[0]), rows[0]
+
+    def last_like(self, name, template):
+        """Returns the last row of a series shaped like `template`, e.g., to
+        resume a chain from its last sample, or None if it is empty."""
+        index, row = self.last(name)
+        if row is None:
+            return None
+        return restore_like(template, row)
+
+    def close(self):
+        if self._file.id.valid:
+            if self.mode != 'r':
+                self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ChainRecorder(object):
+    """Records the samples of a single MCMC chain, either in memory or in a
+    SampleStore.
+
+    Without a store, the samples are kept in the list `samples`.  With a
+    store, they are appended to its 'samples' series together with the
+    objective values, acceptance probabilities and step sizes, and the MAP
+    estimate and its objective value go to its 'MAP' and 'Phi_MAP' series.
+    A store which already holds samples resumes the chain where it stopped:
+    from its last sample, step size and MAP estimate.  Several chains share a
+    store by prefixing the names of their series.
+
+    Parameters
+    ----------
+    sample_store : SampleStore, optional
+        Store of the chain.  In parallel runs, only rank 0 passes the store.
+    parallel_wrap : pysit.util.parallel.ParallelWrapShotBase, optional
+        Parallel wrapper of the sampler, used to broadcast the state of the
+        store from rank 0.
+    save_interval : int, optional
+        Steps between flushes of the store to disk.
+    prefix : str, optional
+        Prefix of the names of the series of the chain, e.g., 'chain0/'.
+
+    """
+
+    def __init__(self, sample_store=None, parallel_wrap=None, save_interval=None, prefix=''):
+
+        self.sample_store = sample_store
+        self.parallel_wrap = parallel_wrap
+        self.save_interval = save_interval
+        self.prefix = prefix
+
+        self.streaming = sample_store is not None
+        self.resumed = False
+        self.samples = list()
+
+    def _broadcast(self, obj):
+        if self.parallel_wrap is not None and self.parallel_wrap.use_parallel:
+            return self.parallel_wrap.comm.bcast(obj, root=0)
+        return obj
+
+    def start(self, m0, beta):
+        """Returns the initial sample and step size of the chain: the last
+        sample of the store and the step size following it if the store holds
+        samples, otherwise `m0`, which is recorded, and `beta`."""
+
+        state = None
+        if self.streaming and self.prefix + 'samples' in self.sample_store:
+            state = (self.sample_store.last_like(self.prefix + 'samples', m0),
+                     self.sample_store.last(self.prefix + 'next_beta')[1])
+        self.streaming, state = self._broadcast((self.streaming, state))
+
+        if state is not None:
+            self.resumed = True
+            m0, next_beta = state
+            if next_beta is not None:
+                beta = float(next_beta)
+            return m0, beta
+
+        if not self.streaming:
+            self.samples.append(m0)
+        elif self.sample_store is not None:
+            self.sample_store.append(self.prefix + 'samples', m0)
+        return m0, beta
+
+    def start_map(self, m, phi):
+        """Returns the initial MAP estimate and its objective value: the last
+        ones of the store when resuming, otherwise `m` and `phi`, which are
+        recorded."""
+
+        state = None
+        if self.resumed and self.sample_store is not None and self.prefix + 'MAP' in self.sample_store:
+            state = (self.sample_store.last_like(self.prefix + 'MAP', m),
+                     self.sample_store.last(self.prefix + 'Phi_MAP')[1])
+        state = self._broadcast(state)
+        if state is not None:
+            return state[0], float(state[1])
+
+        self.record_map(m, phi)
+        return m, phi
+
+    def record_map(self, m, phi):
+        """Records an improvement of the MAP estimate."""
+        if self.sample_store is not None:
+            index = self.sample_store.length(self.prefix + 'Phi')
+            self.sample_store.append(self.prefix + 'MAP', m, index=index)
+            self.sample_store.append(self.prefix + 'Phi_MAP', phi, index=index)
+
+    def record(self, i, m, phi, accept_prob, beta, next_beta):
+        """Records the sample `m` of step `i`, and, in a store, the objective
+        value, acceptance probability and step size of its proposal, and the
+        step size of the next proposal."""
+
+        if not self.streaming:
+            self.samples.append(m)
+        elif self.sample_store is not None:
+            self.sample_store.append(self.prefix + 'samples', m)
+            self.sample_store.append(self.prefix + 'Phi', phi)
+            self.sample_store.append(self.prefix + 'accept_prob', accept_prob)
+            self.sample_store.append(self.prefix + 'betas', beta)
+            self.sample_store.append(self.prefix + 'next_beta', next_beta)
+            if self.save_interval is not None and np.mod(i, self.save_interval) == 0:
+                self.sample_store.flush()
+
+    def result(self):
+        """Flushes the store and returns the samples: the store if there is
+        one, otherwise the list of samples."""
+        if self.sample_store is not None:
+            self.sample_store.flush()
+        return self.sample_store if self.streaming else self.samples
@@ -0,0 +1,198 @@
+import warnings
+
+import numpy as np
+import scipy.sparse as spsp
+import scipy.sparse.linalg as spspla
+
+import pyamg
+from pyamg.krylov import gmres, bicgstab
+
+__all__ = ['ShiftedLaplacianSolver', 'build_shifted_laplacian_solver']
+
+__docformat__ = "restructuredtext en"
+
+krylov_methods = {'gmres': gmres,
+                  'bicgstab': bicgstab}
+
+
+class ShiftedLaplacianSolver(object):
+    """Preconditioned Krylov solver for a Helmholtz operator.
+
+    The preconditioner approximately inverts a complex shifted Laplacian,
+    i.e., the Helmholtz operator at a complex frequency, which is damped and
+    therefore amenable to an incomplete factorization or to algebraic
+    multigrid.  Unlike a sparse LU factorization, the storage is linear in the
+    number of unknowns.
+
+    Initial guesses are taken from a shared dictionary of recent solutions,
+    for the same column at the same key (e.g., the same frequency in the
+    previous model iteration) or at any key (e.g., the previous frequency).
+    The candidate with the smallest residual is used, if that is smaller than
+    the residual of the zero guess.
+
+    Parameters
+    ----------
+    A : scipy.sparse matrix
+        Helmholtz operator.
+    P : scipy.sparse matrix
+        Shifted Laplacian approximated by the preconditioner.
+    preconditioner : {'ilu', 'amg'}, optional
+        Incomplete LU factorization of P or a smoothed aggregation multigrid
+        V-cycle for P.
+    method : {'gmres', 'bicgstab'}, optional
+        Krylov method.
+    tol : float, optional
+        Relative residual tolerance, ||b - A x|| < tol ||b||.  The Krylov
+        methods stop on the preconditioned residual, ||M (b - A x)|| <
+        tol ||M b||, which may be smaller, so a solve whose true residual
+        misses the tolerance is restarted with the tolerance tightened by the
+        ratio of the two, at most `max_restarts` times.
+    max_restarts : int, optional
+        Maximum number of restarts for the true residual.
+    maxiter : int, optional
+        Maximum number of Krylov iterations per right hand side.
+    drop_tol, fill_factor : float, optional
+        Parameters of the incomplete LU factorization, see
+        scipy.sparse.linalg.spilu.
+    key : hashable, optional
+        Identifies this operator, e.g., its frequency, in `guesses` and
+        `history`.
+    guesses : dict, optional
+        Shared storage of previous solutions used as initial guesses.  If
+        None, every solve starts from zero.
+    n_guesses : int, optional
+        Number of previous solutions kept per key and column.
+    history : list, optional
+        Shared list to which a dictionary with the key, column, iteration
+        count and final relative residual of every solve is appended.
+
+    Notes
+    -----
+    A solve which misses the tolerance after its restarts, or which reaches
+    `maxiter`, issues a warning.
+
+    Attributes
+    ----------
+    nbytes : int
+        Storage of the preconditioner.
+
+    """
+
+    def __init__(self, A, P, preconditioner='ilu', method='gmres', tol=1e-8, maxiter=500, max_restarts=2,
+                 drop_tol=1e-4, fill_factor=10, key=None, guesses=None, n_guesses=2, history=None):
+
+        if method not in krylov_methods:
+            raise ValueError('Krylov method must be one of {0}.'.format(sorted(krylov_methods)))
+
+        self.A = spsp.csr_matrix(A)
+        self.method = method
+        self.tol = tol
+        self.maxiter = maxiter
+        self.max_restarts = max_restarts
+        self.key = key
+        self.guesses = guesses
+        self.n_guesses = n_guesses
+        self.history = history if history is not None else list()
+
+        if preconditioner == 'ilu':
+            ilu = spspla.spilu(spsp.csc_matrix(P), drop_tol=drop_tol, fill_factor=fill_factor)
+            self.M = spspla.LinearOperator(self.A.shape, ilu.solve, dtype=self.A.dtype)
+            matrices = [ilu.L, ilu.U]
+        elif preconditioner == 'amg':
+            ml = pyamg.smoothed_aggregation_solver(spsp.csr_matrix(P), symmetry='nonsymmetric')
+            self.M = ml.aspreconditioner(cycle='V')
+            matrices = [getattr(level, name) for level in ml.levels
+                        for name in ('A', 'P', 'R') if hasattr(level, name)]
+        else:
+            raise ValueError("Preconditioner must be 'ilu' or 'amg'.")
+
+        self.nbytes = sum(M.data.nbytes + M.indices.nbytes + M.indptr.nbytes
+                          for M in (spsp.csr_matrix(M) for M in matrices))
+
+    def _initial_guess(self, b, column):
+        if self.guesses is None:
+            return None
+
+        x0 = None
+        best = np.linalg.norm(b)
+        candidates = self.guesses.get((self.key, column), []) + self.guesses.get(column, [])
+        for candidate in candidates:
+            if candidate.shape == b.shape:
+                r = np.linalg.norm(b - self.A.dot(candidate))
+                if r < best:
+                    x0, best = candidate, r
+        return x0
+
+    def _solve(self, b, column):
+        x0 = self._initial_guess(b, column)
+        normb = np.linalg.norm(b)
+
+        x, tol, iterations = x0, self.tol, 0
+        for restart in range(self.max_restarts+1):
+            residuals = list()
+            x, info = krylov_methods[self.method](self.A, b, x0=x, tol=tol, maxiter=self.maxiter,
+                                                  M=self.M, residuals=residuals)
+            iterations += len(residuals)-1
+
+            r = b - self.A.dot(x)
+            residual = np.linalg.norm(r) / normb if normb > 0 else 0.0
+            if info != 0 or residual < self.tol:
+                break
+            # Aim the preconditioned residual below the tolerance scaled by
+            # its ratio to the true residual, with a margin
+            Mr = np.linalg.norm(self.M.dot(r)) / np.linalg.norm(self.M.dot(b))
+            tol = 0.5*Mr*self.tol/residual
+
+        self.history.append(dict(key=self.key, column=column, iterations=iterations,
+                                 residual=residual, warm_start=x0 is not None))
+        if info != 0 or residual >= self.tol:
+            warnings.warn('Krylov solve at {0} stopped at relative residual {1:.2e} after {2} iterations.'.format(
+                          self.key, residual, iterations))
+
+        if self.guesses is not None:
+            # Keep the last few solutions per slot, as, e.g., forward and
+            # adjoint solves alternate at the same frequency and column.
+            for slot in ((self.key, column), column):
+                self.guesses[slot] = ([x] + self.guesses.get(slot, []))[:self.n_guesses]
+
+        return x
+
+    def __call__(self, rhs):
+        """Solves A x = rhs for one right hand side or for each column of a
+        block of them."""
+        if rhs.ndim == 1:
+            return self._solve(rhs.astype(self.A.dtype), 0)
+
+        x = np.empty(rhs.shape, dtype=np.result_type(rhs, self.A.dtype))
+        for j in range(rhs.shape[1]):
+            x[:, j] = self._solve(np.ascontiguousarray(rhs[:, j], dtype=self.A.dtype), j)
+        return x
+
+
+def build_shifted_laplacian_solver(solver, nu, preconditioner):
+    """Returns the ShiftedLaplacianSolver of a frequency domain wave solver at
+    frequency `nu`, for its 'iterative' and 'amg' solver styles.
+
+    The solver provides `linear_operators`, `_build_helmholtz_operator` and
+    the settings of the Krylov solves in `iterative_options`, plus 'shift',
+    the relative imaginary shift of the squared frequency in the
+    preconditioned operator, and 'warm_start', which enables the initial
+    guesses from `iterative_guesses`.  Every solve is recorded in
+    `iterative_history`.
+
+    """
+
+    options = dict(solver.iterative_options)
+    shift = options.pop('shift', 0.5)
+    warm_start = options.pop('warm_start', True)
+
+    # The shifted Laplacian is the helmholtz operator at the complex
+    # frequency with squared value (1 - i*shift)*nu**2.
+    P = solver._build_helmholtz_operator(nu*np.sqrt(1 - 1j*shift))
+
+    return ShiftedLaplacianSolver(solver.linear_operators[nu], P,
+                                  preconditioner=preconditioner,
+                                  key=nu,
+                                  guesses=solver.iterative_guesses if warm_start else None,
+                                  history=solver.iterative_history,
+                                  **options)
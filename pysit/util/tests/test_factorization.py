@@ -0,0 +1,64 @@
+import numpy as np
+import scipy.sparse as spsp
+
+from pysit.util.factorization import FactorizationCache
+from pysit.util.factorization import SparseLUFactorization
+
+
+def helmholtz_like(n, nu):
+    # 1D Laplacian shifted by a frequency dependent complex diagonal
+    L = spsp.diags([-1.0, 2.0, -1.0], [-1, 0, 1], shape=(n, n))
+    return (L - (nu**2 - 1j*nu)*1e-3*spsp.eye(n)).tocsc()
+
+
+class TestSparseLUFactorization(object):
+
+    def test_reused_ordering(self):
+        A = helmholtz_like(50, 1.0)
+        B = helmholtz_like(50, 2.0)
+        b = np.random.rand(50)
+
+        first = SparseLUFactorization(A)
+        second = SparseLUFactorization(B, ordering=first.ordering)
+
+        assert np.allclose(A.dot(first(b)), b)
+        assert np.allclose(B.dot(second(b)), b)
+        assert second.nbytes > 0
+
+
+class TestFactorizationCache(object):
+
+    def setup(self):
+        self.cache = FactorizationCache(lambda nu: self.cache.factorize(helmholtz_like(50, nu)))
+
+    def test_hits_and_orderings(self):
+        cache = self.cache
+
+        cache[1.0]
+        cache[2.0]
+        cache[1.0]
+
+        stats = cache.statistics
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['ordering_misses'] == 1
+        assert stats['ordering_hits'] == 1
+
+        # A model update drops the factorizations but keeps the ordering.
+        cache.clear()
+        assert len(cache) == 0
+        cache[1.0]
+        assert cache.statistics['ordering_misses'] == 1
+
+    def test_lru_eviction(self):
+        cache = self.cache
+
+        nbytes = cache[1.0].nbytes
+        cache.max_bytes = 2*nbytes
+
+        cache[2.0]
+        cache[1.0]
+        cache[3.0]
+
+        assert cache.keys() == [1.0, 3.0]
+        assert cache.statistics['evictions'] == 1
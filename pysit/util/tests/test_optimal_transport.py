@@ -0,0 +1,62 @@
+import numpy as np
+from scipy import signal
+
+from pysit.util.compute_tools import optimal_transport_fwi, optimal_transport_fwi_gather
+
+
+class TestOptimalTransport(object):
+
+    def setup(self):
+        self.nt, self.dt = 200, 0.01
+        wavelet = signal.ricker(self.nt, 5.0)
+        self.dobs = np.stack([np.roll(wavelet, k) for k in (-10, 0, 15, 30)], axis=1)
+        self.dpred = np.stack([np.roll(wavelet, k) for k in (-5, 4, 9, 30)], axis=1)
+
+    def test_residual(self):
+        # Reference: cumulative distributions inverted by np.interp, per trace
+        t = np.arange(self.nt)*self.dt
+        resid, adj_src, ot_value = optimal_transport_fwi_gather(self.dobs, self.dpred, self.dt)
+        for i in range(self.dobs.shape[1]):
+            c = 5.0*np.max(np.abs(self.dobs[:, i]))
+            g = (self.dobs[:, i] + c) / (np.sum(self.dobs[:, i] + c)*self.dt)
+            f = (self.dpred[:, i] + c) / (np.sum(self.dpred[:, i] + c)*self.dt)
+            IGoF = np.interp(np.cumsum(f), np.cumsum(g), t)
+            assert np.allclose(resid[:, i], np.sqrt(f)*(t - IGoF))
+
+            r, a, v = optimal_transport_fwi(self.dobs[:, i], self.dpred[:, i], self.dt)
+            assert np.allclose(r, resid[:, i])
+            assert np.allclose(a, adj_src[:, i])
+            assert np.isclose(v, ot_value[i])
+
+        assert np.allclose(ot_value[3], 0.0)
+
+    def test_mask_and_padding(self):
+        mask = np.array([True, False, True, True])
+        resid, adj_src, ot_value = optimal_transport_fwi_gather(self.dobs, self.dpred, self.dt,
+                                                                transform_mode='quadratic', npad=5, mask=mask)
+        assert resid.shape == (self.nt+10, 4)
+        assert adj_src.shape == (self.nt, 4)
+        assert not np.any(resid[:, 1]) and not np.any(adj_src[:, 1])
+
+        r, a, v = optimal_transport_fwi_gather(self.dobs[:, mask], self.dpred[:, mask], self.dt,
+                                               transform_mode='quadratic', npad=5)
+        assert np.allclose(resid[:, mask], r)
+        assert np.allclose(adj_src[:, mask], a)
+
+    def test_negative_transform(self):
+        # A too small shift of the linear transform rejects the trace
+        resid, adj_src, ot_value = optimal_transport_fwi_gather(self.dobs, -10.0*np.abs(self.dpred), self.dt)
+        assert np.all(resid == 1e10)
+        assert not np.any(adj_src)
+
+    def test_silent_traces(self):
+        # A silent observed trace has no mass under the linear transform
+        dobs = self.dobs.copy()
+        dobs[:, 1] = 0.0
+        with np.errstate(divide='raise', invalid='raise'):
+            resid, adj_src, ot_value = optimal_transport_fwi_gather(dobs, self.dpred, self.dt)
+        assert not np.any(resid[:, 1]) and not np.any(adj_src[:, 1])
+
+        r, a, v = optimal_transport_fwi_gather(self.dobs[:, [0, 2, 3]], self.dpred[:, [0, 2, 3]], self.dt)
+        assert np.allclose(resid[:, [0, 2, 3]], r)
+        assert np.allclose(adj_src[:, [0, 2, 3]], a)
@@ -0,0 +1,179 @@
+import numpy as np
+
+from pysit.util.parallel import LocalShotExecutor
+from pysit.util.parallel import ParallelWrapShot
+from pysit.util.parallel import ParallelWrapShotNull
+
+
+def reduce_and_broadcast():
+    pwrap = ParallelWrapShot()
+
+    # Longer than the communication buffer, so it is reduced in chunks
+    local = np.arange(100.0) * (pwrap.rank + 1)
+    total = np.zeros_like(local)
+    pwrap.comm.Allreduce(local, total)
+
+    scalar = np.array(0.0)
+    pwrap.comm.Allreduce(np.array(float(pwrap.rank)), scalar)
+
+    message = pwrap.comm.bcast({'root': pwrap.rank}, root=1)
+    pwrap.comm.Barrier()
+
+    return pwrap.rank, pwrap.size, total, scalar[()], message
+
+
+def dynamic_loops():
+    pwrap = ParallelWrapShot(scheduling='dynamic')
+
+    processed = list()
+    for loop in range(2):
+        processed.append([shot for shot in pwrap.schedule(list(range(10)))])
+
+    return processed, pwrap.gather_statistics()
+
+
+def unbalanced_loop():
+    import time
+    pwrap = ParallelWrapShot()
+
+    for shot in pwrap.schedule([0]):
+        if pwrap.rank == 0:
+            time.sleep(0.2)
+
+    return pwrap.gather_statistics()
+
+
+def fused_reductions(precision, nreductions):
+    pwrap = ParallelWrapShot(reduction_precision=precision)
+
+    # Only rank 0 contributes to the arrays, so that their sums over the
+    # ranks are exact and only the transport rounds
+    local = np.linspace(0.0, 1.0, 7) / 3.0 + 1.0 if pwrap.rank == 0 else np.zeros(7)
+    scalar, array = pwrap.reduce_sum(0.1*(pwrap.rank + 1), local, key='gradient')
+
+    compensated = [array] + [pwrap.reduce_sum(local, key='gradient')[0] for i in range(nreductions-1)]
+    plain = [pwrap.reduce_sum(local)[0] for i in range(nreductions)]
+
+    return scalar, compensated, plain
+
+
+def frequency_objective(local_shot_ranks):
+    from pysit import (PML, RectangularDomain, CartesianMesh, PointSource, PointReceiver,
+                       ReceiverSet, Shot, RickerWavelet, ConstantDensityHelmholtz)
+    from pysit.modeling import generate_seismic_data
+    from pysit.objective_functions import FrequencyLeastSquares
+
+    pwrap = ParallelWrapShot()
+
+    pml = PML(0.1, 100)
+    d = RectangularDomain((0.0, 1.0, pml, pml), (0.0, 0.8, pml, pml))
+    mesh = CartesianMesh(d, 21, 17)
+    solver = ConstantDensityHelmholtz(mesh, spatial_accuracy_order=2)
+
+    shots = list()
+    if pwrap.rank in local_shot_ranks:
+        for xs in [0.3, 0.7]:
+            receivers = ReceiverSet(mesh, [PointReceiver(mesh, (x, 0.1)) for x in np.linspace(0.1, 0.9, 5)])
+            shots.append(Shot(PointSource(mesh, (xs, 0.1), RickerWavelet(10.0)), receivers))
+
+    frequencies = [2.0, 3.0]
+    C = np.ones(mesh.shape())
+    C[C.shape[0]//2:] = 1.2
+    generate_seismic_data(shots, solver, solver.ModelParameters(mesh, {'C': C}), frequencies=frequencies)
+
+    objective = FrequencyLeastSquares(solver, parallel_wrap_shot=pwrap)
+    m0 = solver.ModelParameters(mesh, {'C': np.ones(mesh.shape())})
+    value = objective.evaluate(shots, m0, frequencies)
+    gradient = objective.compute_gradient(shots, m0, frequencies)
+
+    return value, gradient.data
+
+
+def failing():
+    pwrap = ParallelWrapShot()
+    if pwrap.rank == 1:
+        raise KeyError('failure on rank 1')
+    pwrap.comm.Barrier()
+
+
+class TestLocalShotExecutor(object):
+
+    def setup(self):
+        self.executor = LocalShotExecutor(3, buffer_bytes=64)
+
+    def test_collectives(self):
+        results = self.executor.run(reduce_and_broadcast)
+
+        for rank, (r, size, total, scalar, message) in enumerate(results):
+            assert (r, size) == (rank, 3)
+            assert np.array_equal(total, 6*np.arange(100.0))
+            assert scalar == 3.0
+            assert message == {'root': 1}
+
+    def test_dynamic_scheduling(self):
+        results = self.executor.run(dynamic_loops)
+
+        for loop in range(2):
+            processed = sorted(sum([r[0][loop] for r in results], []))
+            assert processed == list(range(10))
+
+        statistics = results[0][1]
+        assert len(statistics) == 3
+        assert sum(s['shots'] for s in statistics) == 20
+        assert all(s['loops'] == 2 for s in statistics)
+
+    def test_idle_time(self):
+        statistics = self.executor.run(unbalanced_loop)[1]
+
+        assert statistics[0]['busy_time'] >= 0.2
+        assert statistics[0]['idle_time'] == 0.0
+        for s in statistics[1:]:
+            assert s['idle_time'] >= 0.2 - s['busy_time'] - 1e-3
+            assert s['idle_time'] + s['busy_time'] == statistics[0]['busy_time']
+
+    def test_reduce_sum(self):
+        exact = np.linspace(0.0, 1.0, 7) / 3.0 + 1.0
+
+        scalar, compensated, plain = self.executor.run(fused_reductions, 'double', 10)[0]
+        assert scalar == 0.1 + 0.2 + 0.3
+        assert np.allclose(compensated[0], exact, rtol=1e-15)
+
+        scalar, compensated, plain = self.executor.run(fused_reductions, 'single', 10)[0]
+        assert scalar == 0.1 + 0.2 + 0.3
+        rounding = np.abs(plain[0] - exact).max()
+        assert 0 < rounding < 1e-7
+
+        # Without error feedback the rounding errors of the reductions add
+        # up, with it their sum stays within a single rounding error.
+        plain_error = np.abs(np.sum(plain, axis=0) - 10*exact).max()
+        compensated_error = np.abs(np.sum(compensated, axis=0) - 10*exact).max()
+        assert np.isclose(plain_error, 10*rounding)
+        assert compensated_error <= 1.01*rounding
+        assert compensated_error < 0.2*plain_error
+
+    def test_ranks_without_shots(self):
+        # Only rank 0 has shots; the others must still join the reductions
+        results = self.executor.run(frequency_objective, [0])
+        reference = self.executor.run(frequency_objective, [0, 1, 2])
+
+        for value, gradient in results:
+            assert value > 0.0
+            assert np.isclose(value, reference[0][0]/3)
+            assert np.allclose(gradient, reference[0][1]/3)
+
+    def test_failure(self):
+        try:
+            self.executor.run(failing)
+        except RuntimeError as e:
+            assert 'failure on rank 1' in str(e)
+        else:
+            assert False
+
+    def test_serial_fallback(self):
+        assert isinstance(ParallelWrapShot(), ParallelWrapShotNull)
+
+    def test_schedule_blocks(self):
+        pwrap = ParallelWrapShotNull()
+        assert list(pwrap.schedule_blocks(range(5))) == [[0, 1, 2, 3, 4]]
+        assert list(pwrap.schedule_blocks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+        assert list(pwrap.schedule_blocks([], 2)) == []
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+import numpy as np
+
+from pysit.util.sample_store import SampleStore
+
+
+class TestSampleStore(object):
+
+    def setup(self):
+        self.fname = os.path.join(tempfile.mkdtemp(), 'store.h5')
+
+    def test_append_and_resume(self):
+        rows = np.random.rand(10, 3)
+
+        with SampleStore(self.fname, 'w', buffer_rows=4) as store:
+            for row in rows[:7]:
+                store.append('samples', row)
+            store.append('objective', 1.5, index=3)
+            assert store.length('samples') == 7
+
+        with SampleStore(self.fname, 'a') as store:
+            index, last = store.last('samples')
+            assert index == 6
+            assert np.array_equal(last, rows[6])
+            for row in rows[7:]:
+                store.append('samples', row)
+
+        with SampleStore(self.fname, 'r') as store:
+            indices, data = store.read('samples')
+            assert np.array_equal(indices, np.arange(10))
+            assert np.array_equal(data, rows)
+            assert store.read('objective')[0][0] == 3
+            assert store.keys() == ['objective', 'samples']
+
+    def test_last_like(self):
+        with SampleStore(self.fname, 'w') as store:
+            assert store.last_like('samples', np.zeros((2, 2))) is None
+            store.append('samples', np.arange(4.0))
+            m = store.last_like('samples', np.zeros((2, 2), dtype=np.float32))
+            assert m.shape == (2, 2)
+            assert m.dtype == np.float32
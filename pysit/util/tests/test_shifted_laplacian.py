@@ -0,0 +1,70 @@
+import numpy as np
+import scipy.sparse as spsp
+
+from pysit import PML, RectangularDomain, CartesianMesh, ConstantDensityHelmholtz
+from pysit.util.shifted_laplacian import ShiftedLaplacianSolver
+
+
+def helmholtz_2d(n, nu, damping=0.0):
+    # 2D five point Laplacian minus a (possibly damped) squared frequency
+    L1 = spsp.diags([-1.0, 2.0, -1.0], [-1, 0, 1], shape=(n, n))
+    L = spsp.kronsum(L1, L1)
+    return (L - (1 - 1j*damping)*nu**2*spsp.eye(n*n) + 1e-2j*spsp.eye(n*n)).tocsr()
+
+
+class TestShiftedLaplacianSolver(object):
+
+    def setup(self):
+        self.n = 20
+        self.A = helmholtz_2d(self.n, 0.3)
+        self.P = helmholtz_2d(self.n, 0.3, damping=0.5)
+        self.rhs = np.random.rand(self.n**2, 2)
+
+    def test_preconditioners(self):
+        for preconditioner in ['ilu', 'amg']:
+            solver = ShiftedLaplacianSolver(self.A, self.P, preconditioner=preconditioner, tol=1e-10)
+            x = solver(self.rhs)
+            r = np.linalg.norm(self.rhs - self.A.dot(x)) / np.linalg.norm(self.rhs)
+            assert r < 1e-8
+            assert solver.nbytes > 0
+            assert len(solver.history) == 2
+
+    def test_true_residual(self):
+        # The Krylov methods stop on the preconditioned residual, the solver
+        # restarts them until the true residual meets the tolerance
+        for preconditioner in ['ilu', 'amg']:
+            for tol in [1e-4, 1e-6]:
+                solver = ShiftedLaplacianSolver(self.A, self.P, preconditioner=preconditioner, tol=tol)
+                x = solver(self.rhs)
+                for j, entry in enumerate(solver.history):
+                    r = np.linalg.norm(self.rhs[:, j] - self.A.dot(x[:, j])) / np.linalg.norm(self.rhs[:, j])
+                    assert np.isclose(entry['residual'], r)
+                    assert r < tol
+
+    def test_solver_styles(self):
+        pml = PML(0.1, 100)
+        d = RectangularDomain((0.0, 1.0, pml, pml), (0.0, 0.8, pml, pml))
+        mesh = CartesianMesh(d, 21, 17)
+        C = np.ones(mesh.shape())
+
+        solutions = dict()
+        for solver_style in ['sparseLU', 'iterative', 'amg']:
+            solver = ConstantDensityHelmholtz(mesh, spatial_accuracy_order=2, solver_style=solver_style,
+                                              iterative_options={'tol': 1e-10})
+            solver.model_parameters = solver.ModelParameters(mesh, {'C': C})
+            if solver_style == 'sparseLU':
+                rhs = np.random.rand(solver.linear_operators[3.0].shape[0], 1)
+            solutions[solver_style] = solver.solvers[3.0](rhs)
+        for solver_style in ['iterative', 'amg']:
+            assert np.allclose(solutions[solver_style], solutions['sparseLU'], rtol=0, atol=1e-8*np.abs(solutions['sparseLU']).max())
+
+    def test_warm_start(self):
+        guesses = dict()
+        history = list()
+        solver = ShiftedLaplacianSolver(self.A, self.P, guesses=guesses, history=history)
+        solver(self.rhs[:, 0])
+        solver(self.rhs[:, 0])
+
+        assert not history[0]['warm_start']
+        assert history[1]['warm_start']
+        assert history[1]['iterations'] < history[0]['iterations']
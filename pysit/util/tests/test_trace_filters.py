@@ -0,0 +1,90 @@
+import numpy as np
+
+from pysit import (PML, RectangularDomain, CartesianMesh, PointSource, PointReceiver,
+                   ReceiverSet, Shot, RickerWavelet)
+from pysit.objective_functions import TemporalLeastSquares
+from pysit.solvers import ConstantDensityAcousticWave
+from pysit.util.compute_tools import band_pass_filter
+
+
+class TestTraceFilters(object):
+
+    def setup(self):
+        self.nt, self.nr = 101, 7
+        self.nl, self.nrpad = 10, 20
+        self.filter_op = band_pass_filter(self.nt, 1.0, [3.0, 15.0], transit_freq_length=2.0,
+                                          padding_zeros=True, nl=self.nl, nr=self.nrpad)
+        rng = np.random.RandomState(0)
+        self.x = rng.randn(self.nt, self.nr)
+        self.y = rng.randn(self.nt + self.nl + self.nrpad, self.nr)
+
+    def test_gather_matches_traces(self):
+        # Reference: complex filter of each zero padded trace
+        response = self.filter_op.band_pass_filter
+        expected = np.zeros_like(self.y)
+        for i in range(self.nr):
+            trace = np.zeros(self.y.shape[0])
+            trace[self.nl:self.nl+self.nt] = self.x[:, i]
+            expected[:, i] = np.real(np.fft.ifft(np.fft.fft(trace)*response))
+
+        result = self.filter_op * self.x
+        assert result.shape == expected.shape
+        assert np.allclose(result, expected)
+        assert np.allclose(self.filter_op * self.x[:, 0], expected[:, 0])
+
+        # Adjoint test
+        lhs = np.sum(result * self.y)
+        rhs = np.sum(self.x * self.filter_op.__adj_mul__(self.y))
+        assert np.isclose(lhs, rhs)
+
+    def test_observed_data_cache(self):
+        pml = PML(0.1, 100)
+        mesh = CartesianMesh(RectangularDomain((0.0, 1.0, pml, pml)), 51)
+        ts = np.linspace(0.0, 1.0, self.nt)
+        receivers = ReceiverSet(mesh, [PointReceiver(mesh, (0.1*i,)) for i in range(1, self.nr+1)])
+        receivers.reset_time_series(ts)
+        receivers.data = self.x.copy()
+        shot = Shot(PointSource(mesh, (0.5,), RickerWavelet(10.0)), receivers)
+
+        dobs = self.filter_op.filter_observed_data(shot, ts)
+        assert np.allclose(dobs, self.filter_op * self.x)
+        assert not dobs.flags.writeable
+        assert self.filter_op.filter_observed_data(shot, ts.copy()) is dobs
+
+        # The filtered data are dropped with the interpolated data, e.g.,
+        # after an in place modification of the data
+        receivers.data[:] *= 2.0
+        assert self.filter_op.filter_observed_data(shot, ts) is dobs
+        receivers.clear_interpolation_cache()
+        assert np.allclose(self.filter_op.filter_observed_data(shot, ts), 2.0*dobs)
+
+        # New data invalidate the cache
+        receivers.data = 3.0*self.x
+        assert np.allclose(self.filter_op.filter_observed_data(shot, ts), 3.0*dobs)
+
+        # The cache is bounded
+        for nt in range(3):
+            band_pass_filter(self.nt, 1.0, [3.0, 15.0]).filter_observed_data(shot, ts)
+        assert len(receivers._filter_cache) <= receivers.interpolation_cache_size
+
+    def test_objective_observed_data(self):
+        pml = PML(0.1, 100)
+        mesh = CartesianMesh(RectangularDomain((0.0, 1.0, pml, pml)), 51)
+        solver = ConstantDensityAcousticWave(mesh, trange=(0.0, 0.5))
+        solver.model_parameters = solver.ModelParameters(mesh, {'C': np.ones(mesh.shape())})
+        ts = solver.ts()
+
+        filter_op = band_pass_filter(len(ts), ts[-1], [3.0, 15.0])
+        objective = TemporalLeastSquares(solver, filter_op=filter_op)
+
+        receivers = ReceiverSet(mesh, [PointReceiver(mesh, (0.1*i,)) for i in range(1, 4)])
+        receivers.reset_time_series(ts)
+        receivers.data = np.random.rand(len(ts), 3)
+        shot = Shot(PointSource(mesh, (0.5,), RickerWavelet(10.0)), receivers)
+
+        dobs = objective._filter_observed_data(shot)
+        assert dobs is filter_op.filter_observed_data(shot, ts)
+
+        # Given data are filtered, rather than the cached data returned
+        other = np.random.rand(len(ts), 3)
+        assert np.allclose(objective._filter_observed_data(shot, other), filter_op * other)
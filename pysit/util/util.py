@@ -42,6 +42,11 @@ class Bunch(dict):
         dict.__init__(self, **kwargs)
         self.__dict__ = self
 
+    def __setstate__(self, state):
+        # Copies and unpickled instances are created without __init__, so
+        # the attribute view must be re-established before the items return.
+        self.__dict__ = self
+
 class ConstructableDict(dict):
     """ A ConstructableDict returns the value mapped to a key.  If that key
     does not exist, a function which creates the desired value at the key is
@@ -86,30 +86,19 @@ class PetscWrapper():
         else:
             raise ValueError("Matrix dimension does not match the length of right hand side")
 
-        # Allocating the matrices in Petsc
-        BPetsc = PETSc.Mat().createDense((N, nrhs))
-        BPetsc.setUp()
-
-        # coping the RHS matrix to ta Petsc matrix
-        for ii in range(0, nrhs, 1):
-            BPetsc.setValues(list(range(0, N)), [ii], B[:, ii])
-
-        # BPetsc.setValues(range(0, B.shape[0]), range(0, B.shape[1]), B)
-
-        # assembling the RHS matrix
-        BPetsc.assemblyBegin()
-        BPetsc.assemblyEnd()
-
-        # defining and allocating the solution matrix
-        X = PETSc.Mat().createDense((N, nrhs))
-        X.setUp()
-
-        # assembling the solution matrix
-        X.assemblyBegin()
-        X.assemblyEnd()
+        # Petsc dense matrices are column major, so column major arrays of
+        # the petsc scalar type are shared with petsc instead of being copied
+        # entry by entry.  Only other layouts or types are converted.
+        B = np.asfortranarray(B, dtype=PETSc.ScalarType)
+        BPetsc = PETSc.Mat().createDense((N, nrhs), array=B)
+        BPetsc.assemble()
+
+        # the solution matrix writes directly into X
+        X = np.empty((N, nrhs), dtype=PETSc.ScalarType, order='F')
+        XPetsc = PETSc.Mat().createDense((N, nrhs), array=X)
+        XPetsc.assemble()
 
         # solving the system by calling PetSc
-        self.H_inv.matSolve(BPetsc, X)
+        self.H_inv.matSolve(BPetsc, XPetsc)
 
-        # somehow it doesn't like it if I don't force the np.array
-        return np.array(X.getDenseArray())
+        return X